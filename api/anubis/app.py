@@ -85,3 +85,25 @@ def create_pipeline_app() -> Flask:
     register_pipeline_views(app)
 
     return app
+
+
+def create_job_app() -> Flask:
+    """
+    Create a lightweight Anubis Flask app instance for rpc jobs and
+    pollers.
+
+    This app will have the basic services (db and cache), without
+    any of the views registered.
+
+    :return: Flask app
+    """
+    from anubis.env import env
+
+    # Create app
+    app = Flask(__name__)
+    app.config.from_object(env)
+
+    # Initialize app with all the extra services
+    init_services(app)
+
+    return app
@@ -1,10 +1,47 @@
 import os
+import threading
+import time
 import traceback
-from typing import Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, TypeVar
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from anubis.utils.logging import logger, verbose_call
+from anubis.utils.lru import LRUCache
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Base url of the github api (pointed at a fake github in testing)
+GITHUB_API_URL = os.environ.get("GITHUB_API_URL", default="https://api.github.com")
+
+# Size of the keep-alive connection pool to github
+GITHUB_POOL_SIZE = 16
+
+# Number of github requests to have in flight at once in github_map
+GITHUB_CONCURRENCY = int(os.environ.get("GITHUB_CONCURRENCY", default="8"))
+
+# (connect, read) timeouts for github requests
+GITHUB_TIMEOUT = (5, 30)
+
+# Number of GET responses to keep for conditional requests
+GITHUB_ETAG_CACHE_SIZE = 2048
+
+# Once the rate limit budget drops below GITHUB_RATE_LIMIT_PACE_BELOW,
+# requests are spread out over what is left of the rate limit window. The
+# last GITHUB_RATE_LIMIT_RESERVE requests of the window are not used, to
+# leave room for anything else using the same token.
+GITHUB_RATE_LIMIT_PACE_BELOW = 500
+GITHUB_RATE_LIMIT_RESERVE = 50
+
+# Longest we will wait on a rate limit before giving up
+GITHUB_RATE_LIMIT_MAX_WAIT = 15 * 60
+
+# Number of times to try a request that was rate limited
+GITHUB_RATE_LIMIT_ATTEMPTS = 3
 
 
 def get_github_token() -> str | None:
@@ -18,37 +55,252 @@ def get_github_token() -> str | None:
 
     return token
 
+
+class GithubRateLimiter(object):
+    """
+    Tracks the rate limit budget github reports in the X-RateLimit-*
+    headers of each response (per resource, ex: core, graphql), and paces
+    callers so that the budget lasts until the window resets rather than
+    running out and failing.
+    """
+
+    def __init__(self, pace_below: int = GITHUB_RATE_LIMIT_PACE_BELOW, reserve: int = GITHUB_RATE_LIMIT_RESERVE):
+        self.pace_below = pace_below
+        self.reserve = reserve
+        self._lock = threading.Lock()
+
+        # resource -> [remaining, reset epoch seconds, next allowed request time]
+        self._budgets: dict[str, list[float]] = {}
+
+    def update(self, resource: str, headers: dict[str, str]):
+        """
+        Update the budget for a resource from response headers.
+
+        :param resource:
+        :param headers:
+        :return:
+        """
+        remaining = headers.get("X-RateLimit-Remaining", None)
+        reset = headers.get("X-RateLimit-Reset", None)
+        if remaining is None or reset is None:
+            return
+
+        resource = headers.get("X-RateLimit-Resource", resource)
+        with self._lock:
+            budget = self._budgets.setdefault(resource, [0, 0, 0])
+            budget[0] = int(remaining)
+            budget[1] = float(reset)
+
+    def exhausted(self, resource: str, reset: float):
+        """
+        Mark a resource as having no budget left until reset.
+
+        :param resource:
+        :param reset:
+        :return:
+        """
+        with self._lock:
+            self._budgets[resource] = [0, reset, reset]
+
+    def delay(self, resource: str) -> float:
+        """
+        Claim one request from the budget for a resource, and get
+        how long to wait before sending it.
+
+        :param resource:
+        :return: seconds to wait
+        """
+        now = time.time()
+        with self._lock:
+            budget = self._budgets.get(resource, None)
+
+            # Nothing is known yet, or the window has reset
+            if budget is None or budget[1] <= now:
+                return 0.0
+
+            remaining, reset, next_allowed = budget
+            spare = remaining - self.reserve
+
+            # Plenty left, so no need to pace
+            if spare >= self.pace_below:
+                budget[0] -= 1
+                return 0.0
+
+            # Out of budget, so wait for the window to reset
+            if spare <= 0:
+                return reset - now
+
+            # Spread the spare budget over what is left of the window
+            interval = (reset - now) / spare
+            start = max(now, next_allowed)
+            budget[0] -= 1
+            budget[2] = start + interval
+            return start - now
+
+    def wait(self, resource: str):
+        delay = self.delay(resource)
+        if delay <= 0:
+            return
+        if delay > GITHUB_RATE_LIMIT_MAX_WAIT:
+            raise GithubRateLimitError(f"github {resource} rate limit resets in {delay:.0f}s")
+        logger.info(f"Pacing github {resource} request for {delay:.2f}s")
+        time.sleep(delay)
+
+
+class GithubRateLimitError(Exception):
+    pass
+
+
+class GithubClient(object):
+    """
+    Shared client for the github api. Requests go through a keep-alive
+    connection pool, with timeouts, retries on transient server errors,
+    rate limit pacing, and conditional requests. GET responses are kept
+    with their ETag, and sent with If-None-Match the next time. A 304 from
+    github does not count against the rate limit.
+
+    The requests session is created lazily per process, so forked
+    workers do not share sockets with their parent.
+    """
+
+    def __init__(self, base_url: str = GITHUB_API_URL, pool_size: int = GITHUB_POOL_SIZE):
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.rate_limiter = GithubRateLimiter()
+        self.etag_cache = LRUCache(GITHUB_ETAG_CACHE_SIZE)
+
+        self._session: requests.Session | None = None
+        self._session_pid: int | None = None
+        self._session_lock = threading.Lock()
+
+        # Counters of how requests went
+        self.requests_sent: int = 0
+        self.not_modified: int = 0
+
+    @property
+    def session(self) -> requests.Session:
+        with self._session_lock:
+            if self._session is None or self._session_pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=self.pool_size,
+                    pool_maxsize=self.pool_size,
+                    max_retries=Retry(
+                        total=3,
+                        backoff_factor=0.5,
+                        status_forcelist=(502, 503, 504),
+                        raise_on_status=False,
+                    ),
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._session = session
+                self._session_pid = os.getpid()
+            return self._session
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        resource: str = "core",
+        headers: dict[str, str] = None,
+        **kwargs,
+    ) -> requests.Response:
+        """
+        Send a request to github. Rate limited responses are retried once
+        the rate limit allows it.
+
+        :param method:
+        :param url: full url, or path under base_url
+        :param resource: rate limit resource the request counts against
+        :param headers:
+        :param kwargs: passed to requests
+        :return:
+        """
+        if url.startswith("/"):
+            url = self.base_url + url
+
+        headers = {"Authorization": f"token {get_github_token()}", **(headers or {})}
+        method = method.upper()
+
+        # Revalidate GETs we have seen before
+        cache_key = f"{headers.get('Accept', '')} {url}"
+        cached = self.etag_cache.get(cache_key) if method == "GET" else None
+        if cached is not None:
+            headers["If-None-Match"] = cached.headers["ETag"]
+
+        for attempt in range(GITHUB_RATE_LIMIT_ATTEMPTS):
+            self.rate_limiter.wait(resource)
+
+            r = self.session.request(method, url, headers=headers, timeout=GITHUB_TIMEOUT, **kwargs)
+            self.requests_sent += 1
+            self.rate_limiter.update(resource, r.headers)
+
+            # Rate limited. Wait for as long as github says, and try again.
+            if r.status_code in (403, 429) and self._is_rate_limited(r):
+                retry_after = r.headers.get("Retry-After", None)
+                if retry_after is not None:
+                    self.rate_limiter.exhausted(resource, time.time() + float(retry_after))
+                elif "X-RateLimit-Reset" in r.headers:
+                    self.rate_limiter.exhausted(resource, float(r.headers["X-RateLimit-Reset"]))
+                logger.warning(f"github rate limited {method} {url} (attempt {attempt})")
+                continue
+
+            break
+
+        # Not modified, so hand back what we had
+        if r.status_code == 304 and cached is not None:
+            self.not_modified += 1
+            return cached
+
+        # Keep GET responses for the next conditional request
+        if method == "GET" and r.status_code == 200 and "ETag" in r.headers:
+            self.etag_cache.set(cache_key, r)
+
+        return r
+
+    @staticmethod
+    def _is_rate_limited(r: requests.Response) -> bool:
+        if r.headers.get("X-RateLimit-Remaining", None) == "0":
+            return True
+        if "Retry-After" in r.headers:
+            return True
+        return "rate limit" in r.text.lower()
+
+
+# The shared github client
+github_client = GithubClient()
+
+
+def parse_github_response(r: requests.Response) -> dict | list | bytes:
+    is_json = 'Content-Type' in r.headers and 'application/json' in r.headers.get('Content-Type')
+    if is_json:
+        if r.status_code == 204:
+            return dict()
+        return r.json()
+    return r.content
+
+
 @verbose_call()
 def github_rest(url, body=None, method: str = "get", api_domain: str = "api.github.com", accept: str = "application/vnd.github.v3+json") -> dict | bytes | None:
-    # Get the github api token
-    token = get_github_token()
-
-    url = f'https://{api_domain}' + url
+    if api_domain == "api.github.com":
+        url = github_client.base_url + url
+    else:
+        url = f'https://{api_domain}' + url
     headers = {
         "Accept": accept,
-        "Authorization": f"token {token}",
     }
 
-    req_function = {
-        "put": requests.put,
-        "get": requests.get,
-        "del": requests.delete,
-        "delete": requests.delete,
-    }[method.lower()]
+    if method.lower() == "del":
+        method = "delete"
 
     r = None
     try:
         if body is not None:
-            r: requests.Response = req_function(url, headers=headers, json=body)
+            r: requests.Response = github_client.request(method, url, headers=headers, json=body)
         else:
-            r: requests.Response = req_function(url, headers=headers)
-        is_json = 'Content-Type' in r.headers and 'application/json' in r.headers.get('Content-Type')
-        if is_json:
-            if r.status_code == 204:
-                return dict()
-            return r.json()
-        else:
-            return r.content
+            r: requests.Response = github_client.request(method, url, headers=headers)
+        return parse_github_response(r)
     except Exception as e:
         if r is not None and isinstance(r, requests.Response):
             logger.error(str(r))
@@ -63,16 +315,14 @@ def github_graphql(query: str, variables: dict[str, Any] = None) -> dict[str, An
     if variables is None:
         variables = dict()
 
-    token = get_github_token()
-
     # set up request options
-    url = "https://api.github.com/graphql"
+    url = github_client.base_url + "/graphql"
     json = {"query": query, "variables": variables}
-    headers = {"Authorization": "token %s" % token}
 
     # Make the graph request over http
+    r = None
     try:
-        r = requests.post(url=url, json=json, headers=headers)
+        r = github_client.request("post", url, resource="graphql", json=json)
         return r.json()["data"]
     except KeyError as e:
         logger.error(traceback.format_exc())
@@ -82,3 +332,23 @@ def github_graphql(query: str, variables: dict[str, Any] = None) -> dict[str, An
         logger.error(traceback.format_exc())
         logger.error(f"Request to github api Failed {e}")
         return None
+
+
+def github_map(func: Callable[[T], R], items: Iterable[T], workers: int = GITHUB_CONCURRENCY) -> list[R]:
+    """
+    Call func on each item with a bounded number of calls in flight at
+    once. func should only talk to github (the database session is not
+    shared across threads). Results are given back in the same order as
+    items.
+
+    :param func:
+    :param items:
+    :param workers:
+    :return:
+    """
+    items = list(items)
+    if workers <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(items)), thread_name_prefix="github") as executor:
+        return list(executor.map(func, items))
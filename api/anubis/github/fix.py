@@ -1,13 +1,26 @@
+import json
 from datetime import datetime, timedelta
+from typing import Any
 
 import sqlalchemy.exc
 from sqlalchemy.sql import or_
 
 from anubis.github.api import github_graphql
 from anubis.github.repos import create_assignment_student_repo
-from anubis.models import Assignment, AssignmentRepo, Submission, User, db
+from anubis.k8s.pipeline.admission import PIPELINE_PRIORITY_REGRADE
+from anubis.lms.webhook_routes import forget_repo_routes
+from anubis.models import Assignment, AssignmentRepo, Config, Submission, User, db
+from anubis.utils.config import set_config_value
 from anubis.utils.logging import logger
 
+# Repos listed per page of the org reconciliation, and the
+# most pages one reaper run will walk before stopping
+GITHUB_RECONCILE_PAGE_SIZE = 25
+GITHUB_RECONCILE_MAX_PAGES = 20
+
+# Commits of each changed repo checked for missing submissions
+GITHUB_RECONCILE_HISTORY = 20
+
 
 def fix_github_broken_repos():
     # Search for broken repos
@@ -38,25 +51,179 @@ def fix_github_broken_repos():
         create_assignment_student_repo(student, assignment)
 
 
-def fix_github_missing_submissions(org_name: str):
+def get_github_reconcile_key(org_name: str) -> str:
+    return f"GITHUB_RECONCILE_{org_name}"
+
+
+def get_github_reconcile_state(org_name: str) -> dict[str, Any]:
+    """
+    Get where the last reconciliation of a github org left off. The state
+    is kept as json in the config table:
+
+    pushed_at: repos pushed before this were reconciled by a finished scan
+    scan:      {cursor, pushed_at} of a scan that ran out of pages, to be
+               picked back up from cursor on the next run
+
+    :param org_name:
+    :return:
+    """
+    config: Config = Config.query.filter(Config.key == get_github_reconcile_key(org_name)).first()
+    if config is None:
+        return {"pushed_at": None, "scan": None}
+
+    try:
+        return json.loads(config.value)
+    except json.JSONDecodeError:
+        return {"pushed_at": None, "scan": None}
+
+
+def reconcile_github_repos(repositories: list[dict[str, Any]], assignments: dict[str, Assignment | None]) -> int:
+    """
+    Reconcile a page of org repos from github against the database. Repos
+    whose default branch head is the one we last reconciled are skipped.
+    For the rest, any of their recent commits without a submission get
+    one, and repos pointing at the wrong owner are fixed.
+
+    :param repositories: repository nodes from the graphql query
+    :param assignments: running map of unique_code -> assignment
+    :return: number of repos that had moved
+    """
     from anubis.lms.submissions import init_submission
-    from anubis.lms.webhook import check_repo, guess_github_repo_owner
+    from anubis.lms.webhook import (
+        check_repo,
+        get_assignments_by_unique_code,
+        get_repo_name_assignment,
+        guess_github_repo_owner,
+    )
     from anubis.rpc.enqueue import enqueue_autograde_pipeline
 
+    # Parse out the name, url, head and recent commits of each repo.
+    # Empty repos have no default branch yet, so there is nothing to check.
+    nodes = []
+    for node in repositories:
+        try:
+            target = node["defaultBranchRef"]["target"]
+            commits = [edge["node"]["oid"] for edge in target["history"]["edges"]]
+            nodes.append((node["name"], node["url"], target["oid"], commits))
+        except (TypeError, KeyError):
+            continue
+    if len(nodes) == 0:
+        return 0
+
+    # Get the repos we already know about, and drop the ones whose head has not moved
+    known_repos: dict[str, AssignmentRepo] = {
+        repo.repo_url: repo
+        for repo in AssignmentRepo.query.filter(AssignmentRepo.repo_url.in_([url for _, url, _, _ in nodes])).all()
+    }
+    nodes = [
+        (repo_name, repo_url, head, commits)
+        for repo_name, repo_url, head, commits in nodes
+        if repo_url not in known_repos or known_repos[repo_url].head_commit != head
+    ]
+    if len(nodes) == 0:
+        return 0
+
+    # Resolve the assignments and existing submissions for the whole page at once
+    get_assignments_by_unique_code(assignments, [repo_name for repo_name, _, _, _ in nodes])
+    existing_commits: set[str] = {
+        commit
+        for commit, in db.session.query(Submission.commit).filter(
+            Submission.commit.in_([commit for _, _, _, commits in nodes for commit in commits])
+        )
+    }
+
+    for repo_name, repo_url, head, commits in nodes:
+        # Find the assignment from the parts of the repo name
+        assignment = get_repo_name_assignment(assignments, repo_name)
+
+        # If not in database, then eject
+        if assignment is None:
+            logger.info(f"Could not find assignment for {repo_name}")
+            continue
+
+        # Guess github username, then create the repo if it doesn't yet exist
+        user, netid = guess_github_repo_owner(assignment, repo_name)
+        if user is None:
+            continue
+        repo = check_repo(assignment, repo_url, user, user.netid)
+
+        # Create the missing submissions
+        enqueue_submission_pipelines = []
+        for commit in commits:
+            if commit in existing_commits:
+                continue
+
+            logger.info(f"Found missing submission {user.netid=} {assignment=} {commit=}")
+            try:
+                submission = Submission(
+                    commit=commit,
+                    owner=user,
+                    assignment=assignment,
+                    repo=repo,
+                    state="Waiting for resources...",
+                )
+                db.session.add(submission)
+                db.session.commit()
+                init_submission(submission)
+                if submission.assignment.autograde_enabled:
+                    enqueue_submission_pipelines.append(submission.id)
+            except sqlalchemy.exc.IntegrityError:
+                db.session.rollback()
+                logger.warning(f'Failed to create submission that already exists {user.netid=} {assignment=} {commit=}')
+
+        # Fix repos pointing at the wrong owner
+        r = known_repos.get(repo_url, None)
+        if r is not None and r.owner_id != user.id:
+            logger.info(f"fixing broken repo owner {r.id}")
+            r.owner_id = user.id
+            forget_repo_routes(r.repo_url)
+            for submission in Submission.query.filter(Submission.assignment_repo_id == r.id).all():
+                submission.owner_id = user.id
+                enqueue_submission_pipelines.append(submission.id)
+
+        # Remember the head we reconciled up to
+        (r or repo).head_commit = head
+        db.session.commit()
+
+        for sid in enqueue_submission_pipelines:
+            enqueue_autograde_pipeline(sid, priority=PIPELINE_PRIORITY_REGRADE)
+
+        logger.info(f"checked repo: {repo_name} {user.github_username} {user} {repo.id}")
+
+    return len(nodes)
+
+
+def fix_github_missing_submissions(org_name: str):
+    """
+    Reconcile the repos of a github org against the database. Repos are
+    walked most recently pushed first, and the walk stops at the first
+    repo pushed before the last finished scan. Of those, only repos
+    whose default branch head moved are looked at. The work done is then
+    proportional to recent activity in the org rather than its size.
+
+    If a scan runs out of pages before it catches up, it is picked back
+    up from its cursor on the next run.
+
+    :param org_name:
+    :return:
+    """
+
     # Do graphql nonsense
     # Refer to here for graphql over https: https://graphql.org/learn/serving-over-http/
     query = """
-    query githubCommits($orgName: String!, $first: Int!, $after: String) {
+    query githubCommits($orgName: String!, $first: Int!, $after: String, $history: Int!) {
       organization(login: $orgName) {
-        repositories(after: $after, first: $first, orderBy: {field: CREATED_AT, direction: DESC}) {
+        repositories(after: $after, first: $first, orderBy: {field: PUSHED_AT, direction: DESC}) {
           pageInfo {
             endCursor
+            hasNextPage
           }
           nodes {
             defaultBranchRef {
               target {
                 ... on Commit {
-                  history(first: 20) {
+                  oid
+                  history(first: $history) {
                     edges {
                       node {
                         oid
@@ -68,17 +235,32 @@ def fix_github_missing_submissions(org_name: str):
             }
             name
             url
+            pushedAt
           }
         }
       }
     }
     """
 
-    query_size: int = 10
-    after = None
-    for _ in range(20):
+    # Pick up from where the last run left off
+    state = get_github_reconcile_state(org_name)
+    watermark: str | None = state["pushed_at"]
+    scan: dict[str, str] = state["scan"] or {}
+    after: str | None = scan.get("cursor", None)
+    newest: str | None = scan.get("pushed_at", None)
+
+    # Running map of unique_code -> assignment objects
+    assignments: dict[str, Assignment | None] = dict()
+
+    listed, moved, caught_up = 0, 0, False
+    for page in range(GITHUB_RECONCILE_MAX_PAGES):
         # Make the github query
-        data = github_graphql(query, {"orgName": org_name, "first": query_size, "after": after})
+        data = github_graphql(query, {
+            "orgName": org_name,
+            "first":   GITHUB_RECONCILE_PAGE_SIZE,
+            "after":   after,
+            "history": GITHUB_RECONCILE_HISTORY,
+        })
 
         # Check that the data is there
         if data is None:
@@ -88,77 +270,36 @@ def fix_github_missing_submissions(org_name: str):
         # Get organization and repositories from response
         organization = data["organization"]
         repositories = organization["repositories"]["nodes"]
-        after = organization["repositories"]["pageInfo"]["endCursor"]
-
-        # Running map of unique_code -> assignment objects
-        assignments = dict()
+        page_info = organization["repositories"]["pageInfo"]
+        after = page_info["endCursor"]
 
-        # Parse out repo name and url from graphql response
-        repos = map(lambda node: (node["name"], node["url"], node["defaultBranchRef"]), repositories)
-        for repo_name, repo_url, ref in repos:
-            assignment = None
+        # The first repo of a scan is the most recently pushed
+        if newest is None and len(repositories) > 0:
+            newest = repositories[0]["pushedAt"]
 
-            # Try to get the assignment object from running map
-            for code in repo_name.split("-"):
-                assignment = assignments.get(code, None)
+        # Only the repos pushed since the last finished scan. Repos pushed
+        # at the same time as the watermark are checked again, but their
+        # head will not have moved if they were already reconciled.
+        pushed = [
+            node for node in repositories
+            if watermark is None or (node["pushedAt"] or "") >= watermark
+        ]
+        listed += len(repositories)
+        moved += reconcile_github_repos(pushed, assignments)
 
-            # If not in the map, then try to get from the database
-            if assignment is None:
-                assignment = Assignment.query.filter(Assignment.unique_code.in_(repo_name.split("-"))).first()
+        # Stop once we reach repos the last scan already covered
+        if len(pushed) < len(repositories) or not page_info["hasNextPage"]:
+            caught_up = True
+            break
 
-                if assignment is not None:
-                    assignments[assignment.unique_code] = assignment
+    # Save where to pick up from next time
+    if caught_up:
+        state = {"pushed_at": newest or watermark, "scan": None}
+    else:
+        state = {"pushed_at": watermark, "scan": {"cursor": after, "pushed_at": newest}}
+    set_config_value(get_github_reconcile_key(org_name), json.dumps(state))
 
-            # If not in database or map, then eject
-            if assignment is None:
-                print(f"Could not find assignment for {repo_name}")
-                continue
-
-            # Guess github username, then create the repo if it doesn't yet exist
-            user, netid = guess_github_repo_owner(assignment, repo_name)
-            repo = check_repo(assignment, repo_url, user, user.netid)
-
-            if user is None:
-                continue
-
-            # Check for missing submissions
-            try:
-                for commit in map(lambda x: x["node"]["oid"], ref["target"]["history"]["edges"]):
-                    submission = Submission.query.filter(Submission.commit == commit).first()
-                    if submission is None:
-                        print(f"Found missing submission {user.netid=} {assignment=} {commit=}")
-                        try:
-                            submission = Submission(
-                                commit=commit,
-                                owner=user,
-                                assignment=assignment,
-                                repo=repo,
-                                state="Waiting for resources...",
-                            )
-                            db.session.add(submission)
-                            db.session.commit()
-                            init_submission(submission)
-                            if submission.assignment.autograde_enabled:
-                                enqueue_autograde_pipeline(submission.id)
-                        except sqlalchemy.exc.IntegrityError:
-                            db.session.rollback()
-                            logger.warning(f'Failed to create submission that already exists {user.netid=} {assignment=} {commit=}')
-            except TypeError as e:
-                logger.warning(f'Failed to parse commit objects for repo - {e} - {str(repo)}')
-
-            r = AssignmentRepo.query.filter(AssignmentRepo.repo_url == repo_url).first()
-            if r is not None:
-                if r.owner_id != user.id:
-                    print(f"fixing broken repo owner {r.id}")
-                    r.owner_id = user.id
-                    enqueue_submission_pipelines = []
-                    for submission in Submission.query.filter(Submission.assignment_repo_id == r.id).all():
-                        submission.owner_id = user.id
-                        enqueue_submission_pipelines.append(submission.id)
-
-                    db.session.commit()
-                    for sid in enqueue_submission_pipelines:
-                        enqueue_autograde_pipeline(sid)
-
-            if repo:
-                print(f"checked repo: {repo_name} {user.github_username} {user} {repo.id}")
+    logger.info(
+        f"Reconciled github org {org_name} :: listed {listed} repos, {moved} moved",
+        extra={"org_name": org_name, "pages": page + 1, "listed": listed, "moved": moved, "caught_up": caught_up},
+    )
@@ -3,8 +3,18 @@ import re
 import string
 import traceback
 
-from anubis.github.api import github_graphql, github_rest
-from anubis.models import Assignment, AssignmentRepo, Submission, SubmissionBuild, SubmissionTestResult, User, db
+from anubis.github.api import github_graphql, github_map, github_rest
+from anubis.lms.webhook_routes import forget_repo_routes
+from anubis.models import (
+    Assignment,
+    AssignmentRepo,
+    BestSubmission,
+    Submission,
+    SubmissionBuild,
+    SubmissionTestResult,
+    User,
+    db,
+)
 from anubis.rpc.safety_nets import create_repo_safety_net
 from anubis.utils.data import is_debug
 from anubis.utils.logging import logger
@@ -188,6 +198,9 @@ def delete_assignment_repo(user: User, assignment: Assignment, commit: bool = Tr
 
         # Go through all the submissions, deleting builds
         # and tests as we go
+        logger.info(f'Deleting best submission records')
+        BestSubmission.query.filter(BestSubmission.submission_id.in_(submission_ids)).delete()
+
         logger.info(f'Deleting submission builds')
         SubmissionBuild.query.filter(SubmissionBuild.submission_id.in_(submission_ids)).delete()
 
@@ -206,6 +219,7 @@ def delete_assignment_repo(user: User, assignment: Assignment, commit: bool = Tr
         # Delete the repo
         logger.info(f'Deleting assignment repo db record')
         AssignmentRepo.query.filter(AssignmentRepo.id == repo.id).delete(synchronize_session=False)
+        forget_repo_routes(repo.repo_url)
 
         if commit:
             # Commit the deletes
@@ -487,11 +501,17 @@ def create_assignment_github_repo(
 
 
 def verify_collaborators_assignment_repo(assignment_repo: AssignmentRepo):
-    # Get github org and repo name from the url of the assignment
-    github_org, repo_name = split_github_repo_url(assignment_repo.repo_url)
+    # Get github org and repo name from the url of the assignment, along
+    # with the repo owner's github username
+    verify_collaborators_github_repo(
+        assignment_repo.repo_url,
+        assignment_repo.owner.github_username,
+    )
+
 
-    # Get repo owner's github username
-    github_username: str = assignment_repo.owner.github_username
+def verify_collaborators_github_repo(repo_url: str, github_username: str):
+    # Get github org and repo name from the url of the assignment
+    github_org, repo_name = split_github_repo_url(repo_url)
 
     # Log the verify call
     logger.info(f'verify_collaborators_assignment_repo( {github_org}/{repo_name} )')
@@ -518,11 +538,16 @@ def verify_collaborators_assignment(assignment: Assignment):
     # Log verify call
     logger.info(f'verify_collaborators_assignment( {assignment=} )')
 
-    # Get all repos for assignment
-    assignment_repos = AssignmentRepo.query.filter(
-        AssignmentRepo.assignment_id == assignment.id,
-    ).all()
+    # Get the url and owner github username of all repos for assignment
+    assignment_repos = (
+        db.session.query(AssignmentRepo.repo_url, User.github_username)
+        .join(User, User.id == AssignmentRepo.owner_id)
+        .filter(AssignmentRepo.assignment_id == assignment.id)
+        .all()
+    )
 
-    # Verify repo for each repo in assignment
-    for assignment_repo in assignment_repos:
-        verify_collaborators_assignment_repo(assignment_repo)
+    # Verify each repo in assignment, a few at a time
+    github_map(
+        lambda assignment_repo: verify_collaborators_github_repo(*assignment_repo),
+        assignment_repos,
+    )
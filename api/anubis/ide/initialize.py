@@ -7,6 +7,7 @@ from anubis.constants import (
     THEIA_DEFAULT_NETWORK_POLICY,
     THEIA_ADMIN_NETWORK_POLICY,
 )
+from anubis.k8s.pvc.get import get_pvc
 from anubis.k8s.theia.create import create_theia_k8s_pod_pvc
 from anubis.lms.courses import is_course_admin
 from anubis.lms.shell_autograde import create_shell_autograde_ide_submission
@@ -107,16 +108,19 @@ def initialize_theia_session(theia_session_id: str):
     # If a pvc is necessary (for persistent volume assignments)
     if pvc is not None:
         # Create the PVC if it did not already exist
-        try:
-            # This function will throw a 404 client.exceptions.ApiException
-            # if the pvc does not exist
-            v1.read_namespaced_persistent_volume_claim(namespace="anubis", name=pvc.metadata.name)
+        if get_pvc(pvc.metadata.name) is not None:
             logger.info(f"PVC for user already exists: {pvc.metadata.name}")
 
-        # Catch the exception thrown if the pvc does not exist
-        except client.exceptions.ApiException:
+        else:
             logger.info(f"PVC for user does not exist (Creating): {pvc.metadata.name}")
-            v1.create_namespaced_persistent_volume_claim(namespace="anubis", body=pvc)
+            try:
+                v1.create_namespaced_persistent_volume_claim(namespace="anubis", body=pvc)
+
+            # The pvc may have been created since it was checked for
+            except client.exceptions.ApiException as e:
+                if e.status != 409:
+                    raise
+                logger.info(f"PVC for user already exists: {pvc.metadata.name}")
 
     # Send the pod to the kubernetes api. Ask to create
     # these resources under the anubis namespace. These actions are by default
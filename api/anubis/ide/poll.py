@@ -1,4 +1,5 @@
 from anubis.models import TheiaSession
+from anubis.models.serialize import serialize_theia_sessions
 from anubis.utils.cache import cache
 from anubis.utils.data import is_debug
 
@@ -24,7 +25,7 @@ def theia_list_all(user_id: str, limit: int = 10):
             .all()
     )
 
-    return [theia_session.data for theia_session in theia_sessions]
+    return serialize_theia_sessions(theia_sessions)
 
 
 #@cache.memoize(timeout=0, unless=is_debug)
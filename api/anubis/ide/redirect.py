@@ -1,20 +1,25 @@
 from werkzeug.utils import redirect
 
 from anubis.models import TheiaSession, User
-from anubis.utils.auth.token import create_token
+from anubis.utils.auth.token import create_token, encode_token
 
 
-def theia_redirect_url(theia_session_id: str, netid: str) -> str:
+def theia_redirect_url(theia_session_id: str, netid: str, verify_user: bool = True, exp_kwargs: dict = None) -> str:
     """
     Generates the url for redirecting to the theia proxy for the given session.
 
     :param theia_session_id:
     :param netid:
+    :param verify_user: look up the user before creating the token
+    :param exp_kwargs: token expire kwargs (only used when not verifying the user)
     :return:
     """
-    return "/ide/initialize?token={}&anubis=1".format(
-        create_token(netid, session_id=theia_session_id),
-    )
+    if not verify_user:
+        token = encode_token(netid, exp_kwargs, session_id=theia_session_id)
+    else:
+        token = create_token(netid, session_id=theia_session_id)
+
+    return "/ide/initialize?token={}&anubis=1".format(token)
 
 
 def theia_redirect(theia_session: TheiaSession, user: User):
@@ -1,6 +1,6 @@
 from anubis.constants import REAPER_TXT
 from anubis.lms.assignments import get_recent_assignments
-from anubis.lms.autograde import bulk_autograde
+from anubis.lms.autograde import bulk_autograde, recalculate_best_submissions
 from anubis.utils.data import with_context
 from anubis.utils.visuals.assignments import get_assignment_sundial
 from anubis.utils.logging import logger
@@ -18,6 +18,13 @@ def autograde_recalculate():
     logger.info('Recent assignments:')
     logger.info('\n'.join(' ' * 4 + assignment.name for assignment in recent_assignments))
 
+    for assignment in recent_assignments:
+        logger.info('Recalculating best submissions on {:<20} :: {:<20}'.format(
+            assignment.name,
+            assignment.course.course_code,
+        ))
+        recalculate_best_submissions(assignment.id)
+
     for assignment in recent_assignments:
         logger.info('Running bulk autograde on {:<20} :: {:<20}'.format(
             assignment.name,
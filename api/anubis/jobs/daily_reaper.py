@@ -1,6 +1,7 @@
 import traceback
 
 from anubis.constants import REAPER_TXT
+from anubis.github.api import github_map
 from anubis.github.team import add_github_team_member, remote_github_team_member, list_github_team_members
 from anubis.lms.assignments import get_recent_assignments, verify_active_assignment_github_repo_collaborators
 from anubis.lms.courses import get_active_courses
@@ -44,6 +45,9 @@ def reap_github_admin_teams():
         # Set of members of the team that should be there
         accounted_for_members = set()
 
+        # Github usernames of the members to add to the team
+        missing_members = set()
+
         for user in set(tas).union(set(profs)).union(set(superusers)):
             if user.github_username == '' or user.github_username is None:
                 logger.info(f'User does not have github linked yet, skipping for now')
@@ -55,17 +59,25 @@ def reap_github_admin_teams():
                 continue
 
             logger.info(f'Adding user to team. Not already member user = "{user.id}"')
+            missing_members.add(user.github_username)
+            accounted_for_members.add(user.github_username)
 
+        def _add_member(github_username: str):
             try:
-                add_github_team_member(course.github_org, course.github_ta_team_slug, user.github_username)
+                add_github_team_member(course.github_org, course.github_ta_team_slug, github_username)
             except Exception as e:
                 logger.error(f'Could not complete member add {e}\n\n' + traceback.format_exc())
 
-            accounted_for_members.add(user.github_username)
+        # Add the missing members, a few at a time
+        github_map(_add_member, missing_members)
 
         # Remove unaccounted for members
-        for github_username in set(members).difference(accounted_for_members):
-            remote_github_team_member(course.github_org, course.github_ta_team_slug, github_username)
+        github_map(
+            lambda github_username: remote_github_team_member(
+                course.github_org, course.github_ta_team_slug, github_username
+            ),
+            set(members).difference(accounted_for_members),
+        )
 
 
 def reap_ta_professor():
@@ -1,5 +1,4 @@
 import os
-import time
 
 if 'SENTRY_DSN' in os.environ:
     del os.environ['SENTRY_DSN']
@@ -7,16 +6,19 @@ if 'SENTRY_DSN' in os.environ:
 from kubernetes import config
 
 from anubis.utils.data import with_context
-from anubis.k8s.pipeline.reap import reap_pipeline_jobs
+from anubis.k8s.pipeline.watch import PipelineJobWatcher
 
 
 def main():
     config.load_incluster_config()
 
+    # The watcher keeps track of jobs between passes, and only
+    # reaps jobs whose status changed on the kube watch stream.
+    watcher = PipelineJobWatcher()
+
     while True:
-        with_context(reap_pipeline_jobs)()
-        time.sleep(1)
+        with_context(watcher.watch_once)()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
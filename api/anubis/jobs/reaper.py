@@ -4,18 +4,21 @@ from datetime import datetime, timedelta
 
 from anubis.constants import REAPER_TXT
 from anubis.github.fix import fix_github_missing_submissions, fix_github_broken_repos
+from anubis.k8s.pipeline.admission import PIPELINE_PRIORITY_REGRADE
 from anubis.lms.assignments import get_recent_assignments
 from anubis.lms.courses import get_active_courses
 from anubis.lms.students import get_students
 from anubis.lms.submissions import fix_submissions_for_autograde_disabled_assignment
 from anubis.lms.submissions import init_submission
+from anubis.lms.webhook import reap_webhook_deliveries
+from anubis.lms.webhook_routes import warm_webhook_routes
 from anubis.models import (
     db,
     Submission,
     SubmissionBuild,
     Course,
 )
-from anubis.rpc.enqueue import enqueue_autograde_pipeline, enqueue_ide_reap_stale, enqueue_pipeline_reap_stale
+from anubis.rpc.enqueue import enqueue_autograde_pipelines, enqueue_ide_reap_stale, enqueue_pipeline_reap_stale
 from anubis.utils.data import with_context
 from anubis.utils.logging import logger
 from anubis.constants import SHELL_AUTOGRADE_SUBMISSION_STATE_MESSAGE
@@ -60,14 +63,21 @@ def reap_recent_assignments():
         'reaping assignments:': [assignment.data for assignment in recent_assignments]
     }, indent=2))
 
+    # Keep the webhook routes for the recent assignments warm
+    warm_webhook_routes([assignment.id for assignment in recent_assignments])
+
     for assignment in recent_assignments:
+        submission_ids = []
         for submission in Submission.query.filter(
             Submission.assignment_id == assignment.id,
             Submission.build == None,
         ).all():
             if submission.build is None:
                 init_submission(submission)
-                enqueue_autograde_pipeline(submission.id)
+                submission_ids.append(submission.id)
+
+        # Enqueue the pipelines for the assignment all at once
+        enqueue_autograde_pipelines(submission_ids, priority=PIPELINE_PRIORITY_REGRADE)
 
 
 def reap_github():
@@ -156,6 +166,9 @@ def reap():
     # Reap the stale submissions
     reap_stale_submissions()
 
+    # Process any lost webhook deliveries
+    reap_webhook_deliveries()
+
     # Reap broken repos
     reap_github()
 
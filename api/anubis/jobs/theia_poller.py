@@ -7,14 +7,24 @@ if 'SENTRY_DSN' in os.environ:
 from kubernetes import config
 
 from anubis.utils.data import with_context
+from anubis.k8s.informer import start_informers
+from anubis.k8s.theia.get import theia_pod_informer
 from anubis.k8s.theia.update import update_all_theia_sessions
 
 
+# Number of poller replicas splitting up the active sessions
+THEIA_POLLER_PARTITIONS = int(os.environ.get("THEIA_POLLER_PARTITIONS", default="1"))
+
+
 def main():
     config.load_incluster_config()
 
+    # Keep theia pods cached in memory so that sessions
+    # are updated without reading each pod from the kube api.
+    start_informers(theia_pod_informer)
+
     while True:
-        with_context(update_all_theia_sessions)()
+        with_context(update_all_theia_sessions)(THEIA_POLLER_PARTITIONS)
         time.sleep(1)
 
 
@@ -2,21 +2,26 @@ from datetime import datetime, timedelta
 
 from anubis.models import Assignment, Course
 from anubis.utils.data import with_context
-from anubis.utils.visuals.assignments import get_assignment_sundial
-from anubis.utils.visuals.usage import get_usage_plot, get_usage_plot_playgrounds, get_usage_plot_active
-from anubis.utils.visuals.users import get_platform_users_plot
+from anubis.utils.usage.rollup import update_usage_rollups
+from anubis.utils.visuals.artifacts import Artifact, render_artifacts
 
 
-@with_context
-def main():
+def get_visual_artifacts() -> list[Artifact]:
+    """
+    Get all the artifacts the visuals job keeps up to date.
+
+    :return:
+    """
+    artifacts: list[Artifact] = []
+
     # Get courses with visuals enabled
     courses_with_visuals: list[Course] = Course.query.filter(
         Course.display_visuals == True
     ).all()
 
-    # Generate usage plot for each course
+    # Usage plot for each course
     for course in courses_with_visuals:
-        get_usage_plot(course.id)
+        artifacts.append(("usage", (course.id,)))
 
     # Get recent assignments
     recent_assignments: list[Assignment] = Assignment.query.filter(
@@ -24,20 +29,31 @@ def main():
         Assignment.due_date < datetime.now() - timedelta(weeks=4)
     ).all()
 
-    # Generate sundial for each
+    # Sundial for each
     for assignment in recent_assignments:
-        get_assignment_sundial(assignment.id)
+        artifacts.append(("sundial", (assignment.id,)))
 
-    # Generate playgrounds usage plot
-    get_usage_plot_playgrounds()
+    # Playgrounds usage plot
+    artifacts.append(("playgrounds", ()))
 
-    # Generate plot for active
+    # Plot for active
     for days, step in [(14, 1), (90, 7), (180, 1), (365, 30)]:
-        get_usage_plot_active(days=days, step=step)
+        artifacts.append(("active", (days, step)))
 
-    # Generate plot for last year registered users
+    # Plot for last year registered users
     for days, step in [(365, 1), (365, 30)]:
-        get_platform_users_plot(days=days, step=step)
+        artifacts.append(("platform_users", (days, step)))
+
+    return artifacts
+
+
+@with_context
+def main():
+    # Bring the usage rollups up to date
+    update_usage_rollups()
+
+    # Render the artifacts whose data changed
+    render_artifacts(get_visual_artifacts())
 
 
 if __name__ == "__main__":
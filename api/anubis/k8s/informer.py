@@ -0,0 +1,240 @@
+import os
+import threading
+import time
+import traceback
+from typing import Any, Callable, Iterator
+
+from kubernetes import client, config, watch
+
+from anubis.utils.logging import logger
+
+# Status code the kube api gives back when a watch resourceVersion has expired
+HTTP_STATUS_GONE = 410
+
+# How old (in seconds) cached cluster state can be before
+# readers fall back to listing from the kube api.
+DEFAULT_MAX_STALENESS = 60
+
+
+class KubernetesListWatchSource:
+    """
+    Lists and watches a set of kube objects selected by namespace and
+    label selector. The list_function_factory should give back a kube
+    api list function (ex: CoreV1Api().list_namespaced_pod). It is only
+    called once the kube config has been loaded.
+    """
+
+    def __init__(self, list_function_factory: Callable[[], Callable], namespace: str, label_selector: str):
+        self.list_function_factory = list_function_factory
+        self.namespace = namespace
+        self.label_selector = label_selector
+
+    def list_objects(self) -> tuple[list[Any], str]:
+        """
+        List all the selected objects, along with the resourceVersion
+        of the list that a watch can be started from.
+
+        :return: objects, resource_version
+        """
+        objects = self.list_function_factory()(
+            namespace=self.namespace,
+            label_selector=self.label_selector,
+        )
+        return objects.items, objects.metadata.resource_version
+
+    def stream_objects(self, resource_version: str, timeout_seconds: int) -> Iterator[dict]:
+        """
+        Stream watch events starting from a resourceVersion. The stream
+        ends after timeout_seconds. If the resourceVersion has expired,
+        an ApiException with status 410 will be raised.
+
+        :param resource_version:
+        :param timeout_seconds:
+        :return:
+        """
+        return watch.Watch().stream(
+            self.list_function_factory(),
+            namespace=self.namespace,
+            label_selector=self.label_selector,
+            resource_version=resource_version,
+            timeout_seconds=timeout_seconds,
+            allow_watch_bookmarks=True,
+        )
+
+
+class Informer:
+    """
+    In process cache of a set of kube objects, kept current with a
+    background list + watch loop. Readers get the cached objects only
+    while the cache is fresh. A cold or stale cache gives back None so
+    the caller can fall back to a live list.
+
+    Cached objects are replaced wholesale (never mutated in place), so
+    reads never need a lock. A forked process (ex: an rq work horse) gets
+    a copy of the cache with nothing keeping it current, so the cache is
+    only ever fresh in the process that synced it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        source,
+        resync_seconds: int = 300,
+        watch_timeout_seconds: int = 30,
+    ):
+        self.name = name
+        self.source = source
+        self.resync_seconds = resync_seconds
+        self.watch_timeout_seconds = watch_timeout_seconds
+
+        self.resource_version: str | None = None
+        self.last_resync: float = 0.0
+
+        # Last time the cache was known to match the cluster. None
+        # means the cache is cold.
+        self.last_synced: float | None = None
+
+        # Process the cache was synced in
+        self.synced_pid: int | None = None
+
+        self._objects: dict[str, Any] = {}
+        self._thread: threading.Thread | None = None
+
+    def staleness(self) -> float | None:
+        """
+        Seconds since the cache was last known to be in sync with the
+        cluster, or None if the cache is cold. A copy of the cache
+        inherited through a fork is cold.
+
+        :return:
+        """
+        if self.last_synced is None or self.synced_pid != os.getpid():
+            return None
+        return time.time() - self.last_synced
+
+    def is_fresh(self, max_staleness: float = DEFAULT_MAX_STALENESS) -> bool:
+        staleness = self.staleness()
+        return staleness is not None and staleness <= max_staleness
+
+    def list(self, max_staleness: float = DEFAULT_MAX_STALENESS) -> list[Any] | None:
+        """
+        Get all the cached objects, or None if the cache is cold or stale.
+
+        :param max_staleness:
+        :return:
+        """
+        if not self.is_fresh(max_staleness):
+            return None
+        return list(self._objects.values())
+
+    def get(self, name: str) -> Any | None:
+        """
+        Get a cached object by name. This does not check freshness,
+        so check is_fresh first.
+
+        :param name:
+        :return:
+        """
+        return self._objects.get(name, None)
+
+    def resync(self):
+        """
+        Replace the cache with a full list of the objects, and start
+        watching from the resourceVersion of the list.
+
+        :return:
+        """
+        objects, resource_version = self.source.list_objects()
+        self._objects = {obj.metadata.name: obj for obj in objects}
+        self.resource_version = resource_version
+        self.last_resync = self.last_synced = time.time()
+        self.synced_pid = os.getpid()
+        logger.info(f"informer {self.name} resynced resource_version={resource_version} objects={len(objects)}")
+
+    def handle_event(self, event: dict):
+        """
+        Apply a single watch event to the cache.
+
+        :param event:
+        :return:
+        """
+        event_type = event["type"]
+
+        # Bookmarks only move the resourceVersion forward
+        if event_type == "BOOKMARK":
+            self.resource_version = event["raw_object"]["metadata"]["resourceVersion"]
+            return
+
+        obj = event["object"]
+        objects = dict(self._objects)
+        if event_type == "DELETED":
+            objects.pop(obj.metadata.name, None)
+        else:
+            objects[obj.metadata.name] = obj
+        self._objects = objects
+        self.resource_version = obj.metadata.resource_version
+
+    def sync_once(self):
+        """
+        Resync if needed, then apply watch events until the stream times out.
+
+        :return:
+        """
+        if self.resource_version is None or time.time() - self.last_resync > self.resync_seconds:
+            self.resync()
+
+        try:
+            for event in self.source.stream_objects(self.resource_version, self.watch_timeout_seconds):
+                self.handle_event(event)
+                self.last_synced = time.time()
+        except client.exceptions.ApiException as e:
+            if e.status != HTTP_STATUS_GONE:
+                raise
+
+            # The resourceVersion we were watching from is too old. Resync
+            # on the next pass.
+            logger.info(f"informer {self.name} watch expired resource_version={self.resource_version}")
+            self.resource_version = None
+            return
+
+        # The watch ended cleanly, so we were current up to now
+        self.last_synced = time.time()
+
+    def run(self):
+        while True:
+            try:
+                self.sync_once()
+            except Exception:
+                logger.error(f"informer {self.name} failed, relisting\n" + traceback.format_exc())
+                self.resource_version = None
+                time.sleep(1)
+
+    def start(self):
+        """
+        Start the background list + watch thread (if not already started).
+
+        :return:
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self.run, name=f"informer-{self.name}", daemon=True)
+        self._thread.start()
+
+
+def start_informers(*informers: Informer):
+    """
+    Load the incluster kube config, and start the given informers. Outside
+    of a cluster the informers stay cold, and readers keep listing from
+    the kube api.
+
+    :param informers:
+    :return:
+    """
+    try:
+        config.load_incluster_config()
+    except config.ConfigException:
+        logger.warning("not running in cluster, skipping informers")
+        return
+
+    for informer in informers:
+        informer.start()
@@ -0,0 +1,192 @@
+"""
+Admission scheduler for submission pipeline jobs.
+
+Submissions waiting for a pipeline are parked in a redis sorted set, ordered
+by priority then by the time they were parked. In-flight pipelines hold a
+slot in a second sorted set (scored by when the slot was taken) capped at
+PIPELINE_MAX_JOBS. Slots are released when the pipeline job is reaped, and
+expire on their own after the pipeline timeout in case a release is missed.
+"""
+
+import time
+
+from anubis.utils.config import get_config_int
+from anubis.utils.data import split_chunks
+from anubis.utils.logging import logger
+from anubis.utils.redis import redis
+
+# Priorities for parked pipelines. Lower priorities are admitted first.
+PIPELINE_PRIORITY_STUDENT = 0
+PIPELINE_PRIORITY_REGRADE = 1
+
+PIPELINE_SLOTS_KEY = "pipeline-admission-slots"
+PIPELINE_PENDING_KEY = "pipeline-admission-pending"
+
+# Spacing between priority levels in the pending scores. Within
+# a priority level, the score is the time the pipeline was parked.
+_PRIORITY_SPACING = 1e10
+
+# Atomically drop expired slots, then move pending pipelines into
+# free slots. Gives back a flat list of [submission_id, pending_score, ...]
+_ADMIT_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[2])
+local admitted = {}
+while redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[3]) do
+    local popped = redis.call('ZPOPMIN', KEYS[2])
+    if #popped == 0 then
+        break
+    end
+    redis.call('ZADD', KEYS[1], ARGV[1], popped[1])
+    table.insert(admitted, popped[1])
+    table.insert(admitted, popped[2])
+end
+return admitted
+"""
+
+# Park members at the score in ARGV[1], unless they are already parked
+# at an earlier score. This is ZADD LT without needing redis 6.2.
+_PARK_SCRIPT = """
+for i = 2, #ARGV do
+    local current = redis.call('ZSCORE', KEYS[1], ARGV[i])
+    if not current or tonumber(current) > tonumber(ARGV[1]) then
+        redis.call('ZADD', KEYS[1], ARGV[1], ARGV[i])
+    end
+end
+return #ARGV - 1
+"""
+
+_admit_script = redis.register_script(_ADMIT_SCRIPT) if redis is not None else None
+_park_script = redis.register_script(_PARK_SCRIPT) if redis is not None else None
+
+
+def admission_enabled() -> bool:
+    return redis is not None
+
+
+def _get_slot_lease_seconds() -> int:
+    # Slots outlive the pipeline timeout by a few minutes to give the
+    # poller a chance to reap (and release) the job.
+    return (get_config_int("AUTOGRADE_PIPELINE_TIMEOUT_MINUTES", default=5) + 5) * 60
+
+
+def park_pipeline(submission_id: str, priority: int = PIPELINE_PRIORITY_STUDENT, now: float = None):
+    """
+    Park a submission to wait for a pipeline slot. If the submission is
+    already parked, it keeps whichever of the two places is earlier.
+
+    :param submission_id:
+    :param priority:
+    :param now:
+    :return:
+    """
+    park_pipelines([submission_id], priority=priority, now=now)
+
+
+def park_pipelines(
+    submission_ids: list[str],
+    priority: int = PIPELINE_PRIORITY_STUDENT,
+    now: float = None,
+    chunk_size: int = 1000,
+):
+    """
+    Park many submissions at once. All the chunks are sent
+    in a single pipelined round trip to redis.
+
+    :param submission_ids:
+    :param priority:
+    :param now:
+    :param chunk_size: max number of submissions parked by each script call
+    :return:
+    """
+    score = priority * _PRIORITY_SPACING + (now or time.time())
+    pipe = redis.pipeline(transaction=False)
+    for chunk in split_chunks(submission_ids, chunk_size):
+        _park_script(keys=[PIPELINE_PENDING_KEY], args=[score, *chunk], client=pipe)
+    pipe.execute()
+
+
+def admit_pipelines(now: float = None) -> list[str]:
+    """
+    Move as many parked submissions into free pipeline slots as possible.
+
+    :param now:
+    :return: list of admitted submission ids
+    """
+    now = now or time.time()
+    max_jobs = get_config_int("PIPELINE_MAX_JOBS", default=10)
+
+    result = _admit_script(
+        keys=[PIPELINE_SLOTS_KEY, PIPELINE_PENDING_KEY],
+        args=[now, now - _get_slot_lease_seconds(), max_jobs],
+    )
+
+    admitted = []
+    for submission_id, score in zip(result[::2], result[1::2]):
+        submission_id = submission_id.decode()
+
+        # Pull the priority and parked time back out of the pending score
+        score = float(score)
+        priority = int(score // _PRIORITY_SPACING)
+        parked = score - priority * _PRIORITY_SPACING
+
+        logger.info(
+            "pipeline admitted",
+            extra={
+                "submission_id": submission_id,
+                "priority":      priority,
+                "queue_latency": now - parked,
+            },
+        )
+        admitted.append(submission_id)
+
+    return admitted
+
+
+def release_pipeline_slot(submission_id: str):
+    """
+    Give back the pipeline slot held by a submission.
+
+    :param submission_id:
+    :return:
+    """
+    if not admission_enabled():
+        return
+    redis.zrem(PIPELINE_SLOTS_KEY, submission_id)
+
+
+def dispatch_pipelines(queue: str = "regrade"):
+    """
+    Admit parked submissions into free slots, and enqueue
+    their pipeline creation.
+
+    :param queue:
+    :return:
+    """
+    from anubis.rpc.enqueue import enqueue_create_submission_pipelines
+
+    if not admission_enabled():
+        return
+
+    enqueue_create_submission_pipelines(admit_pipelines(), queue=queue)
+
+
+def get_pipeline_admission_stats() -> dict:
+    """
+    Current number of in-flight pipelines, and number of parked
+    pipelines at each priority.
+
+    :return:
+    """
+    return {
+        "in_flight": redis.zcard(PIPELINE_SLOTS_KEY),
+        "pending_student": redis.zcount(
+            PIPELINE_PENDING_KEY,
+            PIPELINE_PRIORITY_STUDENT * _PRIORITY_SPACING,
+            f"({PIPELINE_PRIORITY_REGRADE * _PRIORITY_SPACING}",
+        ),
+        "pending_regrade": redis.zcount(
+            PIPELINE_PENDING_KEY,
+            PIPELINE_PRIORITY_REGRADE * _PRIORITY_SPACING,
+            "+inf",
+        ),
+    }
@@ -3,9 +3,8 @@ import time
 
 from kubernetes import client, config
 
-from anubis.k8s.pipeline.get import get_active_pipeline_jobs
+from anubis.k8s.pipeline.admission import release_pipeline_slot
 from anubis.models import Submission, db
-from anubis.utils.config import get_config_int
 from anubis.utils.data import is_debug
 from anubis.utils.logging import logger
 
@@ -13,12 +12,13 @@ from anubis.utils.logging import logger
 def create_submission_pipeline(submission_id: str):
     """
     This function should launch the appropriate testing container
-    for the assignment, passing along the function arguments.
+    for the assignment, passing along the function arguments. It is
+    only called once the submission has been admitted into a pipeline
+    slot (see anubis.k8s.pipeline.admission).
 
     :param submission_id: submission.id of to test
     """
     from anubis.lms.submissions import init_submission
-    from anubis.rpc.enqueue import enqueue_autograde_pipeline
 
     # Log the creation event
     logger.info(
@@ -28,23 +28,9 @@ def create_submission_pipeline(submission_id: str):
         },
     )
 
-    # Calculate the maximum number of jobs allowed in the cluster
-    max_jobs = get_config_int("PIPELINE_MAX_JOBS", default=10)
-
     # Initialize kube client
     config.load_incluster_config()
 
-    # Cleanup finished jobs
-    active_jobs = len(get_active_pipeline_jobs())
-
-    if active_jobs > max_jobs:
-        logger.info(
-            "TOO many jobs - re-enqueue {}".format(submission_id),
-            extra={"submission_id": submission_id},
-        )
-        enqueue_autograde_pipeline(submission_id)
-        exit(0)
-
     # Get the database entry for the submission
     submission = Submission.query.filter(Submission.id == submission_id).first()
 
@@ -56,10 +42,12 @@ def create_submission_pipeline(submission_id: str):
                 "submission_id": submission_id,
             },
         )
+        release_pipeline_slot(submission_id)
         return
 
     if not submission.assignment.autograde_enabled:
         logger.error(f'Autograde disabled for assignment {submission.assignment=}')
+        release_pipeline_slot(submission_id)
         return
 
     # If the build field is not present, then
@@ -77,9 +65,14 @@ def create_submission_pipeline(submission_id: str):
     # Log the pipeline job creation
     logger.debug("creating pipeline job: " + job.to_str())
 
-    # Send to kube api
+    # Send to kube api. If the job could not be created, give
+    # back the pipeline slot this submission was admitted with.
     batch_v1 = client.BatchV1Api()
-    batch_v1.create_namespaced_job(body=job, namespace="anubis")
+    try:
+        batch_v1.create_namespaced_job(body=job, namespace="anubis")
+    except Exception:
+        release_pipeline_slot(submission_id)
+        raise
 
 
 def create_pipeline_job_obj(submission: Submission) -> client.V1Job:
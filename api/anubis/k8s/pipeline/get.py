@@ -1,12 +1,24 @@
 from kubernetes import client
 
+from anubis.k8s.informer import KubernetesListWatchSource
+
+PIPELINE_JOB_NAMESPACE = "anubis"
+PIPELINE_JOB_LABEL_SELECTOR = "app.kubernetes.io/name=submission-pipeline,role=submission-pipeline-worker"
+
+# List and watch source for pipeline jobs (see anubis.k8s.pipeline.watch)
+pipeline_job_source = KubernetesListWatchSource(
+    lambda: client.BatchV1Api().list_namespaced_job,
+    namespace=PIPELINE_JOB_NAMESPACE,
+    label_selector=PIPELINE_JOB_LABEL_SELECTOR,
+)
+
 
 def get_active_pipeline_jobs() -> list[client.V1Job]:
     batch_v1 = client.BatchV1Api()
 
     # Get all pipeline jobs in the anubis namespace
     jobs = batch_v1.list_namespaced_job(
-        namespace="anubis",
-        label_selector="app.kubernetes.io/name=submission-pipeline,role=submission-pipeline-worker",
+        namespace=PIPELINE_JOB_NAMESPACE,
+        label_selector=PIPELINE_JOB_LABEL_SELECTOR,
     )
     return jobs.items
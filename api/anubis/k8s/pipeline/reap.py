@@ -4,6 +4,7 @@ from datetime import datetime, timedelta
 import kubernetes
 from kubernetes import client
 
+from anubis.k8s.pipeline.admission import dispatch_pipelines, release_pipeline_slot
 from anubis.k8s.pipeline.get import get_active_pipeline_jobs
 from anubis.models import Submission, db
 from anubis.utils.config import get_config_int
@@ -20,6 +21,10 @@ def reap_pipeline_job(job: client.V1Job, submission: Submission):
     # Attempt to delete the k8s job
     delete_pipeline_job(job)
 
+    # Give back the pipeline slot, and let the next parked submission in
+    release_pipeline_slot(submission.id)
+    dispatch_pipelines()
+
 
 def delete_pipeline_job(job: client.V1Job):
     batch_v1 = client.BatchV1Api()
@@ -73,9 +78,6 @@ def reap_pipeline_jobs():
     :return: number of active jobs
     """
 
-    # Get the batch v1 object so we can query for active k8s jobs
-    batch_v1 = client.BatchV1Api()
-
     # Get all pipeline jobs in the anubis namespace
     jobs = get_active_pipeline_jobs()
 
@@ -84,21 +86,60 @@ def reap_pipeline_jobs():
 
     # Iterate through all pipeline jobs
     for job in jobs:
-        job: client.V1Job
+        reap_pipeline_job_if_done(job, autograde_pipeline_timeout_minutes)
+
+
+def is_pipeline_job_done(job: client.V1Job, autograde_pipeline_timeout_minutes: int) -> bool:
+    """
+    Check if a pipeline job has either succeeded, or has been
+    running for longer than the autograde pipeline timeout.
 
-        # If submission id not in labels just skip. Job ttl will delete itself.
-        if 'submission-id' not in job.metadata.labels:
-            logger.error(f'skipping job based off old label format: {job.metadata.name}')
-            continue
+    :param job:
+    :param autograde_pipeline_timeout_minutes:
+    :return:
+    """
+
+    # If the job has finished, and was marked as successful, then
+    # we can clean it up
+    if job.status is not None and job.status.succeeded is not None and job.status.succeeded >= 1:
+        return True
+
+    # Calculate job created time
+    job_created = job.metadata.creation_timestamp.replace(tzinfo=None)
 
-        # Read submission id from labels
-        submission_id = job.metadata.labels['submission-id']
+    # The job is done if it is older than a few minutes
+    return datetime.utcnow() - job_created > timedelta(minutes=autograde_pipeline_timeout_minutes)
 
-        # Create a distributed lock for the submission job
-        lock = create_redis_lock(f'submission-job-{submission_id}')
-        if not lock.acquire(blocking=False):
-            continue
 
+def reap_pipeline_job_if_done(job: client.V1Job, autograde_pipeline_timeout_minutes: int) -> bool:
+    """
+    Reap a single pipeline job if it is done. A distributed lock is held on
+    the submission while the job is inspected so that multiple pollers
+    do not reap the same job.
+
+    :param job:
+    :param autograde_pipeline_timeout_minutes:
+    :return: True if the job was reaped
+    """
+
+    # If submission id not in labels just skip. Job ttl will delete itself.
+    if 'submission-id' not in job.metadata.labels:
+        logger.error(f'skipping job based off old label format: {job.metadata.name}')
+        return False
+
+    # Skip jobs that are still running
+    if not is_pipeline_job_done(job, autograde_pipeline_timeout_minutes):
+        return False
+
+    # Read submission id from labels
+    submission_id = job.metadata.labels['submission-id']
+
+    # Create a distributed lock for the submission job
+    lock = create_redis_lock(f'submission-job-{submission_id}')
+    if not lock.acquire(blocking=False):
+        return False
+
+    try:
         # Log that we are inspecting the pipeline
         logger.debug(f'inspecting pipeline: {job.metadata.name}')
 
@@ -108,22 +149,10 @@ def reap_pipeline_jobs():
         ).first()
         if submission is None:
             logger.error(f"submission from db not found {submission_id}")
-            continue
-
-        # Calculate job created time
-        job_created = job.metadata.creation_timestamp.replace(tzinfo=None)
-
-        # Delete the job if it is older than a few minutes
-        if datetime.utcnow() - job_created > timedelta(minutes=autograde_pipeline_timeout_minutes):
-
-            # Attempt to delete the k8s job
-            reap_pipeline_job(job, submission)
-
-        # If the job has finished, and was marked as successful, then
-        # we can clean it up
-        elif job.status.succeeded is not None and job.status.succeeded >= 1:
-
-            # Attempt to delete the k8s job
-            reap_pipeline_job(job, submission)
+            return False
 
+        # Attempt to delete the k8s job
+        reap_pipeline_job(job, submission)
+        return True
+    finally:
         lock.release()
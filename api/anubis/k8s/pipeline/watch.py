@@ -0,0 +1,190 @@
+import time
+from typing import Callable
+
+from kubernetes import client
+
+from anubis.k8s.informer import HTTP_STATUS_GONE
+from anubis.k8s.pipeline.admission import dispatch_pipelines
+from anubis.k8s.pipeline.get import pipeline_job_source
+from anubis.k8s.pipeline.reap import is_pipeline_job_done, reap_pipeline_job_if_done
+from anubis.utils.config import get_config_int
+from anubis.utils.logging import logger
+
+
+def _job_status_key(job: client.V1Job) -> tuple:
+    """
+    The parts of a job status that we care about when deciding
+    if a job needs to be looked at again.
+
+    :param job:
+    :return:
+    """
+    status = job.status
+    if status is None:
+        return None, None, None
+    return status.active, status.succeeded, status.failed
+
+
+class PipelineJobWatcher:
+    """
+    Tracks submission pipeline jobs from the kube watch stream instead of
+    listing every job each second. Jobs are only inspected (and reaped) when
+    their status changes. Jobs that time out without any status change are
+    caught from the locally tracked jobs, without going to the kube api.
+
+    The job list is re-fetched when the watch resourceVersion expires, and
+    every resync_seconds as a safety net for missed events.
+    """
+
+    def __init__(
+        self,
+        source=None,
+        reap: Callable[[client.V1Job, int], bool] = reap_pipeline_job_if_done,
+        dispatch: Callable[[], None] = dispatch_pipelines,
+        watch_timeout_seconds: int = 10,
+        resync_seconds: int = 300,
+        timeout_minutes: int | None = None,
+    ):
+        self.source = source or pipeline_job_source
+        self.reap = reap
+        self.dispatch = dispatch
+        self.watch_timeout_seconds = watch_timeout_seconds
+        self.resync_seconds = resync_seconds
+        self.timeout_minutes = timeout_minutes
+
+        self.resource_version: str | None = None
+        self.last_resync: float = 0.0
+
+        # Unfinished jobs by name, and the last status we inspected them at
+        self.jobs: dict[str, client.V1Job] = {}
+        self.job_status: dict[str, tuple] = {}
+
+        # Jobs that have been reaped, but not yet removed from the kube api
+        self.reaped: set[str] = set()
+
+    def _get_timeout_minutes(self) -> int:
+        if self.timeout_minutes is not None:
+            return self.timeout_minutes
+        return get_config_int("AUTOGRADE_PIPELINE_TIMEOUT_MINUTES", default=5)
+
+    def _forget(self, name: str):
+        self.jobs.pop(name, None)
+        self.job_status.pop(name, None)
+
+    def _inspect(self, job: client.V1Job, timeout_minutes: int):
+        """
+        Inspect a job and reap it if it is done.
+
+        :param job:
+        :param timeout_minutes:
+        :return:
+        """
+        name = job.metadata.name
+
+        # Jobs that are already being deleted have nothing left to do
+        if job.metadata.deletion_timestamp is not None or name in self.reaped:
+            self._forget(name)
+            return
+
+        self.jobs[name] = job
+        self.job_status[name] = _job_status_key(job)
+
+        if self.reap(job, timeout_minutes):
+            self.reaped.add(name)
+            self._forget(name)
+
+    def resync(self, timeout_minutes: int):
+        """
+        List all pipeline jobs, inspect each of them, and start
+        watching from the resourceVersion of the list.
+
+        :param timeout_minutes:
+        :return:
+        """
+        jobs, resource_version = self.source.list_objects()
+        logger.info(f"resyncing pipeline jobs resource_version={resource_version} jobs={len(jobs)}")
+
+        # Start from a clean slate. Reaped jobs that are no longer in the
+        # list have been fully deleted.
+        names = {job.metadata.name for job in jobs}
+        self.reaped &= names
+        self.jobs = {}
+        self.job_status = {}
+
+        for job in jobs:
+            self._inspect(job, timeout_minutes)
+
+        self.resource_version = resource_version
+        self.last_resync = time.time()
+
+    def handle_event(self, event: dict, timeout_minutes: int):
+        """
+        Handle a single watch event.
+
+        :param event:
+        :param timeout_minutes:
+        :return:
+        """
+        event_type = event["type"]
+
+        # Bookmarks only move the resourceVersion forward
+        if event_type == "BOOKMARK":
+            self.resource_version = event["raw_object"]["metadata"]["resourceVersion"]
+            return
+
+        job: client.V1Job = event["object"]
+        name = job.metadata.name
+        self.resource_version = job.metadata.resource_version
+
+        if event_type == "DELETED":
+            self.reaped.discard(name)
+            self._forget(name)
+            return
+
+        # Skip jobs whose status has not changed since we last looked at them
+        if name in self.job_status and self.job_status[name] == _job_status_key(job):
+            self.jobs[name] = job
+            return
+
+        self._inspect(job, timeout_minutes)
+
+    def reap_timed_out(self, timeout_minutes: int):
+        """
+        Reap tracked jobs that have run past the pipeline timeout. This
+        only looks at the jobs we are tracking locally.
+
+        :param timeout_minutes:
+        :return:
+        """
+        for job in list(self.jobs.values()):
+            if is_pipeline_job_done(job, timeout_minutes):
+                self._inspect(job, timeout_minutes)
+
+    def watch_once(self):
+        """
+        Resync if needed, then consume the watch stream until it times out.
+
+        :return:
+        """
+        timeout_minutes = self._get_timeout_minutes()
+
+        if self.resource_version is None or time.time() - self.last_resync > self.resync_seconds:
+            self.resync(timeout_minutes)
+
+        try:
+            for event in self.source.stream_objects(self.resource_version, self.watch_timeout_seconds):
+                self.handle_event(event, timeout_minutes)
+        except client.exceptions.ApiException as e:
+            if e.status != HTTP_STATUS_GONE:
+                raise
+
+            # The resourceVersion we were watching from is too old. Resync
+            # on the next pass.
+            logger.info(f"pipeline job watch expired resource_version={self.resource_version}")
+            self.resource_version = None
+
+        self.reap_timed_out(timeout_minutes)
+
+        # Admit parked submissions into any slots that expired
+        # without being released.
+        self.dispatch()
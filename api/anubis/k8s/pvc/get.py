@@ -4,6 +4,24 @@ from anubis.models import User, TheiaSession
 from anubis.utils.config import get_config_str
 
 
+def get_pvc(pvc_name: str) -> k8s.V1PersistentVolumeClaim | None:
+    """
+    Get a theia session pvc by name. None is returned
+    if the pvc does not exist.
+
+    :param pvc_name:
+    :return:
+    """
+    v1 = k8s.CoreV1Api()
+
+    try:
+        return v1.read_namespaced_persistent_volume_claim(namespace="anubis", name=pvc_name)
+    except k8s.exceptions.ApiException as e:
+        if e.status == 404:
+            return None
+        raise
+
+
 def get_pvc_size(owner: User, theia_session: TheiaSession = None) -> str:
     if owner.is_anubis_developer:
         return get_config_str('DEVELOPER_VOLUME_SIZE', '4Gi')
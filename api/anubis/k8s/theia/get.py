@@ -1,7 +1,21 @@
 from kubernetes import client as k8s
 
+from anubis.k8s.informer import Informer, KubernetesListWatchSource
 from anubis.models import TheiaSession
 
+THEIA_POD_LABEL_SELECTOR = "app.kubernetes.io/name=anubis,role=theia-session"
+
+# In process cache of theia pods. Only kept current in
+# processes that start it (see anubis.k8s.informer.start_informers).
+theia_pod_informer = Informer(
+    "theia-pods",
+    KubernetesListWatchSource(
+        lambda: k8s.CoreV1Api().list_namespaced_pod,
+        namespace="anubis",
+        label_selector=THEIA_POD_LABEL_SELECTOR,
+    ),
+)
+
 
 def list_theia_pods() -> k8s.V1PodList:
     """
@@ -11,17 +25,47 @@ def list_theia_pods() -> k8s.V1PodList:
 
     :return:
     """
+
+    # Read from the informer cache if it is fresh
+    pods = theia_pod_informer.list()
+    if pods is not None:
+        return k8s.V1PodList(items=pods)
+
     v1 = k8s.CoreV1Api()
 
     # list pods by label selector
     pods = v1.list_namespaced_pod(
         namespace="anubis",
-        label_selector="app.kubernetes.io/name=anubis,role=theia-session",
+        label_selector=THEIA_POD_LABEL_SELECTOR,
     )
 
     return pods
 
 
+def get_theia_pod(pod_name: str) -> k8s.V1Pod | None:
+    """
+    Get a theia pod by name. None is returned if the
+    pod does not exist (or has not been created yet).
+
+    :param pod_name:
+    :return:
+    """
+
+    # Read from the informer cache if it is fresh
+    if theia_pod_informer.is_fresh():
+        return theia_pod_informer.get(pod_name)
+
+    v1 = k8s.CoreV1Api()
+
+    try:
+        return v1.read_namespaced_pod(namespace="anubis", name=pod_name)
+    except k8s.exceptions.ApiException as e:
+        # If the status code is 404, then it has not been created yet
+        if e.status == 404:
+            return None
+        raise
+
+
 def active_theia_pod_count() -> int:
     """
     Get the number of currently active theia pods in
@@ -8,9 +8,14 @@ from anubis.k8s.theia.update import update_theia_pod_cluster_addresses
 from anubis.lms.courses import get_active_courses, get_course_admin_ids
 from anubis.models import TheiaSession, db, Course
 from anubis.utils.config import get_config_int
+from anubis.utils.data import split_chunks
 from anubis.utils.logging import logger
 from anubis.lms.reserve import get_active_reserved_sessions
 
+# Number of sessions to reap with each label selector delete
+# (and each UPDATE). This keeps the selector a reasonable size.
+THEIA_REAP_BATCH_SIZE = 100
+
 
 def reap_stale_theia_sessions(*_):
     """
@@ -70,6 +75,72 @@ def reap_theia_session_k8s_resources(theia_session_id: str):
     )
 
 
+def reap_theia_sessions_k8s_resources(theia_session_ids: list[str]):
+    """
+    Mark the kubernetes resources of many theia sessions for deletion. Pods
+    are deleted with one set based label selector per batch of sessions.
+
+    :param theia_session_ids:
+    :return:
+    """
+    v1 = k8s.CoreV1Api()
+
+    for chunk in split_chunks(theia_session_ids, THEIA_REAP_BATCH_SIZE):
+        # Log the reap
+        logger.info("Reaping TheiaSessions {}".format(chunk))
+
+        # Mark the pods for deletion by a label selector
+        v1.delete_collection_namespaced_pod(
+            namespace="anubis",
+            label_selector="app.kubernetes.io/name=anubis,role=theia-session,session in ({})".format(
+                ",".join(chunk),
+            ),
+            propagation_policy="Background",
+        )
+
+
+def reap_theia_sessions(theia_session_ids: list[str]):
+    """
+    Reap many theia sessions at once. The pods are marked for deletion
+    in batches, then the database entries are marked as ended (and any
+    shell autograde submissions closed) with bulk UPDATEs.
+
+    :param theia_session_ids:
+    :return:
+    """
+    from anubis.lms.shell_autograde import close_shell_autograde_ide_submissions
+
+    theia_session_ids = list(theia_session_ids)
+    if len(theia_session_ids) == 0:
+        return
+
+    # Mark the session resources in kubernetes for deletion
+    reap_theia_sessions_k8s_resources(theia_session_ids)
+
+    now = datetime.now()
+    for chunk in split_chunks(theia_session_ids, THEIA_REAP_BATCH_SIZE):
+        # Get the shell autograde submissions of the sessions
+        submission_ids = [
+            submission_id
+            for submission_id, in db.session.query(TheiaSession.submission_id).filter(
+                TheiaSession.id.in_(chunk),
+                TheiaSession.submission_id != None,
+            )
+        ]
+
+        # Mark the database entries as ended
+        TheiaSession.query.filter(TheiaSession.id.in_(chunk)).update({
+            TheiaSession.active: False,
+            TheiaSession.state:  "Ended",
+            TheiaSession.ended:  now,
+        }, synchronize_session=False)
+
+        # Close the shell autograde submissions
+        close_shell_autograde_ide_submissions(submission_ids)
+
+    db.session.commit()
+
+
 def reap_old_theia_sessions(theia_pods: k8s.V1PodList):
     """
     Check that all the active pods have not reached the
@@ -83,29 +154,24 @@ def reap_old_theia_sessions(theia_pods: k8s.V1PodList):
     theia_stale_timeout_hours = get_config_int("THEIA_STALE_TIMEOUT_HOURS", default=6)
     theia_stale_timeout = timedelta(hours=theia_stale_timeout_hours)
 
-    # Iterate through all active
-    for n, pod in enumerate(theia_pods.items):
-
-        # Get the theia session id from the pod labels
-        session_id = pod.metadata.labels["session"]
-
-        # Get the database entry for the theia session
-        theia_session: TheiaSession = TheiaSession.query.filter(TheiaSession.id == session_id).first()
-
-        # Make sure we have a session to work on
-        if theia_session is None:
-            continue
-
-        if datetime.now() <= theia_session.created + theia_stale_timeout:
-            logger.info(f"NOT reaping session {theia_session.id}: age ok")
-            continue
+    # Get the theia session ids from the pod labels
+    pod_session_ids = [pod.metadata.labels["session"] for pod in theia_pods.items]
+
+    # Find the sessions for the pods that are past the timeout
+    old_session_ids = []
+    for chunk in split_chunks(pod_session_ids, THEIA_REAP_BATCH_SIZE):
+        old_session_ids.extend(
+            session_id
+            for session_id, in db.session.query(TheiaSession.id).filter(
+                TheiaSession.id.in_(chunk),
+                TheiaSession.created < datetime.now() - theia_stale_timeout,
+            )
+        )
 
-        # Reap the session
-        reap_theia_session(theia_session, commit=False)
+    logger.info(f"Reaping {len(old_session_ids)} of {len(pod_session_ids)} sessions past the stale timeout")
 
-        # Batch commits in size of 5
-        if n % 5 == 0:
-            db.session.commit()
+    # Reap the sessions
+    reap_theia_sessions(old_session_ids)
 
 
 def reap_theia_session(theia_session: TheiaSession, commit: bool = True):
@@ -174,9 +240,8 @@ def reap_theia_sessions_in_course(course_id: str):
     Reap all theia sessions within a specific course. This will
     kick everyone off their IDEs.
 
-    There may be many database entries that this function updates
-    so we will batch commits to help speed things up, while
-    keeping things relatively consistent in the cluster.
+    There may be many sessions, so the pods are deleted and
+    the database entries updated in batches.
 
     :param course_id:
     :return:
@@ -190,22 +255,16 @@ def reap_theia_sessions_in_course(course_id: str):
 
     # Find all theia sessions in the database that are
     # marked as active.
-    theia_sessions = TheiaSession.query.filter(
-        TheiaSession.active == True,
-        TheiaSession.course_id == course_id,
-    ).all()
-
-    # Iterate through all active theia sessions in the database, deleting and
-    # updating as we go.
-    for n, theia_session in enumerate(theia_sessions):
-        # Reap the session
-        reap_theia_session(theia_session, commit=False)
-
-        # Batch commits in size of 5
-        if n % 5 == 0:
-            db.session.commit()
+    theia_session_ids = [
+        theia_session_id
+        for theia_session_id, in db.session.query(TheiaSession.id).filter(
+            TheiaSession.active == True,
+            TheiaSession.course_id == course_id,
+        )
+    ]
 
-    db.session.commit()
+    # Reap all the sessions in batches
+    reap_theia_sessions(theia_session_ids)
 
 
 def reap_theia_playgrounds_all():
@@ -213,9 +272,8 @@ def reap_theia_playgrounds_all():
     Reap all theia sessions within anubis playgrounds. This will
     kick everyone off their IDEs.
 
-    There may be many database entries that this function updates
-    so we will batch commits to help speed things up, while
-    keeping things relatively consistent in the cluster.
+    There may be many sessions, so the pods are deleted and
+    the database entries updated in batches.
 
     :return:
     """
@@ -228,22 +286,16 @@ def reap_theia_playgrounds_all():
 
     # Find all theia sessions in the database that are
     # marked as active.
-    theia_sessions = TheiaSession.query.filter(
-        TheiaSession.active == True,
-        TheiaSession.playground == True,
-    ).all()
-
-    # Iterate through all active theia sessions in the database, deleting and
-    # updating as we go.
-    for n, theia_session in enumerate(theia_sessions):
-        # Reap the session
-        reap_theia_session(theia_session, commit=False)
+    theia_session_ids = [
+        theia_session_id
+        for theia_session_id, in db.session.query(TheiaSession.id).filter(
+            TheiaSession.active == True,
+            TheiaSession.playground == True,
+        )
+    ]
 
-        # Batch commits in size of 5
-        if n % 5 == 0:
-            db.session.commit()
-
-    db.session.commit()
+    # Reap all the sessions in batches
+    reap_theia_sessions(theia_session_ids)
 
 
 def reap_stale_theia_k8s_resources(theia_pods: k8s.V1PodList):
@@ -367,9 +419,7 @@ def reap_stale_theia_k8s_resources(theia_pods: k8s.V1PodList):
         logger.info("Found stale theia database entries: {}".format(str(list(stale_db_ids))))
 
     # Reap theia sessions
-
-    for stale_pod_id in stale_pods_ids:
-        reap_theia_session_by_id(stale_pod_id)
+    reap_theia_sessions(list(stale_pods_ids))
 
     # Update database entries
     TheiaSession.query.filter(
@@ -1,179 +1,319 @@
+import os
+import socket
 import traceback
+import zlib
+from datetime import datetime, timedelta
+from typing import Any
 
 from kubernetes import client as k8s
+from sqlalchemy import case
 
-from anubis.k8s.theia.get import get_theia_pod_name
-from anubis.lms.theia import get_active_theia_sessions
-from anubis.models import TheiaSession, db
+from anubis.k8s.theia.get import list_theia_pods
+from anubis.models import TheiaSession, User, db
+from anubis.utils.config import get_config_int
+from anubis.utils.data import split_chunks
 from anubis.utils.logging import logger
-from anubis.utils.redis import create_redis_lock
+from anubis.utils.redis import claim_redis_partition, redis
+
+# Unique id of this poller process, for holding a partition of the sessions
+THEIA_POLLER_OWNER = f"{socket.gethostname()}-{os.getpid()}"
+
+# Number of sessions to load (and update) at a time
+THEIA_UPDATE_BATCH_SIZE = 500
 
 
 def update_theia_pod_cluster_addresses(theia_pods: k8s.V1PodList):
     """
-    Iterate through all theia pods, updating the pod cluster
-    addresses in the database as we go.
+    Update the cluster addresses of the theia sessions in the database
+    to match their pods. The sessions are loaded with IN queries, and
+    only the addresses that changed are written (with one UPDATE per
+    batch).
 
     :param theia_pods:
     :return:
     """
 
-    # Iterate through all active
-    for n, pod in enumerate(theia_pods.items):
-        # Get the session id from the pod labels
-        session_id = pod.metadata.labels["session"]
-
-        # Get the database entry for the theia session
-        theia_session: TheiaSession = TheiaSession.query.filter(TheiaSession.id == session_id).first()
-
-        # Make sure we have a session to work on
-        if theia_session is None:
+    # Get the pod cluster address for each session id (from the pod labels)
+    pod_addresses: dict[str, str | None] = {
+        pod.metadata.labels["session"]: pod.status.pod_ip
+        for pod in theia_pods.items
+    }
+
+    for chunk in split_chunks(list(pod_addresses.keys()), THEIA_UPDATE_BATCH_SIZE):
+        # Find the sessions whose address does not match their pod
+        changed: dict[str, str | None] = {
+            session_id: pod_addresses[session_id]
+            for session_id, cluster_address in db.session.query(
+                TheiaSession.id, TheiaSession.cluster_address
+            ).filter(TheiaSession.id.in_(chunk))
+            if cluster_address != pod_addresses[session_id]
+        }
+        if len(changed) == 0:
             continue
 
-        # Update the theia session record in the database with
-        # the pod cluster address.
-        theia_session.cluster_address = pod.status.pod_ip
+        # Update the theia session records in the database with
+        # the pod cluster addresses.
+        TheiaSession.query.filter(TheiaSession.id.in_(list(changed.keys()))).update({
+            TheiaSession.cluster_address: case(changed, value=TheiaSession.id),
+        }, synchronize_session=False)
 
     # Commit any and all changes
     db.session.commit()
 
 
-def update_all_theia_sessions():
+def get_theia_session_partition(session_id: str, partitions: int) -> int:
+    return zlib.crc32(session_id.encode()) % partitions
+
+
+def get_active_theia_session_rows(partition: int = 0, partitions: int = 1) -> list[Any]:
     """
-    Poll Database for sessions created within the last 10 minutes
-    if they are active and dont have a cluster_address.
+    Get the active theia sessions that fall into a partition. Only
+    the columns needed to sync the sessions are loaded.
 
-    If the session is running match the pod to the cluster_address
+    :param partition:
+    :param partitions:
+    :return:
+    """
+    theia_active_minutes_window: int = get_config_int('THEIA_ACTIVE_MINUTES_WINDOW', default=15)
+
+    # Get all theia sessions within the window that are active
+    rows = (
+        db.session.query(
+            TheiaSession.id,
+            TheiaSession.state,
+            TheiaSession.cluster_address,
+            TheiaSession.persistent_storage,
+            User.netid,
+        )
+        .join(User, User.id == TheiaSession.owner_id)
+        .filter(
+            TheiaSession.active == True,
+            TheiaSession.created > datetime.now() - timedelta(minutes=theia_active_minutes_window),
+        )
+        .all()
+    )
 
-    If the session has failed, update the session to failed.
+    # Take only the sessions in this partition
+    return [row for row in rows if get_theia_session_partition(row.id, partitions) == partition]
+
+
+def list_theia_pod_events(pod_names: set[str]) -> dict[str, list[k8s.CoreV1Event]]:
+    """
+    Get the events for a set of pods with a single list of the pod
+    events in the namespace.
+
+    :param pod_names:
+    :return: pod name -> events
+    """
+    if len(pod_names) == 0:
+        return {}
+
+    v1 = k8s.CoreV1Api()
+
+    # Get event list for all pods
+    events: k8s.CoreV1EventList = v1.list_namespaced_event("anubis", field_selector="involvedObject.kind=Pod")
+
+    # Group the events by pod
+    pod_events: dict[str, list[k8s.CoreV1Event]] = {pod_name: [] for pod_name in pod_names}
+    for event in events.items:
+        if event.involved_object.name in pod_events:
+            pod_events[event.involved_object.name].append(event)
+
+    return pod_events
+
+
+def get_pending_theia_session_state(persistent_storage: bool, events: list[k8s.CoreV1Event]) -> str | None:
+    """
+    Work out the state message for a session whose pod is pending. None
+    means the state should be left as is.
+
+    :param persistent_storage:
+    :param events:
+    :return:
     """
 
-    # Go through all active sessions
-    for session in get_active_theia_sessions():
+    # Boolean to indicate if volume has attached
+    volume_attached: bool = False
+    scheduled: bool = False
+    scaling: bool = False
 
-        # Synchronize session resource
-        lock = create_redis_lock(f'theia-session-{session.id}')
-        if not lock.acquire(blocking=False):
+    # Iterate through events
+    for event in events:
+        event: k8s.CoreV1Event
+
+        # If scheduled, then there will be a "Scheduled" event
+        if 'Scheduled' in event.reason:
+            scheduled = True
             continue
 
-        # Try to update the session info
-        update_theia_session(session)
+        # 0/10 nodes are available: 10 Insufficient cpu, 2 Insufficient memory.
+        if 'FailedScheduling' in event.reason and 'Insufficient' in event.message:
+            scaling = True
+            continue
 
-        # Release lock
-        lock.release()
+        # attachdetach-controller starts success messages like
+        # this when volume has attached
+        if "AttachVolume.Attach succeeded" in event.message:
+            volume_attached = True
+            break
 
+    if not scheduled and scaling:
+        return "We are adding more servers to handle your IDE. Give us a minute..."
 
-def update_theia_session(session: TheiaSession):
-    # Load the kubernetes incluster config
-    v1 = k8s.CoreV1Api()
+    # If storage volume needs to be attached, we should check
+    # in the events for the pod if it has been attached.
+    elif scheduled and persistent_storage:
+        # If we are expecting a volume, but it has not been attached, then
+        # we should set the status message to state such
+        if not volume_attached:
+            return "Waiting for Persistent Volume to attach..."
+        return None
 
-    # Get the name of the pod
-    pod_name = get_theia_pod_name(session)
+    # State that the ide server has not yet started
+    return "Waiting for IDE server to start..."
 
-    try:
-        # If the pod has not been created yet, then a 404 will be thrown.
-        # Skip logging if that is the case.
-        # Get the pod information from the kubernetes api
-        pod: k8s.V1Pod = v1.read_namespaced_pod(
-            namespace="anubis",
-            name=pod_name,
-        )
 
-    except k8s.exceptions.ApiException as e:
+def update_theia_sessions(partition: int = 0, partitions: int = 1) -> int:
+    """
+    Sync the state of the active theia sessions in a partition with
+    their pods. All theia pods (and the events of the pending ones) are
+    listed once, matched to the sessions in memory, and the changes are
+    written back with one UPDATE.
+
+    :param partition:
+    :param partitions:
+    :return: number of sessions changed
+    """
 
-        # If the status code is 404, then it has not been created yet
-        if e.status == 404:
-            if session.state != "Waiting for IDE to be scheduled...":
-                session.state = "Waiting for IDE to be scheduled..."
-                db.session.commit()
-            return
+    # Get the active sessions in this partition
+    sessions = get_active_theia_session_rows(partition, partitions)
+    if len(sessions) == 0:
+        return 0
 
+    try:
+        # List all theia pods (from the informer cache if it is fresh)
+        pods: dict[str, k8s.V1Pod] = {
+            pod.metadata.labels["session"]: pod
+            for pod in list_theia_pods().items
+        }
+
+        # Get the events of the pending pods for our sessions
+        pod_events = list_theia_pod_events({
+            pods[session.id].metadata.name
+            for session in sessions
+            if session.id in pods and pods[session.id].status.phase == "Pending"
+        })
+
+    except k8s.exceptions.ApiException:
         # Error
         logger.error(traceback.format_exc())
         logger.error("continuing")
+        return 0
+
+    # Work out the changes for each session
+    states: dict[str, str] = {}
+    cluster_addresses: dict[str, str] = {}
+    failed: list[str] = []
+    for session in sessions:
+        pod: k8s.V1Pod | None = pods.get(session.id, None)
+
+        # If the pod could not be found, then it has not been created yet
+        if pod is None:
+            state = "Waiting for IDE to be scheduled..."
+
+        # Update the session state from the pod status
+        elif pod.status.phase == "Pending":
+            state = get_pending_theia_session_state(
+                session.persistent_storage,
+                pod_events.get(pod.metadata.name, []),
+            )
+
+        # If the pod has failed. There are more than a few ways that
+        # the pod could have failed. If we reach this, then we should
+        # just mark the theia session as failed, then let the reaper
+        # job clean up the kubernetes resources at a later date.
+        elif pod.status.phase == "Failed":
+            state = "Failed"
+            failed.append(session.id)
+
+            # Log the failure
+            logger.error("Theia session failed {}".format(pod.metadata.name))
+
+        # If the pod is marked as running. The pod is marked as
+        # running when the main containers have started
+        elif pod.status.phase == "Running":
+            state = "Running"
+            if session.cluster_address != pod.status.pod_ip:
+                cluster_addresses[session.id] = pod.status.pod_ip
+
+            # Index the event when the session first comes up
+            if session.state != "Running":
+                logger.info(
+                    "theia",
+                    extra={
+                        "event":      "session-init",
+                        "session_id": session.id,
+                        "netid":      session.netid,
+                    },
+                )
+
+                # Log the success
+                logger.info("Theia session started {}".format(pod.metadata.name))
 
-    # Update the session state from the pod status
-    if pod.status.phase == "Pending":
+        else:
+            state = None
+
+        if state is not None and state != session.state:
+            states[session.id] = state
+
+    # Write all the changes with a single UPDATE
+    changed = set(states) | set(cluster_addresses) | set(failed)
+    if len(changed) == 0:
+        return 0
+
+    values = {}
+    if len(states) > 0:
+        values[TheiaSession.state] = case(states, value=TheiaSession.id, else_=TheiaSession.state)
+    if len(cluster_addresses) > 0:
+        values[TheiaSession.cluster_address] = case(
+            cluster_addresses, value=TheiaSession.id, else_=TheiaSession.cluster_address
+        )
+    if len(failed) > 0:
+        values[TheiaSession.active] = case(
+            {session_id: False for session_id in failed}, value=TheiaSession.id, else_=TheiaSession.active
+        )
 
-        # Boolean to indicate if volume has attached
-        volume_attached: bool = False
-        scheduled: bool = False
-        scaling: bool = False
+    TheiaSession.query.filter(TheiaSession.id.in_(changed)).update(values, synchronize_session=False)
+    db.session.commit()
 
-        # Get event list for ide pod
-        events: k8s.CoreV1Eventlist = v1.list_namespaced_event(
-            "anubis", field_selector=f"involvedObject.name={pod_name}"
-        )
+    return len(changed)
 
-        # Iterate through events
-        for event in events.items:
-            event: k8s.CoreV1Event
-
-            # If scheduled, then there will be a "Scheduled" event
-            if 'Scheduled' in event.reason:
-                scheduled = True
-                continue
-
-            # 0/10 nodes are available: 10 Insufficient cpu, 2 Insufficient memory.
-            if 'FailedScheduling' in event.reason and 'Insufficient' in event.message:
-                scaling = True
-                continue
-
-            # attachdetach-controller starts success messages like
-            # this when volume has attached
-            if "AttachVolume.Attach succeeded" in event.message:
-                volume_attached = True
-                break
-
-        if not scheduled and scaling:
-            session.state = "We are adding more servers to handle your IDE. Give us a minute..."
-
-        # If storage volume needs to be attached, we should check
-        # in the events for the pod if it has been attached.
-        elif scheduled and session.persistent_storage:
-            # If we are expecting a volume, but it has not been attached, then
-            # we should set the status message to state such
-            if session.persistent_storage and not volume_attached:
-                session.state = "Waiting for Persistent Volume to attach..."
-
-        # State that the ide server has not yet started
-        else:
-            session.state = "Waiting for IDE server to start..."
-
-        db.session.commit()
-
-    # If the pod has failed. There are more than a few ways that
-    # the pod could have failed. If we reach this, then we should
-    # just mark the theia session as failed, then let the reaper
-    # job clean up the kubernetes resources at a later date.
-    if pod.status.phase == "Failed":
-        # set cluster address and state
-        session.active = False
-        session.state = "Failed"
-
-        # Log the failure
-        logger.error("Theia session failed {}".format(pod_name))
-
-        db.session.commit()
-
-    # If the pod is marked as running. The pod is marked as
-    # running when the main containers have started
-    if pod.status.phase == "Running":
-        # set the cluster address and state
-        session.cluster_address = pod.status.pod_ip
-        session.state = "Running"
-
-        # Index the event
-        logger.info(
-            "theia",
-            extra={
-                "event":      "session-init",
-                "session_id": session.id,
-                "netid":      session.owner.netid,
-            },
-        )
 
-        # Log the success
-        logger.info("Theia session started {}".format(pod_name))
+def update_all_theia_sessions(partitions: int = 1):
+    """
+    Poll Database for sessions created within the last 10 minutes
+    if they are active and dont have a cluster_address.
+
+    If the session is running match the pod to the cluster_address
+
+    If the session has failed, update the session to failed.
+
+    Poller replicas each claim one of the partitions of the sessions
+    (through redis), so no two replicas sync the same session.
+
+    :param partitions: number of poller replicas
+    :return:
+    """
+
+    # Without redis there is only the one poller
+    if redis is None:
+        update_theia_sessions()
+        return
+
+    # Claim (or renew) our partition of the sessions. If all the
+    # partitions are claimed, we are a spare replica.
+    partition = claim_redis_partition("theia-poller", partitions, THEIA_POLLER_OWNER)
+    if partition is None:
+        return
 
-        db.session.commit()
+    update_theia_sessions(partition, partitions)
@@ -6,13 +6,12 @@ from sqlalchemy import or_
 
 from anubis.github.repos import create_assignment_group_repo, delete_assignment_repo
 from anubis.github.repos import verify_collaborators_assignment
-from anubis.lms.autograde import autograde
+from anubis.lms.autograde import get_user_best_submission_ids
 from anubis.lms.courses import (
     assert_course_admin,
     get_user_course_ids,
     is_course_admin,
     add_all_users_to_course,
-    is_course_archived,
 )
 from anubis.lms.questions import ingest_questions
 from anubis.models import (
@@ -23,6 +22,7 @@ from anubis.models import (
     Assignment,
     AssignmentRepo,
     AssignmentTest,
+    BestSubmission,
     Course,
     LateException,
     Submission,
@@ -31,12 +31,12 @@ from anubis.models import (
     User,
     db,
 )
+from anubis.models.serialize import serialize_assignments
 from anubis.utils.auth.user import verify_users
-from anubis.utils.cache import cache
+from anubis.utils.cache import bump_cache_version, cache, versioned_memoize
 from anubis.utils.config import get_config_int
 from anubis.utils.data import is_debug
 from anubis.utils.data import req_assert
-from anubis.utils.logging import logger
 
 
 @cache.memoize(timeout=30, unless=is_debug)
@@ -105,18 +105,27 @@ def get_assignment_data(user_id: str, assignment_id: str) -> dict[str, Any] | No
     return assignment_data
 
 
-def get_all_assignments(course_ids: set[str], admin_course_ids: set[str]) -> list[Assignment]:
+def get_all_assignments(
+    course_ids: set[str],
+    admin_course_ids: set[str],
+    include_unreleased: bool = False,
+) -> list[Assignment]:
     # Build a list of all the assignments visible
     # to this user for each of the specified courses.
     assignments: list[Assignment] = []
 
+    # Unless asked for, leave out assignments that are not released yet
+    filters = []
+    if not include_unreleased:
+        filters.append(Assignment.release_date <= datetime.now())
+
     # Get the assignment objects that should be visible to this user.
     regular_course_assignments = (
         Assignment.query.join(Course)
         .filter(
             Course.id.in_(list(course_ids.difference(admin_course_ids))),
-            Assignment.release_date <= datetime.now(),
             Assignment.hidden == False,
+            *filters,
         )
         .all()
     )
@@ -137,16 +146,50 @@ def get_all_assignments(course_ids: set[str], admin_course_ids: set[str]) -> lis
     return assignments
 
 
-@cache.memoize(timeout=10, unless=is_debug, source_check=True)
 def get_assignments(netid: str, course_id=None) -> list[dict[str, Any]] | None:
     """
     Get all the current assignments for a netid. Optionally specify a course_id
     to filter by course.
 
+    The (cached) dashboard rows include assignments that are not released
+    yet. Release and due date checks happen here at read time, so the
+    cache only needs to be invalidated by writes.
+
     :param netid: netid of user
     :param course_id: optional course name
     :return: list[Assignment.data]
     """
+    now = datetime.now()
+
+    response = []
+    for row in get_user_assignment_dashboard(netid, course_id):
+        # Students only see released assignments
+        if not row["admin"] and row["release_date"] > now:
+            continue
+
+        assignment_data = row["data"]
+        assignment_data["visible_to_students"] = not assignment_data["hidden"] and now > row["release_date"]
+        assignment_data["ide_active"] = row["assignment_due_date"] + timedelta(days=3 * 7) > now
+        assignment_data["past_due"] = row["due_date"] < now
+        response.append(assignment_data)
+
+    return response
+
+
+@versioned_memoize({"user": "netid", "courses": None, "assignments": None}, timeout=3600, unless=is_debug)
+def get_user_assignment_dashboard(netid: str, course_id=None) -> list[dict[str, Any]]:
+    """
+    Get the assignment dashboard rows for a netid. Each row has the
+    assignment data filled in with the user's submission, completion, repo
+    and due date information, along with the dates get_assignments needs
+    to check at read time.
+
+    * Cached until the user, their courses, or the assignments change *
+
+    :param netid: netid of user
+    :param course_id: optional course name
+    :return:
+    """
     # Load user
     user = User.query.filter_by(netid=netid).first()
 
@@ -165,28 +208,41 @@ def get_assignments(netid: str, course_id=None) -> list[dict[str, Any]] | None:
     else:
         admin_course_ids, course_ids = get_user_course_ids(user)
 
-    course_ids = set(filter(lambda cid: not is_course_archived(cid), course_ids))
+    # Leave out archived courses (in one query)
+    archived_course_ids = {
+        archived_course_id
+        for archived_course_id, in db.session.query(Course.id).filter(
+            Course.id.in_(list(course_ids)),
+            Course.name.contains("Archive"),
+        ).all()
+    }
+    course_ids = course_ids.difference(archived_course_ids)
 
-    # Get assignment objects
-    assignments: list[Assignment] = get_all_assignments(course_ids, admin_course_ids)
+    # Get assignment objects (including ones that are not released yet)
+    assignments: list[Assignment] = sorted(
+        get_all_assignments(course_ids, admin_course_ids, include_unreleased=True),
+        reverse=True,
+        key=lambda assignment: assignment.due_date,
+    )
 
     # Take all the sqlalchemy assignment objects,
     # and break them into data dictionaries.
     # Sort them by due_date.
-    response = [
-        _a.data
-        for _a in sorted(
-            assignments,
-            reverse=True,
-            key=lambda assignment: assignment.due_date,
-        )
-    ]
+    assignments_data = serialize_assignments(assignments)
 
     # Add submission and repo information to the assignments
-    for assignment_data in response:
-        fill_user_assignment_data(user.id, assignment_data)
-
-    return response
+    due_dates = fill_user_assignments_data(user.id, assignments_data)
+
+    return [
+        {
+            "admin":               assignment.course_id in admin_course_ids,
+            "release_date":        assignment.release_date,
+            "assignment_due_date": assignment.due_date,
+            "due_date":            due_dates[assignment.id],
+            "data":                assignment_data,
+        }
+        for assignment, assignment_data in zip(assignments, assignments_data)
+    ]
 
 
 def assignment_sync(assignment_data: dict) -> tuple[dict | str, bool]:
@@ -291,42 +347,116 @@ def assignment_sync(assignment_data: dict) -> tuple[dict | str, bool]:
     # Commit changes
     db.session.commit()
 
+    # Invalidate cached assignment data
+    bump_assignment_cache_versions(assignment.id)
+
     return {"assignment": assignment.full_data, "questions": question_message}, True
 
 
+def bump_assignment_cache_versions(assignment_id: str):
+    """
+    Invalidate cached assignment lists, along with the
+    cached data for a specific assignment.
+
+    :param assignment_id:
+    :return:
+    """
+    bump_cache_version("assignments")
+    bump_cache_version("assignment", assignment_id)
+
+
 def fill_user_assignment_data(user_id: str, assignment_data: dict[str, Any]):
-    assignment_id: str = assignment_data["id"]
+    fill_user_assignments_data(user_id, [assignment_data])
+
+
+def fill_user_assignments_data(user_id: str, assignments_data: list[dict[str, Any]]) -> dict[str, datetime]:
+    """
+    Fill in the submission, completion, repo and due date information for
+    a user on many assignments at once. This is a fixed number of grouped
+    queries no matter how many assignments there are.
 
-    # If the current user has a submission for this assignment, then mark it
-    assignment_data["has_submission"] = (
-        Submission.query.filter(
-            Submission.assignment_id == assignment_id,
+    :param user_id:
+    :param assignments_data: list of Assignment.data
+    :return: assignment_id -> due date for the user
+    """
+    assignment_ids: list[str] = [assignment_data["id"] for assignment_data in assignments_data]
+    if len(assignment_ids) == 0:
+        return {}
+
+    # Get the assignments the user has submitted to
+    submitted_assignment_ids: set[str] = {
+        assignment_id
+        for assignment_id, in db.session.query(Submission.assignment_id)
+        .filter(
             Submission.owner_id == user_id,
-        ).count()
-        > 0
+            Submission.assignment_id.in_(assignment_ids),
+        )
+        .distinct()
+        .all()
+    }
+
+    # Get the best submission for each assignment, and which of
+    # those have tests that did not pass.
+    best_submission_ids = get_user_best_submission_ids(user_id, assignment_ids)
+    incomplete_submission_ids: set[str] = {
+        submission_id
+        for submission_id, in db.session.query(SubmissionTestResult.submission_id)
+        .filter(
+            SubmissionTestResult.submission_id.in_([i for i in best_submission_ids.values() if i is not None]),
+            or_(SubmissionTestResult.passed == None, SubmissionTestResult.passed != True),
+        )
+        .distinct()
+        .all()
+    }
+
+    # Get the repos the user has for the assignments
+    repo_urls: dict[str, str] = {}
+    for assignment_id, repo_url in (
+        db.session.query(AssignmentRepo.assignment_id, AssignmentRepo.repo_url)
+        .filter(
+            AssignmentRepo.owner_id == user_id,
+            AssignmentRepo.assignment_id.in_(assignment_ids),
+            AssignmentRepo.repo_created == True,
+        )
+        .all()
+    ):
+        repo_urls.setdefault(assignment_id, repo_url)
+
+    # Get the due dates, with any late exceptions the user has
+    due_dates: dict[str, datetime] = dict(
+        db.session.query(Assignment.id, Assignment.due_date).filter(Assignment.id.in_(assignment_ids)).all()
+    )
+    due_dates.update(
+        db.session.query(LateException.assignment_id, LateException.due_date)
+        .filter(
+            LateException.owner_id == user_id,
+            LateException.assignment_id.in_(assignment_ids),
+        )
+        .all()
     )
 
-    assignment_data['complete'] = False
-    if best_submission_id := autograde(user_id, assignment_id):
-        submission = Submission.query.filter(Submission.id == best_submission_id).first()
-        logger.debug(f'{submission=}')
-        logger.debug(f'{submission.test_results=}')
-        assignment_data['complete'] = all(map(lambda test: test.passed == True, submission.test_results))
-
-    repo = AssignmentRepo.query.filter(
-        AssignmentRepo.owner_id == user_id,
-        AssignmentRepo.assignment_id == assignment_id,
-        AssignmentRepo.repo_created == True,
-    ).first()
+    now = datetime.now()
+    for assignment_data in assignments_data:
+        assignment_id: str = assignment_data["id"]
+        best_submission_id = best_submission_ids.get(assignment_id, None)
+
+        # If the current user has a submission for this assignment, then mark it
+        assignment_data["has_submission"] = assignment_id in submitted_assignment_ids
+
+        # The assignment is complete if every test passed on the best submission
+        assignment_data["complete"] = (
+            best_submission_id is not None and best_submission_id not in incomplete_submission_ids
+        )
+
+        # If the current user has a repo for this assignment, then mark it
+        assignment_data["has_repo"] = assignment_id in repo_urls
+        assignment_data["repo_url"] = repo_urls.get(assignment_id, None)
 
-    # If the current user has a repo for this assignment, then mark it
-    assignment_data["has_repo"] = repo is not None
-    # If the current user has a repo for this assignment, then mark it
-    assignment_data["repo_url"] = repo.repo_url if repo is not None else None
+        due_date = due_dates[assignment_id]
+        assignment_data["past_due"] = due_date < now
+        assignment_data["due_date"] = str(due_date)
 
-    due_date = get_assignment_due_date(user_id, assignment_id)
-    assignment_data["past_due"] = due_date < datetime.now()
-    assignment_data["due_date"] = str(due_date)
+    return due_dates
 
 
 def get_active_assignments(*filters) -> list[Assignment]:
@@ -380,6 +510,8 @@ def delete_assignment_submissions(assignment: Assignment):
     :param assignment:
     :return:
     """
+    BestSubmission.query.filter(BestSubmission.assignment_id == assignment.id).delete(synchronize_session=False)
+
     submission_ids = db.session.query(Submission.id).filter(Submission.assignment_id == assignment.id)
     SubmissionTestResult.query.filter(SubmissionTestResult.submission_id.in_(submission_ids.subquery())).delete(
         synchronize_session=False
@@ -443,6 +575,9 @@ def delete_assignment(assignment: Assignment) -> None:
 
     db.session.commit()
 
+    # Invalidate cached assignment data
+    bump_assignment_cache_versions(assignment.id)
+
 
 def convert_group_netids_to_group_users(group_netids: list[list[str]]) -> tuple[list[User], list[list[User]]]:
     """
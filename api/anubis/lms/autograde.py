@@ -1,13 +1,28 @@
 from datetime import datetime
+from typing import Any
 
 from parse import parse
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload, undefer
+from sqlalchemy.sql import and_, func
 
 from anubis.env import env
-from anubis.lms.students import get_students_in_class
-from anubis.models import Assignment, AssignmentTest, Submission
-from anubis.utils.cache import cache
+from anubis.models import (
+    Assignment,
+    AssignmentTest,
+    BestSubmission,
+    Course,
+    InCourse,
+    Submission,
+    SubmissionBuild,
+    SubmissionTestResult,
+    User,
+    db,
+)
+from anubis.utils.cache import bump_cache_version, bump_user_cache_versions, cache, versioned_memoize
 from anubis.utils.data import is_debug, is_job
 from anubis.utils.http import error_response
+from anubis.utils.logging import logger
 
 
 @cache.memoize(timeout=60, unless=is_debug, source_check=True)
@@ -17,20 +32,65 @@ def _get_assignment_test_count(assignment_id) -> int:
     ).count()
 
 
-@cache.memoize(timeout=5, unless=is_debug, source_check=True, forced_update=is_job)
-def autograde(student_id, assignment_id, max_time: datetime = None):
+def _select_best_submission(
+    submission_pass_counts: list[tuple[str, int]], max_correct: int
+) -> tuple[str | None, int]:
     """
-    Get the stats for a specific student on a specific assignment.
+    Pick the best submission out of a list of (submission id, passed test count)
+    tuples. The list is expected to be ordered newest submission first.
 
-    Pulls all submissions, then finds the most recent one that
-    has the most tests that passed.
+    The newest submission with every test passing wins. If no submission has
+    every test passing, the oldest submission with the most tests passed wins.
 
-    * This function is heavily cached as it is IO intensive on the DB *
+    :param submission_pass_counts:
+    :param max_correct:
+    :return: best submission id, passed test count of best
+    """
+
+    # best is the best submission seen so far
+    best = None
+
+    # best_count is the most tests that have
+    # passed for this student so far
+    best_count = -1
+
+    for submission_id, correct_count in submission_pass_counts:
+
+        # If the number of passed tests in this assignment is as good
+        # or better as the best seen so far, update the running best.
+        if correct_count >= best_count:
+            best_count = correct_count
+            best = submission_id
+
+        # If the number of passed tests is equal to the number
+        # of tests then we can stop and use this assignment.
+        if best_count == max_correct:
+            break
+
+    return best, best_count
+
+
+def _get_best_submissions(
+    assignment_id: str,
+    student_ids: list[str] = None,
+    max_time: datetime = None,
+) -> dict[str, tuple[str, int]]:
+    """
+    Find the best submission for every student on an assignment at once.
+
+    Instead of hydrating every submission (and all their test results)
+    through the ORM, the number of passed tests for each submission is
+    counted in a single grouped query. Only the (submission id, owner id,
+    passed count) rows are pulled back, and the best one per student is
+    picked from those.
+
+    Students without an accepted submission will not be in the
+    returned dictionary.
 
-    :param student_id:
     :param assignment_id:
+    :param student_ids: optional list of owner ids to limit the search to
     :param max_time:
-    :return:
+    :return: owner_id -> (best submission id, passed test count)
     """
 
     # list of filters for submission query
@@ -40,70 +100,448 @@ def autograde(student_id, assignment_id, max_time: datetime = None):
     if max_time is not None:
         submission_filters.append(Submission.created <= max_time)
 
-    # best is the best submission seen so far
-    best = None
-
-    # best_count is the most tests that have
-    # passed for this student so far
-    best_count = -1
+    # Limit to specific students if specified
+    if student_ids is not None:
+        if len(student_ids) == 0:
+            return {}
+        submission_filters.append(Submission.owner_id.in_(list(student_ids)))
 
     # Get the max number of assignment tests that can be passed
     # so we can stop early if we find a submission that has all
     # tests passing
     max_correct = _get_assignment_test_count(assignment_id)
 
-    # Iterate over all submissions for this student, tracking
-    # the best submission so far (based on number of tests passed).
-    # We start from the oldest submission and move to the newest.
-    for submission in (
-        Submission.query.filter(
+    # Count passed tests for each accepted submission. Only passed
+    # test results are joined in, so the count of joined rows is
+    # the number of passed tests.
+    rows = (
+        db.session.query(
+            Submission.id,
+            Submission.owner_id,
+            func.count(SubmissionTestResult.id),
+        )
+        .outerjoin(
+            SubmissionTestResult,
+            and_(
+                SubmissionTestResult.submission_id == Submission.id,
+                SubmissionTestResult.passed == True,
+            ),
+        )
+        .filter(
             Submission.assignment_id == assignment_id,
-            Submission.owner_id == student_id,
             # Submission.processed == True,
             Submission.accepted == True,
-            *submission_filters
+            *submission_filters,
         )
-            .order_by(Submission.created.desc())
-            .all()
-    ):
+        .group_by(Submission.id, Submission.owner_id, Submission.created)
+        .order_by(Submission.created.desc())
+        .all()
+    )
 
-        # Calculate the number of tests that passed in this submission
-        correct_count = sum(map(lambda result: 1 if result.passed else 0, submission.test_results))
+    # Break the rows up by owner, keeping the newest
+    # first ordering for each owner.
+    owner_submissions: dict[str, list[tuple[str, int]]] = {}
+    for submission_id, owner_id, correct_count in rows:
+        owner_submissions.setdefault(owner_id, []).append((submission_id, correct_count))
 
-        # If the number of passed tests in this assignment is as good
-        # or better as the best seen so far, update the running best.
-        if correct_count >= best_count:
-            best_count = correct_count
-            best = submission
+    return {
+        owner_id: _select_best_submission(submission_pass_counts, max_correct)
+        for owner_id, submission_pass_counts in owner_submissions.items()
+    }
 
-        # If the number of passed tests is equal to the number
-        # of tests then we can stop and use this assignment.
-        if best_count == max_correct:
-            break
+
+def get_best_submission_ids(
+    assignment_id: str,
+    student_ids: list[str] = None,
+    max_time: datetime = None,
+) -> dict[str, str]:
+    """
+    Calculate the best submission for every student on an assignment
+    from the submission history. See _get_best_submissions.
+
+    :param assignment_id:
+    :param student_ids: optional list of owner ids to limit the search to
+    :param max_time:
+    :return: owner_id -> best submission id
+    """
+    return {
+        owner_id: submission_id
+        for owner_id, (submission_id, _) in _get_best_submissions(assignment_id, student_ids, max_time).items()
+    }
+
+
+def recalculate_best_submissions(assignment_id: str, student_ids: list[str] = None) -> dict[str, str | None]:
+    """
+    Rebuild the materialized best submission records for students on an
+    assignment from their submission history. Every student specified gets
+    a record, even if they do not have a submission. If no students are
+    specified, all the students in the course are recalculated.
+
+    * Commits changes *
+
+    :param assignment_id:
+    :param student_ids:
+    :return: owner_id -> best submission id
+    """
+
+    # If no students were specified, then rebuild for the entire course
+    if student_ids is None:
+        assignment = Assignment.query.filter(Assignment.id == assignment_id).first()
+        student_ids = [student_id for student_id, _, _ in _get_assignment_students(assignment.course_id)]
+
+    student_ids = list(student_ids)
+    if len(student_ids) == 0:
+        return {}
+
+    # Calculate the best submissions from scratch
+    bests = _get_best_submissions(assignment_id, student_ids)
+
+    # Get the existing records so they can be updated in place
+    records: dict[str, BestSubmission] = {
+        record.owner_id: record
+        for record in BestSubmission.query.filter(
+            BestSubmission.assignment_id == assignment_id,
+            BestSubmission.owner_id.in_(student_ids),
+        ).all()
+    }
+
+    # Update (or create) the record for each of the students
+    changed_student_ids: list[str] = []
+    for student_id in student_ids:
+        submission_id, tests_passed = bests.get(student_id, (None, 0))
+
+        record = records.get(student_id, None)
+        if record is None:
+            record = BestSubmission(owner_id=student_id, assignment_id=assignment_id)
+
+        # Note the students whose best submission changed
+        if record.submission_id != submission_id or (record.tests_passed or 0) != tests_passed:
+            changed_student_ids.append(student_id)
+
+        record.submission_id = submission_id
+        record.tests_passed = tests_passed
+        db.session.add(record)
+
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another worker wrote the record for one of these
+        # students first. Their record is just as fresh.
+        db.session.rollback()
+        logger.warning(f'Best submission records changed during recalculation {assignment_id=}')
+
+    # Invalidate the cached autograde results for the assignment, and
+    # the cached dashboards of the students whose best submission changed
+    bump_cache_version("assignment", assignment_id)
+    bump_best_submission_user_cache_versions(changed_student_ids)
+
+    return {student_id: bests.get(student_id, (None, 0))[0] for student_id in student_ids}
+
+
+def bump_best_submission_user_cache_versions(student_ids: list[str]):
+    """
+    Invalidate the cached data (ex: assignment dashboards) of
+    students whose best submission changed.
+
+    :param student_ids:
+    :return:
+    """
+    if len(student_ids) == 0:
+        return
+    bump_user_cache_versions(*db.session.query(User.id, User.netid).filter(User.id.in_(student_ids)).all())
+
+
+def get_materialized_best_submission_ids(assignment_id: str, student_ids: list[str]) -> dict[str, str | None]:
+    """
+    Read the best submission for students on an assignment out of the
+    materialized best submission records. This is O(students) instead of
+    O(submissions). Students that do not have a record yet will have
+    theirs calculated from the submission history, without storing it.
+    Records are stored by the pipeline and the autograde reaper, never
+    on this read path.
+
+    :param assignment_id:
+    :param student_ids:
+    :return: owner_id -> best submission id
+    """
+    student_ids = list(student_ids)
+    if len(student_ids) == 0:
+        return {}
+
+    # Read the existing records
+    bests: dict[str, str | None] = dict(
+        db.session.query(BestSubmission.owner_id, BestSubmission.submission_id)
+        .filter(
+            BestSubmission.assignment_id == assignment_id,
+            BestSubmission.owner_id.in_(student_ids),
+        )
+        .all()
+    )
+
+    # Fill in any students that have not had their records created
+    missing_student_ids = [student_id for student_id in student_ids if student_id not in bests]
+    if len(missing_student_ids) > 0:
+        missing_bests = get_best_submission_ids(assignment_id, missing_student_ids)
+        bests.update({student_id: missing_bests.get(student_id, None) for student_id in missing_student_ids})
+
+    return bests
+
+
+def get_user_best_submission_ids(user_id: str, assignment_ids: list[str]) -> dict[str, str | None]:
+    """
+    Read the best submission for a single student across many assignments
+    out of the materialized best submission records. Assignments that the
+    student does not have a record for yet will have theirs calculated
+    from the submission history, without storing it. Records are stored
+    by the pipeline and the autograde reaper, never on this read path.
+
+    :param user_id:
+    :param assignment_ids:
+    :return: assignment_id -> best submission id
+    """
+    assignment_ids = list(assignment_ids)
+    if len(assignment_ids) == 0:
+        return {}
+
+    # Read the existing records
+    bests: dict[str, str | None] = dict(
+        db.session.query(BestSubmission.assignment_id, BestSubmission.submission_id)
+        .filter(
+            BestSubmission.owner_id == user_id,
+            BestSubmission.assignment_id.in_(assignment_ids),
+        )
+        .all()
+    )
+
+    # Fill in any assignments that have not had their records created
+    missing_assignment_ids = [assignment_id for assignment_id in assignment_ids if assignment_id not in bests]
+    if len(missing_assignment_ids) > 0:
+        missing_bests = _get_user_best_submissions(user_id, missing_assignment_ids)
+        bests.update({
+            assignment_id: missing_bests.get(assignment_id, None)
+            for assignment_id in missing_assignment_ids
+        })
+
+    return bests
+
+
+def _get_user_best_submissions(user_id: str, assignment_ids: list[str]) -> dict[str, str]:
+    """
+    Find the best submission for a single student across many assignments
+    at once. This is the same as _get_best_submissions, but grouped by
+    assignment instead of by student so that it is a constant number
+    of queries no matter how many assignments are asked for.
+
+    Assignments the student has no accepted submission for will not
+    be in the returned dictionary.
+
+    :param user_id:
+    :param assignment_ids:
+    :return: assignment_id -> best submission id
+    """
+
+    # Count passed tests for each accepted submission of the student
+    rows = (
+        db.session.query(
+            Submission.id,
+            Submission.assignment_id,
+            func.count(SubmissionTestResult.id),
+        )
+        .outerjoin(
+            SubmissionTestResult,
+            and_(
+                SubmissionTestResult.submission_id == Submission.id,
+                SubmissionTestResult.passed == True,
+            ),
+        )
+        .filter(
+            Submission.owner_id == user_id,
+            Submission.assignment_id.in_(assignment_ids),
+            Submission.accepted == True,
+        )
+        .group_by(Submission.id, Submission.assignment_id, Submission.created)
+        .order_by(Submission.created.desc())
+        .all()
+    )
+    if len(rows) == 0:
+        return {}
+
+    # Break the rows up by assignment, keeping the newest
+    # first ordering for each assignment.
+    assignment_submissions: dict[str, list[tuple[str, int]]] = {}
+    for submission_id, assignment_id, correct_count in rows:
+        assignment_submissions.setdefault(assignment_id, []).append((submission_id, correct_count))
+
+    # Get the test counts of the assignments that have submissions
+    max_corrects: dict[str, int] = dict(
+        db.session.query(AssignmentTest.assignment_id, func.count(AssignmentTest.id))
+        .filter(AssignmentTest.assignment_id.in_(list(assignment_submissions.keys())))
+        .group_by(AssignmentTest.assignment_id)
+        .all()
+    )
+
+    return {
+        assignment_id: _select_best_submission(submission_pass_counts, max_corrects.get(assignment_id, 0))[0]
+        for assignment_id, submission_pass_counts in assignment_submissions.items()
+    }
+
+
+def update_best_submission(submission: Submission):
+    """
+    Incrementally update the best submission record for the owner of
+    a submission after the submission has new results. The submission
+    is compared against the current best instead of going back through
+    the whole submission history. The history is only recalculated if
+    the submission was the current best (as its results may have gotten
+    worse), or if there is no record yet.
+
+    * Commits changes *
+
+    :param submission:
+    :return:
+    """
+
+    # Dangling submissions do not count towards anyone
+    if submission.owner_id is None:
+        return
+
+    # Get the current best, and when it was created
+    current = (
+        db.session.query(BestSubmission, Submission.created)
+        .outerjoin(Submission, Submission.id == BestSubmission.submission_id)
+        .filter(
+            BestSubmission.owner_id == submission.owner_id,
+            BestSubmission.assignment_id == submission.assignment_id,
+        )
+        .first()
+    )
+
+    # If there is no record, or this submission was the best,
+    # then we need to recalculate from the history.
+    if current is None or current[0].submission_id == submission.id:
+        recalculate_best_submissions(submission.assignment_id, [submission.owner_id])
+        return
+
+    # Rejected submissions can not replace the best
+    if not submission.accepted:
+        return
+
+    best, best_created = current
+    max_correct = _get_assignment_test_count(submission.assignment_id)
+    correct_count = sum(map(lambda result: 1 if result.passed else 0, submission.test_results))
+
+    # Same ordering as _select_best_submission. The newest submission with every test
+    # passed wins. Otherwise, the oldest submission with the most tests passed wins.
+    if best.submission_id is None:
+        is_better = True
+    elif correct_count == max_correct:
+        is_better = best.tests_passed != max_correct or submission.created > best_created
+    elif best.tests_passed == max_correct:
+        is_better = False
+    else:
+        is_better = correct_count > best.tests_passed or (
+            correct_count == best.tests_passed and submission.created < best_created
+        )
+
+    if is_better:
+        best.submission_id = submission.id
+        best.tests_passed = correct_count
+        db.session.add(best)
+        db.session.commit()
+
+        # Invalidate the cached autograde results for the assignment,
+        # and the cached dashboard of the student
+        bump_cache_version("assignment", submission.assignment_id)
+        bump_best_submission_user_cache_versions([submission.owner_id])
+
+
+@cache.memoize(timeout=5, unless=is_debug, source_check=True, forced_update=is_job)
+def autograde(student_id, assignment_id, max_time: datetime = None):
+    """
+    Get the stats for a specific student on a specific assignment.
+
+    Reads the materialized best submission record. If a max_time is
+    specified, the best submission is calculated from the submission
+    history up to that time instead.
+
+    :param student_id:
+    :param assignment_id:
+    :param max_time:
+    :return:
+    """
+
+    if max_time is not None:
+        best_submission_ids = get_best_submission_ids(assignment_id, [student_id], max_time=max_time)
+    else:
+        best_submission_ids = get_materialized_best_submission_ids(assignment_id, [student_id])
 
     # return the submission id of the best if there is one, otherwise None
-    return best.id if best is not None else None
+    return best_submission_ids.get(student_id, None)
 
 
-def autograde_submission_result_wrapper(
-    assignment: Assignment, user_id: str, netid: str, name: str, submission_id: str
-) -> dict:
+def _load_autograde_submissions(submission_ids: list[str]) -> dict[str, Submission]:
     """
-    The autograde results require quite of bit more information than
-    just the id of the best submission. This function takes some high level
-    information about the best submission, and breaks it down into a large
-    dictionary of all the relevant data for the autograde result.
+    Load submissions with everything the autograde results need in a
+    fixed number of queries (instead of several lazy loads per submission).
 
-    * The admin panel uses all this extra data added by this function *
+    :param submission_ids:
+    :return: submission id -> Submission
+    """
+    if len(submission_ids) == 0:
+        return {}
+
+    submissions = (
+        Submission.query.options(
+            undefer(Submission.pipeline_log),
+            joinedload(Submission.repo),
+            selectinload(Submission.build).undefer(SubmissionBuild.stdout),
+            selectinload(Submission.test_results).options(
+                undefer(SubmissionTestResult.output),
+                undefer(SubmissionTestResult.message),
+                joinedload(SubmissionTestResult.assignment_test),
+            ),
+        )
+        .filter(Submission.id.in_(submission_ids))
+        .all()
+    )
+
+    return {submission.id: submission for submission in submissions}
+
+
+def _submission_admin_data(submission: Submission) -> dict[str, Any]:
+    """
+    Same as Submission.admin_data, but built only from the already
+    loaded relationships of the submission.
+
+    :param submission:
+    :return:
+    """
+    data = submission.data
+    data["repo"] = submission.repo.repo_url if submission.repo is not None else None
+    data["build"] = submission.build.data if submission.build is not None else None
+    data["pipeline_log"] = submission.pipeline_log
+    data["tests"] = [
+        {"test": result.assignment_test.data, "result": result.data}
+        for result in sorted(submission.test_results, key=lambda result: result.assignment_test.order)
+    ]
+    return data
+
+
+def _autograde_result(
+    assignment: Assignment, user_id: str, netid: str, name: str, submission: Submission | None
+) -> dict[str, Any]:
+    """
+    Build the autograde result dictionary for a student given their
+    (already loaded) best submission.
 
     :param assignment:
     :param user_id:
     :param netid:
     :param name:
-    :param submission_id:
+    :param submission:
     :return:
     """
-    if submission_id is None:
+    if submission is None:
         # no submission
         return {
             "id": netid,
@@ -122,31 +560,78 @@ def autograde_submission_result_wrapper(
             "late": False,
         }
 
-    else:
-        submission = Submission.query.filter(Submission.id == submission_id).first()
-        repo_path = parse("https://github.com/{}", submission.repo.repo_url)[0] if submission.repo else None
-        best_count = sum(map(lambda x: 1 if x.passed else 0, submission.test_results))
-        late = "past due" if assignment.due_date < submission.created else "on time"
-        late = "past grace" if assignment.grace_date < submission.created else late
-        return {
-            "id": netid,
-            "user_id": user_id,
-            "netid": netid,
-            "name": name,
-            "submission": submission.admin_data,
-            "build_passed": submission.build.passed if submission.build is not None else False,
-            "tests_passed": best_count,
-            "total_tests": len(submission.test_results),
-            "tests_passed_names": [test.assignment_test.name for test in submission.test_results if test.passed],
-            "full_stats": "https://{}/api/private/submission/{}".format(env.DOMAIN, submission.id),
-            "main": "https://github.com/{}".format(repo_path),
-            "commits": "https://github.com/{}/commits/main".format(repo_path),
-            "commit_tree": "https://github.com/{}/tree/{}".format(repo_path, submission.commit),
-            "late": late,
-        }
+    repo_path = parse("https://github.com/{}", submission.repo.repo_url)[0] if submission.repo else None
+    best_count = sum(map(lambda x: 1 if x.passed else 0, submission.test_results))
+    late = "past due" if assignment.due_date < submission.created else "on time"
+    late = "past grace" if assignment.grace_date < submission.created else late
+    return {
+        "id": netid,
+        "user_id": user_id,
+        "netid": netid,
+        "name": name,
+        "submission": _submission_admin_data(submission),
+        "build_passed": submission.build.passed if submission.build is not None else False,
+        "tests_passed": best_count,
+        "total_tests": len(submission.test_results),
+        "tests_passed_names": [test.assignment_test.name for test in submission.test_results if test.passed],
+        "full_stats": "https://{}/api/private/submission/{}".format(env.DOMAIN, submission.id),
+        "main": "https://github.com/{}".format(repo_path),
+        "commits": "https://github.com/{}/commits/main".format(repo_path),
+        "commit_tree": "https://github.com/{}/tree/{}".format(repo_path, submission.commit),
+        "late": late,
+    }
 
 
-@cache.memoize(timeout=60 * 60, unless=is_debug, forced_update=is_job)
+def autograde_submission_result_wrapper(
+    assignment: Assignment, user_id: str, netid: str, name: str, submission_id: str
+) -> dict:
+    """
+    The autograde results require quite of bit more information than
+    just the id of the best submission. This function takes some high level
+    information about the best submission, and breaks it down into a large
+    dictionary of all the relevant data for the autograde result.
+
+    * The admin panel uses all this extra data added by this function *
+
+    :param assignment:
+    :param user_id:
+    :param netid:
+    :param name:
+    :param submission_id:
+    :return:
+    """
+    submission = _load_autograde_submissions([submission_id]).get(submission_id, None) if submission_id else None
+    return _autograde_result(assignment, user_id, netid, name, submission)
+
+
+def _get_assignment_students(course_id: str, offset=None, limit=None) -> list[tuple[str, str, str]]:
+    """
+    Get the (id, netid, name) of the students in a course. This is the
+    same ordering and windowing as get_students_in_class, without building
+    the full user data for each student.
+
+    :param course_id:
+    :param offset:
+    :param limit:
+    :return:
+    """
+    query = (
+        db.session.query(User.id, User.netid, User.name)
+        .join(InCourse, InCourse.owner_id == User.id)
+        .join(Course, Course.id == InCourse.course_id)
+        .filter(Course.id == course_id)
+        .order_by(User.name.desc())
+    )
+
+    # If a limit and offset was specified, then use them
+    # in the query.
+    if offset is not None and limit is not None:
+        query = query.limit(limit).offset(offset)
+
+    return query.all()
+
+
+@versioned_memoize({"assignment": "assignment_id"}, timeout=600, unless=is_debug, forced_update=is_job)
 def bulk_autograde(assignment_id, netids=None, offset=0, limit=20):
     """
     Bulk autograde an assignment. Optionally specify a subset of netids.
@@ -154,8 +639,9 @@ def bulk_autograde(assignment_id, netids=None, offset=0, limit=20):
     The offset and limit are used here to have the results of this function
     move as a window of the results.
 
-    * Calculating the autograde results is very IO intensive on the db. For this,
-    these results are heavily cached. *
+    * The best submissions are read from the materialized best submission
+    records, so this is O(students). Results are cached until the best
+    submissions for the assignment change. *
 
     :param assignment_id:
     :param netids:
@@ -164,9 +650,6 @@ def bulk_autograde(assignment_id, netids=None, offset=0, limit=20):
     :return:
     """
 
-    # Running list of the best submissions for each student
-    bests = []
-
     # Find the assignment object
     assignment = (
         Assignment.query.filter_by(name=assignment_id).first() or Assignment.query.filter_by(id=assignment_id).first()
@@ -175,26 +658,27 @@ def bulk_autograde(assignment_id, netids=None, offset=0, limit=20):
         return error_response("assignment does not exist")
 
     # Get the list of students to get autograde results for
-    students = get_students_in_class(assignment.course_id, offset=offset, limit=limit)
+    students = _get_assignment_students(assignment.course_id, offset=offset, limit=limit)
     if netids is not None:
-        students = filter(lambda x: x["netid"] in netids, students)
-
-    # Run through each of the students, getting the autograde results for each
-    for student in students:
-        # Get the best submission for this student from this assignment
-        submission_id = autograde(student["id"], assignment.id)
-        bests.append(
-            # Use the stats_wrapper function to add all the necessary
-            # metadata for the submission.
-            autograde_submission_result_wrapper(
-                assignment,
-                student["id"],
-                student["netid"],
-                student["name"],
-                submission_id,
-            )
-        )
-
-    return bests
+        students = list(filter(lambda x: x[1] in netids, students))
 
+    # Read the best submission for each of the students
+    best_submission_ids = get_materialized_best_submission_ids(
+        assignment.id, [student_id for student_id, _, _ in students]
+    )
 
+    # Load all the best submissions at once
+    submissions = _load_autograde_submissions(list(best_submission_ids.values()))
+
+    # Use the result function to add all the necessary
+    # metadata for each student's best submission.
+    return [
+        _autograde_result(
+            assignment,
+            student_id,
+            netid,
+            name,
+            submissions.get(best_submission_ids.get(student_id, None), None),
+        )
+        for student_id, netid, name in students
+    ]
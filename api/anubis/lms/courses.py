@@ -1,5 +1,4 @@
 import base64
-import copy
 import json
 import string
 import traceback
@@ -27,8 +26,9 @@ from anubis.models import (
     User,
     db,
 )
+from anubis.utils.auth.permissions import clear_course_permissions, get_course_permissions
 from anubis.utils.auth.user import current_user
-from anubis.utils.cache import cache
+from anubis.utils.cache import bump_cache_version, bump_user_cache_versions, cache, versioned_memoize
 from anubis.utils.data import is_debug
 from anubis.utils.exceptions import AuthenticationError, LackCourseContext
 from anubis.utils.logging import logger
@@ -129,24 +129,8 @@ def is_course_superuser(course_id: str, user_id: str = None) -> bool:
     :return:
     """
 
-    # Get the current user
-    if user_id is None:
-        user = current_user
-    else:
-        user = User.query.filter(User.id == user_id).first()
-
-    # If they are a superuser, then we can just return True
-    if user.is_superuser:
-        return True
-
-    # Check to see if they are a professor for the current course
-    prof = ProfessorForCourse.query.filter(
-        ProfessorForCourse.owner_id == user.id,
-        ProfessorForCourse.course_id == course_id,
-    ).first()
-
-    # Return True if they are a professor for the course
-    return prof is not None
+    # Check the (request cached) permissions of the user
+    return get_course_permissions(user_id=user_id).is_course_superuser(course_id)
 
 
 def is_course_admin(course_id: str, user_id: str = None) -> bool:
@@ -160,35 +144,8 @@ def is_course_admin(course_id: str, user_id: str = None) -> bool:
     :return:
     """
 
-    # Get the current user
-    if user_id is None:
-        user = current_user
-    else:
-        user = User.query.filter(User.id == user_id).first()
-
-    # If they are a superuser, then just return True
-    if user.is_superuser:
-        return True
-
-    # Check to see if they are a TA for the course
-    ta = TAForCourse.query.filter(
-        TAForCourse.owner_id == user.id,
-        TAForCourse.course_id == course_id,
-    ).first()
-
-    if ta is not None:
-        return True
-
-    # Check to see if they are a professor for the course
-    prof = ProfessorForCourse.query.filter(
-        ProfessorForCourse.owner_id == user.id,
-        ProfessorForCourse.course_id == course_id,
-    ).first()
-
-    if prof is not None:
-        return True
-
-    return False
+    # Check the (request cached) permissions of the user
+    return get_course_permissions(user_id=user_id).is_course_admin(course_id)
 
 
 def assert_course_admin(course_id: str = None):
@@ -331,7 +288,7 @@ def valid_join_code(join_code: str) -> bool:
     return all(c in valid_chars for c in join_code)
 
 
-@cache.memoize(timeout=60, unless=is_debug)
+@versioned_memoize({"user": "netid", "courses": None}, timeout=600, unless=is_debug)
 def get_courses(netid: str) -> list[dict[str, Any]]:
     """
     Get all classes a given netid is in
@@ -359,6 +316,59 @@ def get_courses(netid: str) -> list[dict[str, Any]]:
     return [c.data for c in courses]
 
 
+def bump_course_cache_versions(*course_ids: str):
+    """
+    Invalidate the cached rosters of some courses, along with the cached
+    autograde results for their assignments (which are listed by student).
+
+    :param course_ids:
+    :return:
+    """
+    if len(course_ids) == 0:
+        return
+
+    bump_cache_version("course", *course_ids)
+
+    # Autograde results are cached by assignment
+    assignment_ids = [
+        assignment_id
+        for assignment_id, in db.session.query(Assignment.id).filter(Assignment.course_id.in_(course_ids)).all()
+    ]
+    if len(assignment_ids) > 0:
+        bump_cache_version("assignment", *assignment_ids)
+
+
+def bump_user_profile_cache_versions(user: User):
+    """
+    Invalidate everything cached that shows a user's profile
+    fields (ex: the rosters of every course they are in).
+
+    :param user:
+    :return:
+    """
+    course_ids = [
+        course_id
+        for course_id, in db.session.query(InCourse.course_id).filter(InCourse.owner_id == user.id).all()
+    ]
+    bump_user_cache_versions(user)
+    bump_course_cache_versions(*course_ids)
+
+
+def bump_course_membership_cache_versions(user: User, course_id: str):
+    """
+    Invalidate everything cached that depends on a user
+    being in (or out of) a course.
+
+    :param user:
+    :param course_id:
+    :return:
+    """
+    cache.delete_memoized(get_student_course_ids, user)
+    bump_user_cache_versions(user)
+    clear_course_permissions(user.id)
+    bump_course_cache_versions(course_id)
+
+
 @cache.memoize(timeout=60, unless=is_debug)
 def get_course_data(netid: str, course_id: str) -> dict[str, Any] | None:
     """
@@ -456,34 +466,10 @@ def get_user_permissions(user: User) -> dict[str, Any]:
     :return:
     """
 
-    # If the user is superuser, return all the permissions for every course
-    if user.is_superuser:
-        super_for = [{"id": course.id, "name": course.name} for course in Course.query.all()]
-        return {
-            "is_superuser":  True,
-            "is_admin":      True,
-            "professor_for": super_for,
-            # super_for is deepcopied to avoid introducing exceptions
-            # if further data processing is needed
-            "ta_for":        copy.deepcopy(super_for),
-            "admin_for":     copy.deepcopy(super_for),
-        }
-
-    professor_for = [pf.data for pf in user.professor_for_course]
-    # A professor has the same permissions as a ta do
-    ta_for = [taf.data for taf in user.ta_for_course] + professor_for
     # According to John's explanation in issue #115, `admin_for` should
     # actually be the same as `ta_for`. So `admin_for` now becomes a
     # redundant value and should be removed in the future
-    admin_for = copy.deepcopy(ta_for)
-
-    return {
-        "is_superuser":  False,
-        "is_admin":      len(admin_for) > 0,
-        "professor_for": professor_for,
-        "ta_for":        ta_for,
-        "admin_for":     admin_for,
-    }
+    return get_course_permissions(user).data
 
 
 @cache.memoize(timeout=60, unless=is_debug, source_check=True)
@@ -508,27 +494,9 @@ def get_courses_with_visuals() -> list[dict[str, Any]]:
     return [course.data for course in courses]
 
 
-@cache.memoize(timeout=60, unless=is_debug, source_check=True)
 def get_user_admin_course_ids(user_id: str) -> set[str]:
-    admin_course_ids: set[str] = set()
-
-    # Check to see if they are a TA for the course
-    ta: list[TAForCourse] = TAForCourse.query.filter(
-        TAForCourse.owner_id == user_id,
-    ).all()
-
-    # Check to see if they are a professor for the course
-    prof: list[ProfessorForCourse] = ProfessorForCourse.query.filter(
-        ProfessorForCourse.owner_id == user_id,
-    ).all()
-
-    for in_course in ta:
-        admin_course_ids.add(in_course.course_id)
-
-    for in_course in prof:
-        admin_course_ids.add(in_course.course_id)
-
-    return admin_course_ids
+    # The courses they are a ta or professor for
+    return set(get_course_permissions(user_id=user_id).admin_course_ids)
 
 
 def get_user_course_ids(user: User) -> tuple[set[str], set[str]]:
@@ -536,9 +504,9 @@ def get_user_course_ids(user: User) -> tuple[set[str], set[str]]:
     course_ids: set[str] = set(get_student_course_ids(user))
     admin_course_ids: set[str]
 
-    # If they are a superuser, then just return True
+    # If they are a superuser, then they are an admin for every course
     if user.is_superuser:
-        admin_course_ids = set(map(lambda x: x.id, Course.query.all()))
+        admin_course_ids = {course["id"] for course in get_course_permissions(user).super_for}
 
     # Else calculate which courses they are an admin for
     else:
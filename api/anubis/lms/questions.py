@@ -2,8 +2,11 @@ import io
 import json
 import random
 import zipfile
+from datetime import datetime
+from typing import Any, Iterator
 
 import yaml
+from sqlalchemy import and_, func, insert
 
 from anubis.lms.students import get_students, get_students_in_class
 from anubis.models import (
@@ -13,11 +16,13 @@ from anubis.models import (
     AssignmentQuestion,
     InCourse,
     Course,
+    LateException,
     User,
     db,
 )
+from anubis.models.id import default_id_factory
 from anubis.utils.cache import cache
-from anubis.utils.data import verify_data_shape, is_debug
+from anubis.utils.data import verify_data_shape, is_debug, split_chunks
 from anubis.utils.logging import logger
 
 
@@ -109,13 +114,15 @@ def hard_reset_questions(assignment: Assignment, commit: bool = True):
         db.session.commit()
 
 
-def assign_questions(assignment: Assignment):
+def assign_questions(assignment: Assignment, chunk_size: int = 1000):
     """
-    Assign existing questions to students for a given assignment.
+    Assign existing questions to students for a given assignment. The
+    question assignments are created with bulk inserts, a chunk at a time.
 
     * This will reset question assignments when called *
 
     :param assignment:
+    :param chunk_size: max number of question assignments in each insert
     :return:
     """
 
@@ -130,21 +137,36 @@ def assign_questions(assignment: Assignment):
     questions = get_question_pool_mapping(raw_questions)
 
     # Go through students in the class and assign them questions
+    now = datetime.now()
+    assigned_question_rows = []
     assigned_questions = []
-    students = User.query.join(InCourse).filter(InCourse.course_id == assignment.course_id).all()
-    for student in students:
+    student_ids = db.session.query(User.id).join(InCourse).filter(InCourse.course_id == assignment.course_id).all()
+    for student_id, in student_ids:
         for sequence, qs in questions.items():
             # Get a random question from the pool at this sequence
             selected_question = random.choice(qs)
 
             # Assign them the question
-            assigned_question = AssignedStudentQuestion(
-                owner=student,
-                assignment=assignment,
-                question=selected_question,
-            )
-            assigned_questions.append(assigned_question.data)
-            db.session.add(assigned_question)
+            assigned_question_id = default_id_factory()
+            assigned_question_rows.append({
+                "id":            assigned_question_id,
+                "owner_id":      student_id,
+                "assignment_id": assignment.id,
+                "question_id":   selected_question.id,
+                "created":       now,
+                "last_updated":  now,
+            })
+
+            # The question is new, so there is no response yet
+            assigned_questions.append({
+                "id":       assigned_question_id,
+                "response": {"submitted": None, "late": True, "text": selected_question.placeholder},
+                "question": selected_question.data,
+            })
+
+    # Insert the question assignments
+    for chunk in split_chunks(assigned_question_rows, chunk_size):
+        db.session.execute(insert(AssignedStudentQuestion), chunk)
 
     # Mark the assignment as questions assigned
     assignment.questions_assigned = True
@@ -266,6 +288,106 @@ def get_all_questions(assignment: Assignment) -> list[dict[str, str]]:
     return questions_list
 
 
+def get_owners_assigned_questions(
+    assignment_id: str, owner_ids: list[str], full: bool = False
+) -> dict[str, list[dict[str, Any]]]:
+    """
+    Get the assigned questions for many students on an assignment. The
+    questions and their latest responses are loaded in one grouped query
+    for all the students, rather than a query per question.
+
+    If the full option is on, then a full view (including solutions) will be returned
+
+    :param assignment_id:
+    :param owner_ids:
+    :param full:
+    :return: owner_id -> assigned questions ordered by pool
+    """
+    from anubis.lms.assignments import get_assignment_due
+
+    owners_assigned_questions: dict[str, list[dict[str, Any]]] = {owner_id: [] for owner_id in owner_ids}
+    if len(owner_ids) == 0:
+        return owners_assigned_questions
+
+    # Responses are late if they came in after the due date for the student
+    due_date: datetime = get_assignment_due(assignment_id)
+    owner_due_dates: dict[str, datetime] = dict(
+        db.session.query(LateException.owner_id, LateException.due_date).filter(
+            LateException.assignment_id == assignment_id,
+            LateException.owner_id.in_(owner_ids),
+        ).all()
+    )
+
+    # Find when the latest response to each question was made
+    latest_responses = (
+        db.session.query(
+            AssignedQuestionResponse.assigned_question_id.label("assigned_question_id"),
+            func.max(AssignedQuestionResponse.created).label("created"),
+        )
+        .join(AssignedStudentQuestion, AssignedStudentQuestion.id == AssignedQuestionResponse.assigned_question_id)
+        .filter(
+            AssignedStudentQuestion.assignment_id == assignment_id,
+            AssignedStudentQuestion.owner_id.in_(owner_ids),
+        )
+        .group_by(AssignedQuestionResponse.assigned_question_id)
+        .subquery()
+    )
+
+    # Get the assigned questions along with their latest response
+    assigned_questions = (
+        db.session.query(
+            AssignedStudentQuestion.id,
+            AssignedStudentQuestion.owner_id,
+            AssignmentQuestion,
+            AssignedQuestionResponse.response,
+            AssignedQuestionResponse.created,
+        )
+        .join(AssignmentQuestion, AssignmentQuestion.id == AssignedStudentQuestion.question_id)
+        .outerjoin(latest_responses, latest_responses.c.assigned_question_id == AssignedStudentQuestion.id)
+        .outerjoin(
+            AssignedQuestionResponse,
+            and_(
+                AssignedQuestionResponse.assigned_question_id == AssignedStudentQuestion.id,
+                AssignedQuestionResponse.created == latest_responses.c.created,
+            ),
+        )
+        .filter(
+            AssignedStudentQuestion.assignment_id == assignment_id,
+            AssignedStudentQuestion.owner_id.in_(owner_ids),
+        )
+        .order_by(AssignmentQuestion.pool)
+        .all()
+    )
+
+    seen: set[str] = set()
+    for assigned_question_id, owner_id, question, response, response_created in assigned_questions:
+        # Responses made at the same time can both come back, only take one
+        if assigned_question_id in seen:
+            continue
+        seen.add(assigned_question_id)
+
+        question: AssignmentQuestion
+        response_data = {
+            "submitted": None,
+            "late":      True,
+            "text":      question.placeholder,
+        }
+        if response_created is not None:
+            response_data = {
+                "submitted": str(response_created),
+                "late":      owner_due_dates.get(owner_id, due_date) < response_created,
+                "text":      response,
+            }
+
+        owners_assigned_questions[owner_id].append({
+            "id":       assigned_question_id,
+            "response": response_data,
+            "question": question.full_data if full else question.data,
+        })
+
+    return owners_assigned_questions
+
+
 @cache.memoize(timeout=5, unless=is_debug)
 def get_assigned_questions(assignment_id: str, user_id: str, full: bool = False):
     """
@@ -280,81 +402,101 @@ def get_assigned_questions(assignment_id: str, user_id: str, full: bool = False)
     :param full:
     :return:
     """
+    return get_owners_assigned_questions(assignment_id, [user_id], full=full)[user_id]
 
-    # Get assigned questions
-    assigned_questions = (
-        AssignedStudentQuestion.query.join(AssignmentQuestion)
-            .filter(
-            AssignedStudentQuestion.assignment_id == assignment_id,
-            AssignedStudentQuestion.owner_id == user_id,
-        )
-            .order_by(AssignmentQuestion.pool)
-            .all()
-    )
-
-    if not full:
-        return [assigned_question.data for assigned_question in assigned_questions]
-    return [assigned_question.full_data for assigned_question in assigned_questions]
 
-
-def get_question_assignments(assignment: Assignment):
+def iter_question_assignments(assignment: Assignment, chunk_size: int = 500) -> Iterator[dict[str, Any]]:
     """
+    Iterate over the question assignments (with solutions) of every student
+    in the course, loading them a chunk of students at a time.
 
     :param assignment:
+    :param chunk_size: number of students to load the questions of at once
     :return:
     """
 
-    # Create a dictionary of question assignments
-    # netid -> get_assigned_questions(assignment, student, full=True)
-    assignments = {}
-
     # Get all the students in the course
     students = get_students(assignment.course_id)
 
-    for student in students:
-        assignments[student["netid"]] = {
-            "name": student["name"],
-            "netid": student["netid"],
-            "questions": get_assigned_questions(assignment.id, student["id"], full=True),
-        }
+    for chunk in split_chunks(students, chunk_size):
+        owners_assigned_questions = get_owners_assigned_questions(
+            assignment.id, [student["id"] for student in chunk], full=True,
+        )
+        for student in chunk:
+            yield {
+                "name":      student["name"],
+                "netid":     student["netid"],
+                "questions": owners_assigned_questions[student["id"]],
+            }
 
-    return assignments
 
+def get_question_assignments(assignment: Assignment):
+    """
+    Get the question assignments (with solutions) of every student
+    in the course.
 
-@cache.memoize(timeout=120, unless=is_debug)
-def export_assignment_questions(assignment_id: str) -> bytes | None:
+    :param assignment:
+    :return: netid -> student question assignments
     """
-    Export an assignment questions to a zip file.
 
-    :param assignment_id:
-    :return:
+    # Create a dictionary of question assignments
+    # netid -> {name, netid, questions}
+    return {
+        question_assignment["netid"]: question_assignment
+        for question_assignment in iter_question_assignments(assignment)
+    }
+
+
+class _ZipStream(io.RawIOBase):
+    """
+    Write only file that holds on to what a ZipFile writes to it until it
+    is taken. It can not seek, so the ZipFile writes each entry straight
+    through (with a data descriptor after it) rather than going back to
+    fill in the header.
     """
 
-    # Get the assignment
-    assignment = Assignment.query.filter(Assignment.id == assignment_id).first()
+    def __init__(self):
+        super().__init__()
+        self._chunks: list[bytes] = []
 
-    # If the assignment does not exist, then return None
-    if assignment is None:
-        return None
+    def writable(self) -> bool:
+        return True
 
-    # Get the question assignments. This data includes all the
-    # question strs, solution strs, and student responses for
-    # an assignment.
-    question_assignments = get_question_assignments(assignment)
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        return len(b)
 
-    # Create an in-memory zip file buffer
-    zip_buffer = io.BytesIO()
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
 
-    # Create a zip file using the in-memory buffer
-    with zipfile.ZipFile(zip_buffer, "a", zipfile.ZIP_DEFLATED, False) as zip_file:
+
+def export_assignment_questions(assignment: Assignment) -> Iterator[bytes]:
+    """
+    Export an assignment questions to a zip file. The zip is generated a
+    student at a time, and each piece is given back as soon as it is
+    written so the whole archive is never held in memory.
+
+    :param assignment:
+    :return: chunks of the zip file
+    """
+
+    zip_stream = _ZipStream()
+
+    # Create a zip file that writes to the stream
+    with zipfile.ZipFile(zip_stream, "w", zipfile.ZIP_DEFLATED, False) as zip_file:
 
         # list of student meta data
         student_metas = []
 
-        # Iterate through all the student question assignments
-        for netid, data in question_assignments.items():
+        # Iterate through all the student question assignments. This
+        # data includes all the question strs, solution strs, and
+        # student responses for an assignment.
+        for data in iter_question_assignments(assignment):
 
-            # Get the name of the student
+            # Get the netid and name of the student
+            netid = data["netid"]
             name = data["name"]
 
             # list of responses for this student
@@ -387,14 +529,17 @@ def export_assignment_questions(assignment_id: str) -> bytes | None:
             # Write this students meta data to their directory
             zip_file.writestr(f"{netid}/meta.yaml", yaml.safe_dump(student_data))
 
-            # Write a global assignment and student meta data file
+            # Pass back what has been written for this student
+            yield zip_stream.take()
+
+        # Write a global assignment and student meta data file
         zip_file.writestr(
             "assignment.yaml",
             yaml.safe_dump({"assignment": assignment.data, "students": student_metas}),
         )
 
-    # Pass back the buffer in bytes
-    return zip_buffer.getvalue()
+    # Pass back the rest of the zip, including the central directory
+    yield zip_stream.take()
 
 
 @cache.memoize(timeout=120, unless=is_debug)
@@ -1,8 +1,8 @@
 from datetime import datetime, timedelta
 
 from anubis.lms.courses import get_course_users
-from anubis.models import Submission, Assignment
-from anubis.utils.data import with_context, split_chunks
+from anubis.models import Submission, Assignment, db
+from anubis.utils.data import with_context
 
 
 @with_context
@@ -14,7 +14,7 @@ def bulk_regrade_assignment(
     reaped: int = -1,
     latest_only: int = -1,
 ):
-    from anubis.lms.submissions import get_latest_user_submissions
+    from anubis.lms.submissions import bulk_regrade_submissions, get_latest_user_submissions
 
     assignment: Assignment = Assignment.query.filter(
         Assignment.id == assignment_id,
@@ -46,19 +46,15 @@ def bulk_regrade_assignment(
         if reaped == 1:
             filters.append(Submission.state == "Reaped after timeout")
 
-        # Get all submissions matching the filters
-        submissions = Submission.query.filter(
+        # Get the ids of all submissions matching the filters
+        submissions = db.session.query(Submission.id).filter(
             Submission.assignment_id == assignment_id,
             Submission.owner_id is not None,
             *filters,
         ).all()
 
-    # Split the submissions into bite sized chunks
+    # Reset all the submissions in one transaction, and enqueue
+    # all their pipelines together. This already runs in an rpc
+    # worker, so there is no need to split into more jobs.
     submission_ids = [s.id for s in submissions]
-    submission_chunks = split_chunks(submission_ids, 100)
-
-    from anubis.rpc.enqueue import enqueue_bulk_regrade_submissions
-
-    # Enqueue each chunk as a job for the rpc workers
-    for chunk in submission_chunks:
-        enqueue_bulk_regrade_submissions(chunk)
+    bulk_regrade_submissions(submission_ids)
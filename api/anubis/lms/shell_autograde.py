@@ -219,3 +219,20 @@ def close_shell_autograde_ide_submission(theia_session: TheiaSession):
     submission.state = SHELL_AUTOGRADE_SUBMISSION_STATE_MESSAGE
     submission.processed = True
     db.session.add(submission)
+
+
+def close_shell_autograde_ide_submissions(submission_ids: list[str]):
+    """
+    Close the shell autograde submissions of many reaped
+    ide sessions with a single UPDATE.
+
+    :param submission_ids:
+    :return:
+    """
+    if len(submission_ids) == 0:
+        return
+
+    Submission.query.filter(Submission.id.in_(submission_ids)).update({
+        Submission.state:     SHELL_AUTOGRADE_SUBMISSION_STATE_MESSAGE,
+        Submission.processed: True,
+    }, synchronize_session=False)
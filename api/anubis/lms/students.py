@@ -1,5 +1,6 @@
 from anubis.models import Course, InCourse, User
-from anubis.utils.cache import cache
+from anubis.models.serialize import serialize_users
+from anubis.utils.cache import cache, versioned_memoize
 from anubis.utils.data import is_debug, is_job
 
 
@@ -22,10 +23,10 @@ def get_students(course_id: str = None) -> list[dict[str, dict]]:
         users = User.query.all()
 
     # Get all users, and break them into their data props
-    return [s.data for s in users]
+    return serialize_users(users)
 
 
-@cache.memoize(timeout=60, unless=is_debug)
+@versioned_memoize({"course": "course_id"}, timeout=600, unless=is_debug)
 def get_students_in_class(course_id, offset=None, limit=None):
     """
     Similar to the get_students function, this function
@@ -33,7 +34,7 @@ def get_students_in_class(course_id, offset=None, limit=None):
     takes the course_id instead of the course code.
 
     * optionally accepts a offset and limit for the query *
-    * This response is cached for up to 60 seconds *
+    * This response is cached until the course roster changes *
 
     :param course_id:
     :param offset:
@@ -45,9 +46,8 @@ def get_students_in_class(course_id, offset=None, limit=None):
     # in the query.
     if offset is not None and limit is not None:
         # Get the users, and break them into their data props
-        return [
-            u.data
-            for u in User.query.join(InCourse)
+        return serialize_users(
+            User.query.join(InCourse)
                 .join(Course)
                 .filter(
                 Course.id == course_id,
@@ -57,12 +57,11 @@ def get_students_in_class(course_id, offset=None, limit=None):
                 .limit(limit)
                 .offset(offset)
                 .all()
-        ]
+        )
 
     # Get the users, and break them into their data props
-    return [
-        u.data
-        for u in User.query.join(InCourse)
+    return serialize_users(
+        User.query.join(InCourse)
             .join(Course)
             .filter(
             Course.id == course_id,
@@ -70,4 +69,4 @@ def get_students_in_class(course_id, offset=None, limit=None):
         )
             .order_by(User.name.desc())
             .all()
-    ]
+    )
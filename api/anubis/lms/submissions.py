@@ -1,7 +1,12 @@
 from datetime import datetime
 
+from parse import parse
+from sqlalchemy import insert
+
 from anubis.constants import AUTOGRADE_DISABLED_MESSAGE
+from anubis.k8s.pipeline.admission import PIPELINE_PRIORITY_REGRADE, PIPELINE_PRIORITY_STUDENT
 from anubis.lms.assignments import get_assignment_due_date
+from anubis.lms.autograde import recalculate_best_submissions
 from anubis.models import (
     Assignment,
     AssignmentTest,
@@ -13,37 +18,164 @@ from anubis.models import (
     User,
     db,
 )
-from anubis.utils.cache import cache
+from anubis.utils.cache import bump_user_cache_versions, cache, versioned_memoize
 from anubis.utils.data import is_debug, split_chunks, with_context
 from anubis.utils.http import error_response, success_response
 from anubis.utils.logging import logger
 
 
 @with_context
-def bulk_regrade_submissions(submissions: list[Submission]) -> list[dict]:
+def bulk_regrade_submissions(submissions: list[Submission | str]) -> list[dict]:
     """
-    Regrade a batch of submissions
+    Regrade a batch of submissions. All the submissions are reset
+    together, then their pipelines are enqueued together.
+
     :param submissions:
     :return:
     """
+    from anubis.rpc.enqueue import enqueue_autograde_pipelines
 
-    # Running list of regrade dictionaries
-    response = []
+    submission_ids = [
+        submission if isinstance(submission, str) else submission.id
+        for submission in submissions
+    ]
 
-    # enqueue regrade jobs for each submissions
-    for submission in submissions:
-        response.append(regrade_submission(submission, queue="regrade"))
+    # Reset all the submissions that are not currently being processed
+    found_ids, reset_ids = bulk_reset_submissions(submission_ids)
+
+    # Enqueue the submission jobs
+    enqueue_autograde_pipelines(reset_ids, queue="regrade", priority=PIPELINE_PRIORITY_REGRADE)
 
     # Pass back a list of all the regrade return dictionaries
+    found_ids, reset_ids = set(found_ids), set(reset_ids)
+    response = []
+    for submission_id in submission_ids:
+        if submission_id in reset_ids:
+            response.append(success_response({"message": "regrade started"}))
+        elif submission_id in found_ids:
+            response.append(error_response("submission currently being processed"))
+        else:
+            response.append(error_response("could not find submission"))
     return response
 
 
-def regrade_submission(submission: Submission | str, queue: str = "default") -> dict:
+def bulk_reset_submissions(
+    submission_ids: list[str],
+    state: str = "Waiting for resources...",
+    chunk_size: int = 1000,
+) -> tuple[list[str], list[str]]:
+    """
+    Set based version of init_submission for many submissions at once.
+    Submissions that are currently being processed are skipped. The build
+    and test results of the rest are deleted and recreated with bulk
+    statements, all in a single transaction.
+
+    * Commits changes *
+
+    :param submission_ids:
+    :param state:
+    :param chunk_size: max number of ids in each IN clause
+    :return: ids of submissions found, ids of submissions reset
+    """
+
+    # Get the submissions that exist
+    submission_rows = []
+    for chunk in split_chunks(list(set(submission_ids)), chunk_size):
+        submission_rows.extend(
+            db.session.query(
+                Submission.id, Submission.assignment_id, Submission.owner_id, Submission.processed
+            ).filter(Submission.id.in_(chunk)).all()
+        )
+    found_ids = [submission_id for submission_id, _, _, _ in submission_rows]
+
+    # Submissions already marked as processing are skipped
+    submission_rows = [row for row in submission_rows if row.processed]
+    reset_ids = [submission_id for submission_id, _, _, _ in submission_rows]
+    if len(reset_ids) == 0:
+        return found_ids, reset_ids
+
+    # Get the tests for every assignment involved in one query
+    assignment_ids = {assignment_id for _, assignment_id, _, _ in submission_rows}
+    assignment_test_ids: dict[str, list[str]] = {assignment_id: [] for assignment_id in assignment_ids}
+    for test_id, assignment_id in (
+        db.session.query(AssignmentTest.id, AssignmentTest.assignment_id)
+        .filter(AssignmentTest.assignment_id.in_(assignment_ids))
+        .order_by(AssignmentTest.order.asc())
+        .all()
+    ):
+        assignment_test_ids[assignment_id].append(test_id)
+
+    now = datetime.now()
+    for chunk in split_chunks(reset_ids, chunk_size):
+        # Delete the existing builds and test results
+        SubmissionTestResult.query.filter(
+            SubmissionTestResult.submission_id.in_(chunk),
+        ).delete(synchronize_session=False)
+        SubmissionBuild.query.filter(
+            SubmissionBuild.submission_id.in_(chunk),
+        ).delete(synchronize_session=False)
+
+        # Reset the submissions themselves
+        Submission.query.filter(Submission.id.in_(chunk)).update(
+            {
+                Submission.accepted:     True,
+                Submission.processed:    False,
+                Submission.state:        state,
+                Submission.errors:       None,
+                Submission.pipeline_log: None,
+                Submission.last_updated: now,
+            },
+            synchronize_session=False,
+        )
+
+    # Recreate the builds and test results with bulk inserts
+    db.session.execute(
+        insert(SubmissionBuild),
+        [{"submission_id": submission_id} for submission_id in reset_ids],
+    )
+    test_results = [
+        {"submission_id": submission_id, "assignment_test_id": test_id}
+        for submission_id, assignment_id, _, _ in submission_rows
+        for test_id in assignment_test_ids[assignment_id]
+    ]
+    if len(test_results) > 0:
+        db.session.execute(insert(SubmissionTestResult), test_results)
+
+    db.session.commit()
+
+    # Drop any stale submission objects held by the session
+    db.session.expire_all()
+
+    # Test results were all reset, so rebuild the best submissions
+    # for the students that were affected.
+    assignment_owner_ids: dict[str, set[str]] = {assignment_id: set() for assignment_id in assignment_ids}
+    for _, assignment_id, owner_id, _ in submission_rows:
+        if owner_id is not None:
+            assignment_owner_ids[assignment_id].add(owner_id)
+    for assignment_id, owner_ids in assignment_owner_ids.items():
+        recalculate_best_submissions(assignment_id, list(owner_ids))
+
+    # Invalidate the cached submissions of the students that were affected
+    owner_ids = list(set().union(*assignment_owner_ids.values()))
+    owners = []
+    for chunk in split_chunks(owner_ids, chunk_size):
+        owners.extend(db.session.query(User.id, User.netid).filter(User.id.in_(chunk)).all())
+    bump_user_cache_versions(*owners)
+
+    return found_ids, reset_ids
+
+
+def regrade_submission(
+    submission: Submission | str,
+    queue: str = "default",
+    priority: int = PIPELINE_PRIORITY_STUDENT,
+) -> dict:
     """
     Regrade a submission
 
     :param submission: Union[Submissions, str]
     :param queue:
+    :param priority: pipeline admission priority
     :return: dict response
     """
     from anubis.rpc.enqueue import enqueue_autograde_pipeline
@@ -74,12 +206,12 @@ def regrade_submission(submission: Submission | str, queue: str = "default") ->
     init_submission(submission)
 
     # Enqueue the submission job
-    enqueue_autograde_pipeline(submission.id, queue=queue)
+    enqueue_autograde_pipeline(submission.id, queue=queue, priority=priority)
 
     return success_response({"message": "regrade started"})
 
 
-@cache.memoize(timeout=3, unless=is_debug, source_check=True)
+@versioned_memoize({"user": "user_id"}, timeout=600, unless=is_debug)
 def get_submissions(
     user_id=None,
     course_id=None,
@@ -147,6 +279,10 @@ def recalculate_late_submissions(student: User, assignment: Assignment):
     """
     from anubis.rpc.enqueue import rpc_enqueue
 
+    # The late exception for this student may have just changed
+    cache.delete_memoized(get_assignment_due_date, student.id, assignment.id)
+    cache.delete_memoized(get_assignment_due_date, student.id, assignment.id, True)
+
     # Get the due date for this student
     due_date = get_assignment_due_date(student.id, assignment.id, grace=True)
 
@@ -168,8 +304,8 @@ def recalculate_late_submissions(student: User, assignment: Assignment):
 
     # Go through, and reset and enqueue regrade
     s_accept_ids = list(map(lambda x: x.id, s_accept))
-    for chunk in split_chunks(s_accept_ids, 32):
-        rpc_enqueue(bulk_regrade_submissions, "regrade", args=[chunk])
+    if len(s_accept_ids) > 0:
+        rpc_enqueue(bulk_regrade_submissions, "regrade", args=[s_accept_ids])
 
     # Reject the submissions that need to be updated
     for submission in s_reject:
@@ -178,6 +314,10 @@ def recalculate_late_submissions(student: User, assignment: Assignment):
     # Commit the changes
     db.session.commit()
 
+    # Rejected submissions can no longer be the best
+    recalculate_best_submissions(assignment.id, [student.id])
+    bump_user_cache_versions(student)
+
 
 def reject_late_submission(submission: Submission):
     """
@@ -254,6 +394,81 @@ def init_submission(submission: Submission, db_commit: bool = True, state: str =
         # Commit new models
         db.session.commit()
 
+        # Invalidate the cached submissions of the owner
+        if submission.owner is not None:
+            bump_user_cache_versions(submission.owner)
+
+
+def init_new_submissions(
+    submissions: list[Submission],
+    late_submission_ids: set[str] = None,
+    state: str = "Waiting for resources...",
+):
+    """
+    Set based version of init_submission for submissions that were just
+    created, so there are no existing builds or test results to clear. The
+    builds and test results for all of them are created with bulk inserts.
+    Late submissions are created already rejected, the same way
+    reject_late_submission would leave them.
+
+    * Does not commit changes *
+
+    :param submissions: new submission objects, added to the session
+    :param late_submission_ids: ids of the submissions to reject as late
+    :param state:
+    :return:
+    """
+    late_submission_ids = late_submission_ids or set()
+    if len(submissions) == 0:
+        return
+
+    # Flush so that the new submissions have ids
+    db.session.flush()
+
+    # Get the tests for every assignment involved in one query
+    assignment_ids = {submission.assignment_id for submission in submissions}
+    assignment_test_ids: dict[str, list[str]] = {assignment_id: [] for assignment_id in assignment_ids}
+    for test_id, assignment_id in (
+        db.session.query(AssignmentTest.id, AssignmentTest.assignment_id)
+        .filter(AssignmentTest.assignment_id.in_(assignment_ids))
+        .order_by(AssignmentTest.order.asc())
+        .all()
+    ):
+        assignment_test_ids[assignment_id].append(test_id)
+
+    # Set the submissions themselves
+    for submission in submissions:
+        if submission.id in late_submission_ids:
+            submission.accepted = False
+            submission.processed = True
+            submission.state = "Late submissions not accepted"
+        else:
+            submission.accepted = True
+            submission.processed = False
+            submission.state = state
+        submission.errors = None
+
+    # Create the builds and test results with bulk inserts
+    rejected = {"passed": False, "message": "Late submissions not accepted", "output": "", "output_type": "text"}
+    db.session.execute(
+        insert(SubmissionBuild),
+        [
+            {"submission_id": submission.id, "passed": False, "stdout": "Late submissions not accepted"}
+            if submission.id in late_submission_ids
+            else {"submission_id": submission.id, "passed": None, "stdout": None}
+            for submission in submissions
+        ],
+    )
+    test_results = [
+        {"submission_id": submission.id, "assignment_test_id": test_id, **rejected}
+        if submission.id in late_submission_ids
+        else {"submission_id": submission.id, "assignment_test_id": test_id, "passed": None, "message": None, "output": None, "output_type": "text"}
+        for submission in submissions
+        for test_id in assignment_test_ids[submission.assignment_id]
+    ]
+    if len(test_results) > 0:
+        db.session.execute(insert(SubmissionTestResult), test_results)
+
 
 def get_latest_user_submissions(assignment: Assignment, user: User, limit: int = 3, filter: list = None) -> list[Submission]:
     filter = filter or []
@@ -276,6 +491,11 @@ def fix_submissions_for_autograde_disabled_assignment(assignment: Assignment):
     })
     db.session.commit()
 
+    # Invalidate the cached submissions of every student with a submission
+    bump_user_cache_versions(*db.session.query(User.id, User.netid).join(
+        Submission, Submission.owner_id == User.id
+    ).filter(Submission.assignment_id == assignment.id).distinct().all())
+
 
 def get_submission_tests(submission: Submission, only_visible=False):
     """
@@ -299,3 +519,36 @@ def get_submission_tests(submission: Submission, only_visible=False):
 
     # Convert to dictionary data
     return [{"test": result.assignment_test.data, "result": result.data} for result in tests]
+
+
+def is_hidden_test_state(submission: Submission, state: str) -> bool:
+    """
+    Check if a state reported by a submission pipeline names a hidden
+    test. We do this by checking the state that was given, to read the
+    name of the test. If the assignment test that was found is marked
+    as hidden, then the state should not be put on the submission.
+
+    If we were to update the state of the submission when a hidden test
+    is reported, then it would be visible to the students in the frontend.
+
+    :param submission:
+    :param state:
+    :return:
+    """
+
+    # Do a basic match on the expected test
+    match = parse("Running test: {}", state)
+    if not match:
+        return False
+
+    # Get the parsed assignment test name
+    test_name = match[0]
+
+    # Try to get the assignment test
+    assignment_test = AssignmentTest.query.filter(
+        AssignmentTest.assignment_id == submission.assignment_id,
+        AssignmentTest.name == test_name,
+    ).first()
+
+    # The state is hidden if the test exists, and if it is marked as hidden
+    return assignment_test is not None and assignment_test.hidden
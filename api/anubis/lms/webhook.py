@@ -1,6 +1,48 @@
+import hashlib
+import json
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from typing import Any
+
+import sqlalchemy.exc
+from sqlalchemy import or_
+from sqlalchemy.orm import undefer
+
+from anubis.constants import AUTOGRADE_DISABLED_MESSAGE
+from anubis.k8s.pipeline.admission import PIPELINE_PRIORITY_STUDENT
+from anubis.lms.assignments import get_assignment_due_date
+from anubis.lms.autograde import recalculate_best_submissions
 from anubis.lms.repos import get_repos
-from anubis.models import Assignment, AssignmentRepo, User, db
-from anubis.utils.cache import cache
+from anubis.lms.submissions import init_new_submissions
+from anubis.lms.webhook_routes import (
+    forget_repo_routes,
+    get_assignment_routes,
+    get_repo_name_route,
+    get_repo_route,
+    get_repo_routes,
+    get_user_routes,
+    set_repo_routes,
+)
+from anubis.models import Assignment, AssignmentRepo, Submission, User, WebhookDelivery, db
+from anubis.models.id import default_id_factory
+from anubis.utils.cache import bump_user_cache_versions, cache
+from anubis.utils.data import is_debug
+from anubis.utils.logging import logger
+from anubis.utils.redis import create_redis_lock, redis
+
+# Number of webhook deliveries processed together
+WEBHOOK_BATCH_SIZE = 100
+
+# Redis key that is set while a drain of the webhook deliveries is
+# enqueued, so that a burst of pushes only enqueues one drain.
+WEBHOOK_DRAIN_SCHEDULED_KEY = "webhook-deliveries-drain-scheduled"
+
+# Pending deliveries older than this are picked up by the reaper, and
+# claims on deliveries older than this are taken to be abandoned
+WEBHOOK_STUCK_AFTER = timedelta(minutes=2)
+
+# How long processed deliveries are kept around for replays
+WEBHOOK_RETENTION = timedelta(days=30)
 
 
 def parse_webhook(webhook):
@@ -44,11 +86,7 @@ def guess_github_repo_owner(assignment: Assignment, repo_name: str) -> tuple[Use
     :param repo_name:
     :return:
     """
-    repo_name_split = repo_name.split("-")
-    unique_code_index = repo_name_split.index(assignment.unique_code)
-    repo_name_split = repo_name_split[unique_code_index + 1:]
-    netid1 = "-".join(repo_name_split)
-    netid2 = "-".join(repo_name_split[:-1])
+    netid1, netid2 = get_github_repo_netids(assignment.unique_code, repo_name)
     user = User.query.filter(
         User.netid.in_([netid1, netid2]),
         User.netid != "",
@@ -56,6 +94,58 @@ def guess_github_repo_owner(assignment: Assignment, repo_name: str) -> tuple[Use
     return user, netid1
 
 
+def get_github_repo_netids(unique_code: str, repo_name: str) -> tuple[str, str]:
+    """
+    Get the two netids the owner of a repo could have from the repo name.
+    Everything after the unique code is the netid, unless the repo name
+    had a suffix added to it.
+
+    :param unique_code: unique code of the assignment the repo is for
+    :param repo_name:
+    :return:
+    """
+    repo_name_split = repo_name.split("-")
+    unique_code_index = repo_name_split.index(unique_code)
+    repo_name_split = repo_name_split[unique_code_index + 1:]
+    netid1 = "-".join(repo_name_split)
+    netid2 = "-".join(repo_name_split[:-1])
+    return netid1, netid2
+
+
+def get_assignments_by_unique_code(assignments: dict[str, Assignment | None], repo_names: list[str]):
+    """
+    Resolve the unique_code -> Assignment for every part of the given repo
+    names that is not already in assignments, in one query. Parts that
+    are not unique codes are kept as None so they are not looked up again.
+
+    :param assignments: running map of unique_code -> assignment
+    :param repo_names:
+    :return:
+    """
+    codes = {code for repo_name in repo_names for code in repo_name.split("-")} - assignments.keys()
+    if len(codes) == 0:
+        return
+
+    for assignment in Assignment.query.filter(Assignment.unique_code.in_(codes)).all():
+        assignments[assignment.unique_code] = assignment
+    for code in codes:
+        assignments.setdefault(code, None)
+
+
+def get_repo_name_assignment(assignments: dict[str, Assignment | None], repo_name: str) -> Assignment | None:
+    """
+    Find the assignment for a repo from the parts of its name.
+
+    :param assignments: map of unique_code -> assignment
+    :param repo_name:
+    :return:
+    """
+    return next(
+        (assignments[code] for code in repo_name.split("-") if assignments.get(code, None) is not None),
+        None,
+    )
+
+
 def check_repo(assignment: Assignment, repo_url: str, user=None, netid=None) -> AssignmentRepo:
     """
     While processing the webhook, we need to check to see if we have
@@ -95,6 +185,439 @@ def check_repo(assignment: Assignment, repo_url: str, user=None, netid=None) ->
 
         if user is not None:
             cache.delete_memoized(get_repos, user.id)
+            bump_user_cache_versions(user)
 
     # Return the repo object
     return repo
+
+
+def get_webhook_delivery_id(webhook: dict) -> str:
+    """
+    Get the id a push webhook is recorded under. This is a hash of the push
+    itself rather than the github delivery id, as the same push is sent
+    once to each webhook configured on the org.
+
+    :param webhook:
+    :return:
+    """
+    repo_url, _, _, commit, before, ref, _ = parse_webhook(webhook)
+    return hashlib.sha256(f"{repo_url} {ref} {before} {commit}".encode()).hexdigest()
+
+
+def record_webhook_delivery(payload: bytes, webhook: dict, delivery_id: str | None = None) -> bool:
+    """
+    Record a push webhook to be processed later. Pushes that were
+    already recorded are ignored.
+
+    * Commits changes *
+
+    :param payload: raw request body
+    :param webhook: parsed request body
+    :param delivery_id: X-GitHub-Delivery header
+    :return: True if the delivery was new
+    """
+    repo_url, _, _, commit, _, _, _ = parse_webhook(webhook)
+    delivery = WebhookDelivery(
+        id=get_webhook_delivery_id(webhook),
+        delivery_id=delivery_id,
+        repo_url=repo_url,
+        commit=commit,
+        payload=payload,
+    )
+
+    try:
+        db.session.add(delivery)
+        db.session.commit()
+    except sqlalchemy.exc.IntegrityError:
+        db.session.rollback()
+        return False
+
+    return True
+
+
+def process_webhook_deliveries(batch_size: int = WEBHOOK_BATCH_SIZE) -> int:
+    """
+    Drain the pending webhook deliveries, a batch at a time. Each batch is
+    claimed (marked processing) under a redis lock before it is processed,
+    so that drains running at the same time do not process the same
+    deliveries. Claims older than WEBHOOK_STUCK_AFTER are taken to be
+    abandoned, and can be claimed again.
+
+    :param batch_size:
+    :return: number of deliveries processed
+    """
+
+    # Any delivery recorded from here on should enqueue another drain
+    if redis is not None:
+        redis.delete(WEBHOOK_DRAIN_SCHEDULED_KEY)
+
+    processed = 0
+    while True:
+        delivery_ids = claim_webhook_deliveries(batch_size)
+        if len(delivery_ids) == 0:
+            return processed
+
+        # Get the claimed deliveries, oldest first
+        deliveries: list[WebhookDelivery] = (
+            WebhookDelivery.query.options(undefer(WebhookDelivery._payload))
+            .filter(WebhookDelivery.id.in_(delivery_ids))
+            .order_by(WebhookDelivery.created.asc())
+            .all()
+        )
+
+        # Process the batch as a whole. If anything goes wrong, fall back
+        # to processing the deliveries one at a time so that only the
+        # broken delivery is marked as failed.
+        followups: list[dict[str, Any]] = []
+        try:
+            followups.append(process_webhook_delivery_batch(deliveries))
+        except Exception as e:
+            logger.error(f"Failed to process webhook batch, retrying one at a time {e}")
+            db.session.rollback()
+            for delivery in deliveries:
+                # Skip anything that did get processed
+                if delivery.processed:
+                    continue
+                try:
+                    followups.append(process_webhook_delivery_batch([delivery]))
+                except Exception as e:
+                    logger.error(f"Failed to process webhook delivery {delivery.id} {e}")
+                    db.session.rollback()
+                    delivery.processed = True
+                    delivery.status = "failed"
+                    db.session.commit()
+
+        # The deliveries are committed, so what is left
+        # to do for them is never a reason to process them again.
+        for followup in followups:
+            finish_webhook_delivery_batch(followup)
+
+        processed += len(deliveries)
+        logger.info(f"Processed {len(deliveries)} webhook deliveries")
+
+
+def claim_webhook_deliveries(batch_size: int) -> list[str]:
+    """
+    Claim the next batch of pending webhook deliveries, oldest first.
+    The lock is only held while claiming, not while processing.
+
+    * Commits changes *
+
+    :param batch_size:
+    :return: ids of the claimed deliveries
+    """
+    lock = create_redis_lock("webhook-deliveries", auto_release_time=60.0) if redis is not None else nullcontext()
+    with lock:
+        now = datetime.now()
+        delivery_ids = [
+            delivery_id
+            for delivery_id, in db.session.query(WebhookDelivery.id)
+            .filter(
+                WebhookDelivery.processed == False,
+                or_(
+                    WebhookDelivery.status == None,
+                    WebhookDelivery.last_updated < now - WEBHOOK_STUCK_AFTER,
+                ),
+            )
+            .order_by(WebhookDelivery.created.asc())
+            .limit(batch_size)
+            .all()
+        ]
+        if len(delivery_ids) > 0:
+            WebhookDelivery.query.filter(WebhookDelivery.id.in_(delivery_ids)).update(
+                {WebhookDelivery.status: "processing", WebhookDelivery.last_updated: now},
+                synchronize_session=False,
+            )
+        db.session.commit()
+
+    return delivery_ids
+
+
+def process_webhook_delivery_batch(deliveries: list[WebhookDelivery]):
+    """
+    Process a batch of push webhook deliveries. This does what used to be
+    done for each push as it came in, but with the assignments, owners,
+    repos and existing submissions for the whole batch looked up
+    together, and the whole batch committed at once.
+
+    What is left to do once the batch is committed is given back, to be
+    done with finish_webhook_delivery_batch.
+
+    * Commits changes *
+
+    :param deliveries:
+    :return: followup for finish_webhook_delivery_batch
+    """
+
+    # Load the basics from each webhook
+    pushes = [(delivery, *parse_webhook(json.loads(delivery.payload))) for delivery in deliveries]
+
+    # Match the pushes to assignments, owners and repos from the routing index
+    assignment_routes = get_assignment_routes()
+    push_assignments = {
+        delivery.id: get_repo_name_route(assignment_routes, repo_name)
+        for delivery, _, repo_name, *_ in pushes
+    }
+    push_netids: dict[str, tuple[str, str]] = {
+        delivery.id: get_github_repo_netids(push_assignments[delivery.id]["unique_code"], repo_name)
+        for delivery, _, repo_name, *_ in pushes
+        if push_assignments[delivery.id] is not None
+    }
+    user_ids = get_user_routes(netid1 for netid1, _ in push_netids.values())
+    user_ids.update(get_user_routes(netid2 for netid1, netid2 in push_netids.values() if netid1 not in user_ids))
+    repos_by_url = get_repo_routes(repo_url for _, repo_url, *_ in pushes)
+
+    # Repos not found by url (or only found without an owner) may
+    # still be on record for their owner
+    repos_by_owner: dict[tuple[str, str], dict[str, Any]] = {}
+    missing_owner_ids: set[str] = set()
+    for delivery, repo_url, *_ in pushes:
+        url_repo = repos_by_url.get(repo_url, None)
+        if (url_repo is None or url_repo["owner_id"] is None) and delivery.id in push_netids:
+            netid1, netid2 = push_netids[delivery.id]
+            missing_owner_ids.add(user_ids.get(netid1, None) or user_ids.get(netid2, None))
+    missing_owner_ids.discard(None)
+    if len(missing_owner_ids) > 0:
+        for repo in AssignmentRepo.query.filter(
+            AssignmentRepo.owner_id.in_(missing_owner_ids),
+            AssignmentRepo.assignment_id.in_({route["id"] for route in push_assignments.values() if route is not None}),
+        ).all():
+            repos_by_owner.setdefault((repo.assignment_id, repo.owner_id), get_repo_route(repo))
+
+    # Find the commits that already have submissions in one query
+    existing_commits: set[str] = {
+        commit
+        for commit, in db.session.query(Submission.commit).filter(
+            Submission.commit.in_([commit for _, _, _, _, commit, *_ in pushes])
+        )
+    }
+
+    new_repos: list[AssignmentRepo] = []
+    claimed_repos: dict[str, dict[str, Any]] = {}
+
+    def get_repo(assignment: dict[str, Any], repo_url: str, user_id: str | None, netid: str) -> dict[str, Any]:
+        # Find the repo, and if we dont have a record of it, then add it
+        repo = repos_by_url.get(repo_url, None)
+        if (repo is None or repo["owner_id"] is None) and user_id is not None:
+            owned_repo = repos_by_owner.get((assignment["id"], user_id), None)
+
+            # A repo recorded before its owner gave us their github
+            # username is claimed for them now that we know who they are
+            if owned_repo is None and repo is not None:
+                AssignmentRepo.query.filter(AssignmentRepo.id == repo["id"]).update(
+                    {AssignmentRepo.owner_id: user_id},
+                    synchronize_session=False,
+                )
+                owned_repo = {**repo, "owner_id": user_id}
+                claimed_repos[repo_url] = owned_repo
+                repos_by_url[repo_url] = owned_repo
+                repos_by_owner[(assignment["id"], user_id)] = owned_repo
+
+            repo = owned_repo
+        if repo is None:
+            new_repo = AssignmentRepo(
+                id=default_id_factory(),
+                owner_id=user_id,
+                assignment_id=assignment["id"],
+                repo_url=repo_url,
+                netid=netid,
+            )
+            db.session.add(new_repo)
+            new_repos.append(new_repo)
+            repo = get_repo_route(new_repo)
+            repos_by_url[repo_url] = repo
+            if user_id is not None:
+                repos_by_owner[(assignment["id"], user_id)] = repo
+        return repo
+
+    submissions: list[tuple[WebhookDelivery, Submission, dict[str, Any]]] = []
+    for delivery, repo_url, repo_name, pusher_username, commit, before, ref, default_branch in pushes:
+        delivery.processed = True
+        assignment = push_assignments[delivery.id]
+
+        # Verify that we can match this push to an assignment
+        if assignment is None:
+            delivery.status = "assignment not found"
+            continue
+
+        # Get github username from the repository name
+        netid1, netid2 = push_netids[delivery.id]
+        user_id: str | None = user_ids.get(netid1, None) or user_ids.get(netid2, None)
+
+        # The before Hash will be all 0s on for the first hash.
+        # We will want to ignore both this first push (the initialization of the repo)
+        # and all branches that are not master.
+        if before == "0000000000000000000000000000000000000000":
+            # Record that a new repo was created (and therefore, someone just
+            # started their assignment)
+            logger.debug(
+                "new student repo ",
+                extra={
+                    "repo_url": repo_url,
+                    "pusher":   pusher_username,
+                    "commit":   commit,
+                },
+            )
+            get_repo(assignment, repo_url, user_id, netid1)
+            delivery.status = "initial dangling" if user_id is None else "initial commit"
+            continue
+
+        org_name = assignment["github_org"]
+        if not is_debug() and org_name is not None and org_name != "":
+            # Make sure that the repo we're about to process actually belongs to
+            # a github organization that matches the course.
+            if not repo_url.startswith(f"https://github.com/{org_name}"):
+                logger.error(
+                    "Invalid github organization in webhook.",
+                    extra={
+                        "repo_url":        repo_url,
+                        "pusher_username": pusher_username,
+                        "commit":          commit,
+                    },
+                )
+                delivery.status = "invalid repo"
+                continue
+
+        repo = get_repo(assignment, repo_url, user_id, netid1)
+
+        if ref != f"refs/heads/{default_branch}":
+            delivery.status = "not a push to default branch"
+            continue
+
+        # If the submission already exists, then there is nothing to do
+        if commit in existing_commits:
+            delivery.status = "already created"
+            continue
+        existing_commits.add(commit)
+
+        # Create a shiny new submission
+        submission = Submission(
+            assignment_id=assignment["id"],
+            assignment_repo_id=repo["id"],
+            owner_id=user_id,
+            commit=commit,
+            created=delivery.created,
+        )
+        db.session.add(submission)
+        submissions.append((delivery, submission, assignment))
+
+    # Create the builds and test results for the new submissions
+    db.session.flush()
+    late_submission_ids: set[str] = set()
+    for delivery, submission, assignment in submissions:
+        # If a user has not given us their github username
+        # the submission will stay in a "dangling" state
+        if submission.owner_id is None:
+            delivery.status = "dangling submission"
+        # Check that the assignment was still accepting submissions when the push came in
+        elif not assignment["accept_late"] and delivery.created > get_assignment_due_date(submission.owner_id, assignment["id"], grace=True):
+            late_submission_ids.add(submission.id)
+            delivery.status = "late submission rejected"
+        else:
+            delivery.status = "submission accepted"
+        delivery.submission_id = submission.id
+    init_new_submissions([submission for _, submission, _ in submissions], late_submission_ids)
+
+    # If autograde is disabled, then mark the submissions as processed
+    for _, submission, assignment in submissions:
+        if not assignment["autograde_enabled"] and submission.id not in late_submission_ids:
+            submission.processed = True
+            submission.accepted = True
+            submission.state = AUTOGRADE_DISABLED_MESSAGE
+
+    # Note what is needed after the commit, before everything is expired
+    enqueue_submission_ids = [
+        submission.id
+        for _, submission, assignment in submissions
+        if assignment["autograde_enabled"] and submission.accepted and submission.owner_id is not None
+    ]
+    best_owner_ids: dict[str, set[str]] = {}
+    for _, submission, _ in submissions:
+        if submission.owner_id is not None:
+            best_owner_ids.setdefault(submission.assignment_id, set()).add(submission.owner_id)
+    new_repo_routes = {repo.repo_url: get_repo_route(repo) for repo in new_repos}
+    new_repo_owner_ids = {repo.owner_id for repo in new_repos if repo.owner_id is not None}
+    new_repo_owner_ids |= {repo["owner_id"] for repo in claimed_repos.values()}
+    bump_user_ids = new_repo_owner_ids | {owner_id for owner_ids in best_owner_ids.values() for owner_id in owner_ids}
+
+    db.session.commit()
+
+    return {
+        "new_repo_routes":        new_repo_routes,
+        "claimed_repo_urls":      list(claimed_repos.keys()),
+        "new_repo_owner_ids":     new_repo_owner_ids,
+        "best_owner_ids":         best_owner_ids,
+        "enqueue_submission_ids": enqueue_submission_ids,
+        "bump_user_ids":          bump_user_ids,
+    }
+
+
+def finish_webhook_delivery_batch(followup: dict[str, Any]):
+    """
+    Do what is left for a committed batch of webhook deliveries. Each step
+    is done on its own, so that one failing does not keep the accepted
+    submissions from being enqueued.
+
+    :param followup: given back by process_webhook_delivery_batch
+    :return:
+    """
+    from anubis.rpc.enqueue import enqueue_autograde_pipelines
+
+    # Route the next pushes to the new repos without going to the database,
+    # and drop the owner-less routes of the repos that were claimed
+    try:
+        set_repo_routes(followup["new_repo_routes"])
+        forget_repo_routes(*followup["claimed_repo_urls"])
+    except Exception as e:
+        logger.error(f"Failed to set webhook repo routes {e}")
+
+    # Enqueue the accepted submissions
+    try:
+        if len(followup["enqueue_submission_ids"]) > 0:
+            enqueue_autograde_pipelines(followup["enqueue_submission_ids"], priority=PIPELINE_PRIORITY_STUDENT)
+    except Exception as e:
+        logger.error(f"Failed to enqueue webhook submissions {followup['enqueue_submission_ids']} {e}")
+
+    # The new submissions may already be the best for their students
+    try:
+        for assignment_id, owner_ids in followup["best_owner_ids"].items():
+            recalculate_best_submissions(assignment_id, list(owner_ids))
+    except Exception as e:
+        logger.error(f"Failed to recalculate best submissions for webhook batch {e}")
+        db.session.rollback()
+
+    # Invalidate cached repos and submissions
+    try:
+        for user_id in followup["new_repo_owner_ids"]:
+            cache.delete_memoized(get_repos, user_id)
+        if len(followup["bump_user_ids"]) > 0:
+            bump_user_cache_versions(
+                *db.session.query(User.id, User.netid).filter(User.id.in_(followup["bump_user_ids"])).all()
+            )
+    except Exception as e:
+        logger.error(f"Failed to invalidate caches for webhook batch {e}")
+
+
+def reap_webhook_deliveries():
+    """
+    Process any webhook deliveries that were left pending (ex: the drain
+    job was lost), and delete processed deliveries past retention.
+
+    :return:
+    """
+
+    # Process stuck deliveries
+    stuck = WebhookDelivery.query.filter(
+        WebhookDelivery.processed == False,
+        WebhookDelivery.created < datetime.now() - WEBHOOK_STUCK_AFTER,
+    ).count()
+    if stuck > 0:
+        logger.warning(f"Processing {stuck} stuck webhook deliveries")
+        process_webhook_deliveries()
+
+    # Delete old deliveries
+    WebhookDelivery.query.filter(
+        WebhookDelivery.processed == True,
+        WebhookDelivery.created < datetime.now() - WEBHOOK_RETENTION,
+    ).delete(synchronize_session=False)
+    db.session.commit()
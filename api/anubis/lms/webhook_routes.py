@@ -0,0 +1,225 @@
+"""
+Routing index for push webhooks. Matching a push to its assignment, owner
+and repo only needs a few ids, and those mappings rarely change, so they
+are kept in the shared cache:
+
+unique_code -> assignment route (versioned with the assignments and courses)
+netid       -> user id
+repo_url    -> repo route
+
+A batch of pushes is resolved with a couple of cache round trips, and only
+goes to the database for entries that are not cached yet. Unknown netids
+and repos are not cached, so new users and repos show up right away.
+Netids are never given to another user, so user routes only expire. Repo
+routes are dropped when the repo changes owner or is deleted.
+"""
+
+from typing import Any, Callable, Iterable
+
+from anubis.models import Assignment, AssignmentRepo, Course, User, db
+from anubis.utils.cache import cache, versioned_memoize
+from anubis.utils.logging import logger
+
+WEBHOOK_ROUTE_PREFIX = "webhook-route"
+WEBHOOK_ROUTE_TIMEOUT = 24 * 60 * 60
+
+
+@versioned_memoize({"assignments": None, "courses": None}, timeout=WEBHOOK_ROUTE_TIMEOUT)
+def get_assignment_routes() -> dict[str, dict[str, Any]]:
+    """
+    Get the route of every assignment by unique code. Assignment and
+    course changes bump the versions this is kept under.
+
+    :return: unique_code -> assignment route
+    """
+    return {
+        unique_code: {
+            "id":                assignment_id,
+            "unique_code":       unique_code,
+            "course_id":         course_id,
+            "github_org":        github_org,
+            "accept_late":       accept_late,
+            "autograde_enabled": autograde_enabled,
+        }
+        for assignment_id, unique_code, course_id, github_org, accept_late, autograde_enabled in (
+            db.session.query(
+                Assignment.id,
+                Assignment.unique_code,
+                Assignment.course_id,
+                Course.github_org,
+                Assignment.accept_late,
+                Assignment.autograde_enabled,
+            ).join(Course, Course.id == Assignment.course_id).all()
+        )
+    }
+
+
+def get_repo_name_route(assignment_routes: dict[str, dict[str, Any]], repo_name: str) -> dict[str, Any] | None:
+    """
+    Find the assignment route for a repo from the parts of its name.
+
+    :param assignment_routes: unique_code -> assignment route
+    :param repo_name:
+    :return:
+    """
+    return next(
+        (assignment_routes[code] for code in repo_name.split("-") if code in assignment_routes),
+        None,
+    )
+
+
+def _route_key(kind: str, value: str) -> str:
+    return f"{WEBHOOK_ROUTE_PREFIX}:{kind}:{value}"
+
+
+def _get_routes(kind: str, values: Iterable[str], load: Callable[[list[str]], dict[str, Any]]) -> dict[str, Any]:
+    """
+    Get routes of a kind from the cache in one round trip, loading (and
+    caching) the ones that are missing.
+
+    :param kind:
+    :param values:
+    :param load: loads the routes for a list of values from the database
+    :return: value -> route, for values that have one
+    """
+    values = list(set(values))
+    if len(values) == 0:
+        return {}
+
+    # Read the cached routes
+    routes = {
+        value: route
+        for value, route in zip(values, cache.get_many(*[_route_key(kind, value) for value in values]))
+        if route is not None
+    }
+
+    # Load and cache the missing routes
+    missing = [value for value in values if value not in routes]
+    if len(missing) > 0:
+        loaded = load(missing)
+        if len(loaded) > 0:
+            cache.set_many({_route_key(kind, value): route for value, route in loaded.items()}, timeout=WEBHOOK_ROUTE_TIMEOUT)
+        routes.update(loaded)
+
+    return routes
+
+
+def _forget_routes(kind: str, values: Iterable[str]):
+    """
+    Drop cached routes of a kind. The keys are deleted one at a time, as
+    cache.delete_many gives up at the first key that is not cached.
+
+    :param kind:
+    :param values:
+    :return:
+    """
+    for value in values:
+        if value:
+            cache.delete(_route_key(kind, value))
+
+
+def get_user_routes(netids: Iterable[str]) -> dict[str, str]:
+    """
+    Get user ids by netid.
+
+    :param netids:
+    :return: netid -> user id
+    """
+    return _get_routes("user", [netid for netid in netids if netid != ""], _load_user_routes)
+
+
+def _load_user_routes(netids: list[str]) -> dict[str, str]:
+    return {
+        netid: user_id
+        for user_id, netid in db.session.query(User.id, User.netid).filter(User.netid.in_(netids)).all()
+    }
+
+
+def get_repo_routes(repo_urls: Iterable[str]) -> dict[str, dict[str, Any]]:
+    """
+    Get repos by url.
+
+    :param repo_urls:
+    :return: repo_url -> repo route
+    """
+    return _get_routes("repo", repo_urls, _load_repo_routes)
+
+
+def _load_repo_routes(repo_urls: list[str]) -> dict[str, dict[str, Any]]:
+    routes = {}
+    for repo in (
+        db.session.query(AssignmentRepo.id, AssignmentRepo.repo_url, AssignmentRepo.owner_id, AssignmentRepo.assignment_id)
+        .filter(AssignmentRepo.repo_url.in_(repo_urls))
+        .all()
+    ):
+        routes.setdefault(repo.repo_url, get_repo_route(repo))
+    return routes
+
+
+def get_repo_route(repo: AssignmentRepo) -> dict[str, Any]:
+    return {"id": repo.id, "owner_id": repo.owner_id, "assignment_id": repo.assignment_id}
+
+
+def set_repo_routes(routes: dict[str, dict[str, Any]]):
+    """
+    Cache the routes of repos that were just created.
+
+    :param routes: repo_url -> repo route
+    :return:
+    """
+    if len(routes) == 0:
+        return
+    cache.set_many(
+        {_route_key("repo", repo_url): route for repo_url, route in routes.items()},
+        timeout=WEBHOOK_ROUTE_TIMEOUT,
+    )
+
+
+def forget_repo_routes(*repo_urls: str):
+    """
+    Drop the routes of repos that changed owner or were deleted.
+
+    :param repo_urls:
+    :return:
+    """
+    _forget_routes("repo", repo_urls)
+
+
+def forget_user_routes(*netids: str):
+    """
+    Drop the routes of users that were deleted.
+
+    :param netids:
+    :return:
+    """
+    _forget_routes("user", netids)
+
+
+def warm_webhook_routes(assignment_ids: list[str]):
+    """
+    Load the routes for the repos of some assignments (and their owners)
+    ahead of time, so the pushes that come in around a deadline are all
+    resolved from the cache.
+
+    :param assignment_ids:
+    :return:
+    """
+    if len(assignment_ids) == 0:
+        return
+
+    get_assignment_routes()
+
+    repos = (
+        db.session.query(AssignmentRepo.id, AssignmentRepo.repo_url, AssignmentRepo.owner_id, AssignmentRepo.assignment_id, User.netid)
+        .outerjoin(User, User.id == AssignmentRepo.owner_id)
+        .filter(AssignmentRepo.assignment_id.in_(assignment_ids))
+        .all()
+    )
+    if len(repos) == 0:
+        return
+
+    routes = {_route_key("repo", repo.repo_url): get_repo_route(repo) for repo in repos}
+    routes.update({_route_key("user", repo.netid): repo.owner_id for repo in repos if repo.netid})
+    cache.set_many(routes, timeout=WEBHOOK_ROUTE_TIMEOUT)
+
+    logger.info(f"Warmed {len(routes)} webhook routes for {len(assignment_ids)} assignments")
@@ -319,6 +319,9 @@ class AssignmentRepo(db.Model):
     collaborator_configured: bool = Column(Boolean, default=False)
     ta_configured: bool = Column(Boolean, default=False)
 
+    # Last default branch commit reconciled against github
+    head_commit: str = Column(String(length=128), nullable=True)
+
     # Timestamps
     created: datetime = Column(DateTime, default=datetime.now)
     last_updated: datetime = Column(DateTime, default=datetime.now, onupdate=datetime.now)
@@ -643,6 +646,36 @@ class SubmissionBuild(db.Model):
         }
 
 
+class BestSubmission(db.Model):
+    __tablename__ = "best_submission"
+    __table_args__ = {"mysql_charset": DB_CHARSET, "mysql_collate": DB_COLLATION}
+
+    # Foreign Keys
+    owner_id: str = Column(String(length=default_id_length), ForeignKey(User.id), primary_key=True)
+    assignment_id: str = Column(String(length=default_id_length), ForeignKey(Assignment.id), primary_key=True)
+    submission_id: str = Column(String(length=default_id_length), ForeignKey(Submission.id), nullable=True)
+
+    # Fields
+    tests_passed: int = Column(Integer, nullable=False, default=0)
+
+    # Timestamps
+    created: datetime = Column(DateTime, default=datetime.now)
+    last_updated: datetime = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+    # Relationships
+    submission = relationship(Submission)
+
+    @property
+    def data(self):
+        return {
+            "owner_id":      self.owner_id,
+            "assignment_id": self.assignment_id,
+            "submission_id": self.submission_id,
+            "tests_passed":  self.tests_passed,
+            "last_updated":  str(self.last_updated),
+        }
+
+
 class TheiaImage(db.Model):
     __tablename__ = "theia_image"
     __table_args__ = {"mysql_charset": DB_CHARSET, "mysql_collate": DB_COLLATION}
@@ -1014,3 +1047,93 @@ class ReservedIDETime(db.Model):
             'created': str(self.created),
             'last_updated': str(self.last_updated),
         }
+
+
+class UsageSubmissionHour(db.Model):
+    __tablename__ = "usage_submission_hour"
+    __table_args__ = {"mysql_charset": DB_CHARSET, "mysql_collate": DB_COLLATION}
+
+    id: str = default_id()
+
+    # Submissions per assignment per hour (rounded to the nearest
+    # hour). This is derived data maintained by the visuals job.
+    assignment_id: str = Column(String(length=default_id_length), index=True)
+    hour: datetime = Column(DateTime, index=True)
+    count: int = Column(Integer, nullable=False, default=0)
+
+
+class UsageTheiaHour(db.Model):
+    __tablename__ = "usage_theia_hour"
+    __table_args__ = {"mysql_charset": DB_CHARSET, "mysql_collate": DB_COLLATION}
+
+    id: str = default_id()
+
+    # IDE starts per assignment / image per hour (rounded to the nearest
+    # hour). This is derived data maintained by the visuals job.
+    assignment_id: str = Column(String(length=default_id_length), nullable=True, index=True)
+    image_id: str = Column(String(length=default_id_length), nullable=True)
+    playground: bool = Column(Boolean, default=False)
+    hour: datetime = Column(DateTime, index=True)
+    count: int = Column(Integer, nullable=False, default=0)
+
+
+class UsageActiveDay(db.Model):
+    __tablename__ = "usage_active_day"
+    __table_args__ = {"mysql_charset": DB_CHARSET, "mysql_collate": DB_COLLATION}
+
+    id: str = default_id()
+
+    # Users active on each day, and how they were active. This
+    # is derived data maintained by the visuals job.
+    day: datetime = Column(DateTime, index=True)
+    owner_id: str = Column(String(length=default_id_length))
+    submission: bool = Column(Boolean, default=False)
+    theia: bool = Column(Boolean, default=False)
+
+
+class WebhookDelivery(db.Model):
+    __tablename__ = "webhook_delivery"
+    __table_args__ = {"mysql_charset": DB_CHARSET, "mysql_collate": DB_COLLATION}
+
+    # Hash of the push itself (repo, ref, before and after commits). Github
+    # redeliveries, and the same push sent to the backup webhook, all
+    # hash to the same id so they are only recorded once.
+    id: str = Column(String(length=64), primary_key=True)
+
+    # Fields
+    delivery_id: str = Column(String(length=128), nullable=True)
+    repo_url: str = Column(String(length=512), nullable=False)
+    commit: str = Column(String(length=128), nullable=False)
+    _payload = deferred(Column(db.LargeBinary(length=(2 ** 24) - 1)))
+
+    # Processing
+    processed: bool = Column(Boolean, default=False, index=True)
+    status: str = Column(String(length=256), nullable=True)
+    submission_id: str = Column(String(length=default_id_length), nullable=True)
+
+    # Timestamps
+    created: datetime = Column(DateTime, default=datetime.now, index=True)
+    last_updated: datetime = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+    @hybrid_property
+    def payload(self):
+        if isinstance(self._payload, InstrumentedAttribute):
+            return self._payload
+        return gzip.decompress(self._payload)
+
+    @payload.setter
+    def payload(self, payload: bytes):
+        self._payload = gzip.compress(payload)
+
+    @property
+    def data(self):
+        return {
+            "id":            self.id,
+            "delivery_id":   self.delivery_id,
+            "repo_url":      self.repo_url,
+            "commit":        self.commit,
+            "processed":     self.processed,
+            "status":        self.status,
+            "submission_id": self.submission_id,
+            "created":       str(self.created),
+        }
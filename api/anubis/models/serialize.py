@@ -0,0 +1,332 @@
+"""
+Batched versions of the model data props. Serializing a list of models one
+at a time with .data runs a handful of queries for every row (course
+assignment counts, tests, permissions, owners, images). These functions
+prefetch everything the data props need for the whole list up front, so
+serializing a list costs a fixed number of queries.
+
+Each function gives back exactly what [model.data for model in models]
+would.
+"""
+
+import copy
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any
+
+from sqlalchemy import func
+
+from anubis.models import (
+    Assignment,
+    AssignmentTest,
+    Course,
+    InCourse,
+    ProfessorForCourse,
+    TAForCourse,
+    TheiaImage,
+    TheiaImageTag,
+    TheiaSession,
+    User,
+    db,
+)
+from anubis.utils.data import human_readable_timedelta, split_chunks
+
+# Max number of ids to put in a single IN clause
+CHUNK_SIZE = 1000
+
+
+def _query_in(query, column, values) -> list:
+    """
+    Run a query filtered to column IN values, splitting
+    the values into chunks.
+
+    :param query:
+    :param column:
+    :param values:
+    :return:
+    """
+    rows = []
+    for chunk in split_chunks(list(set(values)), CHUNK_SIZE):
+        rows.extend(query.filter(column.in_(chunk)).all())
+    return rows
+
+
+def _load_by_id(model, ids) -> dict[str, Any]:
+    ids = [_id for _id in set(ids) if _id is not None]
+    return {obj.id: obj for obj in _query_in(model.query, model.id, ids)}
+
+
+def serialize_courses(courses: list[Course]) -> list[dict[str, Any]]:
+    """
+    Batched Course.data
+
+    :param courses:
+    :return:
+    """
+    if len(courses) == 0:
+        return []
+
+    # Count the open assignments for every course in one query
+    now = datetime.now()
+    open_assignments: dict[str, int] = dict(
+        _query_in(
+            db.session.query(Assignment.course_id, func.count(Assignment.id))
+            .filter(Assignment.release_date <= now, Assignment.hidden == False)
+            .group_by(Assignment.course_id),
+            Assignment.course_id,
+            [course.id for course in courses],
+        )
+    )
+
+    return [
+        {
+            "id":                     course.id,
+            "name":                   course.name,
+            "course_code":            course.course_code,
+            "section":                course.section,
+            "professor_display_name": course.professor_display_name,
+            "total_assignments":      open_assignments.get(course.id, 0),
+            "open_assignment":        open_assignments.get(course.id, 0),
+            "join_code":              course.id[:6],
+            "beta_ui_enabled":        course.beta_ui_enabled,
+        }
+        for course in courses
+    ]
+
+
+def serialize_assignments(assignments: list[Assignment], full: bool = False) -> list[dict[str, Any]]:
+    """
+    Batched Assignment.data (or Assignment.full_data)
+
+    :param assignments:
+    :param full: include hidden tests
+    :return:
+    """
+    if len(assignments) == 0:
+        return []
+
+    # Load and serialize all the courses at once
+    courses = list(_load_by_id(Course, [assignment.course_id for assignment in assignments]).values())
+    course_data = {data["id"]: data for data in serialize_courses(courses)}
+
+    # Load the tests for every assignment at once
+    tests: dict[str, list[dict]] = defaultdict(list)
+    for test in _query_in(AssignmentTest.query, AssignmentTest.assignment_id, [a.id for a in assignments]):
+        if full or test.hidden is False:
+            tests[test.assignment_id].append(test.data)
+
+    now = datetime.now()
+    return [
+        {
+            "id":                      assignment.id,
+            "name":                    assignment.name,
+            "due_date":                str(assignment.due_date),
+            "past_due":                assignment.due_date < now,
+            "hidden":                  assignment.hidden,
+            "accept_late":             assignment.accept_late,
+            "autograde_enabled":       assignment.autograde_enabled,
+            "hide_due_date":           assignment.hide_due_date,
+            "course":                  copy.copy(course_data[assignment.course_id]),
+            "description":             assignment.description,
+            "visible_to_students":     not assignment.hidden and (now > assignment.release_date),
+            "ide_active":              assignment.due_date + timedelta(days=3 * 7) > now,
+            "tests":                   list(sorted(tests[assignment.id], key=lambda v: v["order"])),
+            # IDE
+            "ide_enabled":             assignment.ide_enabled,
+            "autosave":                assignment.theia_options.get("autosave", True),
+            "persistent_storage":      assignment.theia_options.get("persistent_storage", False),
+            # Github
+            "github_repo_required":    assignment.github_repo_required,
+            "shell_autograde_enabled": assignment.shell_autograde_enabled,
+        }
+        for assignment in assignments
+    ]
+
+
+def serialize_users(users: list[User]) -> list[dict[str, Any]]:
+    """
+    Batched User.data. This includes the permissions from
+    get_user_permissions and beta_ui_enabled from get_beta_ui_enabled.
+
+    :param users:
+    :return:
+    """
+    if len(users) == 0:
+        return []
+
+    user_ids = [user.id for user in users]
+
+    # Superusers have every permission for every course
+    super_for = None
+    if any(user.is_superuser for user in users):
+        super_for = [{"id": course_id, "name": name} for course_id, name in db.session.query(Course.id, Course.name)]
+
+    # Get the professor and ta permissions for every user at once
+    professor_for: dict[str, list[dict]] = defaultdict(list)
+    for owner_id, course_id, name in _query_in(
+        db.session.query(ProfessorForCourse.owner_id, Course.id, Course.name)
+        .join(Course, Course.id == ProfessorForCourse.course_id),
+        ProfessorForCourse.owner_id,
+        user_ids,
+    ):
+        professor_for[owner_id].append({"id": course_id, "name": name})
+    ta_for: dict[str, list[dict]] = defaultdict(list)
+    for owner_id, course_id, name in _query_in(
+        db.session.query(TAForCourse.owner_id, Course.id, Course.name)
+        .join(Course, Course.id == TAForCourse.course_id),
+        TAForCourse.owner_id,
+        user_ids,
+    ):
+        ta_for[owner_id].append({"id": course_id, "name": name})
+
+    # The beta ui is enabled for a user if any of the courses they can
+    # see has it enabled. Archived courses are only seen by their admins.
+    beta_courses: dict[str, str] = dict(
+        db.session.query(Course.id, Course.name).filter(Course.beta_ui_enabled == True).all()
+    )
+    beta_user_ids: set[str] = set()
+    if len(beta_courses) > 0:
+        for owner_id, course_id in _query_in(
+            db.session.query(InCourse.owner_id, InCourse.course_id)
+            .filter(InCourse.course_id.in_(list(beta_courses.keys()))),
+            InCourse.owner_id,
+            user_ids,
+        ):
+            admin_course_ids = {c["id"] for c in professor_for[owner_id] + ta_for[owner_id]}
+            if "Archive" not in beta_courses[course_id] or course_id in admin_course_ids:
+                beta_user_ids.add(owner_id)
+
+    response = []
+    for user in users:
+        if user.is_superuser:
+            permissions = {
+                "is_superuser":  True,
+                "is_admin":      True,
+                "professor_for": copy.deepcopy(super_for),
+                "ta_for":        copy.deepcopy(super_for),
+                "admin_for":     copy.deepcopy(super_for),
+            }
+            beta_ui_enabled = len(beta_courses) > 0
+        else:
+            user_ta_for = ta_for[user.id] + professor_for[user.id]
+            permissions = {
+                "is_superuser":  False,
+                "is_admin":      len(user_ta_for) > 0,
+                "professor_for": professor_for[user.id],
+                "ta_for":        user_ta_for,
+                "admin_for":     copy.deepcopy(user_ta_for),
+            }
+            beta_ui_enabled = user.id in beta_user_ids
+
+        response.append({
+            "id":                     user.id,
+            "netid":                  user.netid,
+            "github_username":        user.github_username,
+            "name":                   user.name,
+            "beta_ui_enabled":        beta_ui_enabled,
+            "deadline_email_enabled": user.deadline_email_enabled,
+            "release_email_enabled":  user.release_email_enabled,
+            "created":                str(user.created),
+            **permissions,
+        })
+
+    return response
+
+
+def serialize_theia_images(images: list[TheiaImage]) -> list[dict[str, Any]]:
+    """
+    Batched TheiaImage.data
+
+    :param images:
+    :return:
+    """
+    if len(images) == 0:
+        return []
+
+    # Load the tags for every image at once
+    tags: dict[str, list[dict]] = defaultdict(list)
+    for tag in _query_in(TheiaImageTag.query, TheiaImageTag.image_id, [image.id for image in images]):
+        tags[tag.image_id].append(tag.data)
+
+    # Load the (deferred) descriptions for every image at once
+    descriptions: dict[str, str] = dict(
+        _query_in(db.session.query(TheiaImage.id, TheiaImage.description), TheiaImage.id, [i.id for i in images])
+    )
+
+    return [
+        {
+            "id":          image.id,
+            "image":       image.image,
+            "title":       image.title,
+            "description": descriptions.get(image.id, None),
+            "icon":        image.icon,
+            "public":      image.public,
+            "default_tag": image.default_tag,
+            "webtop":      image.webtop,
+            "tags":        list(sorted(tags[image.id], key=lambda tag_data: tag_data['title'])),
+        }
+        for image in images
+    ]
+
+
+def serialize_theia_sessions(theia_sessions: list[TheiaSession]) -> list[dict[str, Any]]:
+    """
+    Batched TheiaSession.data. The redirect tokens are created without
+    looking up the owners again.
+
+    :param theia_sessions:
+    :return:
+    """
+    from anubis.ide.redirect import theia_redirect_url
+    from anubis.utils.auth.token import get_token_exp_kwargs
+
+    if len(theia_sessions) == 0:
+        return []
+
+    # Load everything the sessions reference at once
+    owners = _load_by_id(User, [s.owner_id for s in theia_sessions])
+    assignments = _load_by_id(Assignment, [s.assignment_id for s in theia_sessions])
+    courses = _load_by_id(Course, [a.course_id for a in assignments.values()])
+    image_tags = _load_by_id(TheiaImageTag, [s.image_tag_id for s in theia_sessions])
+    images = {
+        data["id"]: data
+        for data in serialize_theia_images(
+            list(_load_by_id(TheiaImage, [s.image_id for s in theia_sessions]).values())
+        )
+    }
+
+    exp_kwargs = get_token_exp_kwargs()
+    now = datetime.now()
+
+    response = []
+    for theia_session in theia_sessions:
+        owner = owners[theia_session.owner_id]
+        assignment = assignments.get(theia_session.assignment_id, None)
+        response.append({
+            "id":                 theia_session.id,
+            "assignment_id":      theia_session.assignment_id,
+            "assignment_name":    assignment.name if assignment is not None else None,
+            "course_code":        courses[assignment.course_id].course_code if assignment is not None else None,
+            "playground":         theia_session.playground,
+            "netid":              owner.netid,
+            "name":               owner.name,
+            "repo_url":           theia_session.repo_url,
+            "docker":             theia_session.docker,
+            "redirect_url":       theia_redirect_url(
+                theia_session.id, owner.netid, verify_user=False, exp_kwargs=exp_kwargs
+            ),
+            "active":             theia_session.active,
+            "state":              theia_session.state,
+            "created":            str(theia_session.created),
+            "created_delta":      human_readable_timedelta(now - theia_session.created),
+            "ended":              str(theia_session.ended),
+            "last_proxy":         str(theia_session.last_proxy),
+            "last_proxy_delta":   human_readable_timedelta(now - theia_session.last_proxy),
+            "last_updated":       str(theia_session.last_updated),
+            "autosave":           theia_session.autosave,
+            "persistent_storage": theia_session.persistent_storage,
+            "image":              copy.deepcopy(images[theia_session.image_id]) if theia_session.image_id else None,
+            "image_tag":          image_tags[theia_session.image_tag_id].data if theia_session.image_tag_id else None,
+        })
+
+    return response
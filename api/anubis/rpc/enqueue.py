@@ -4,6 +4,7 @@ redis queue. The rq library requires special namespacing in order to work,
 so these functions must reside in a separate file.
 """
 
+import time
 import traceback
 
 from redis import Redis
@@ -12,19 +13,35 @@ from rq import Queue
 from anubis.env import env
 from anubis.github.repos import create_assignment_github_repo
 from anubis.ide.initialize import initialize_theia_session
+from anubis.k8s.pipeline.admission import (
+    PIPELINE_PRIORITY_REGRADE,
+    PIPELINE_PRIORITY_STUDENT,
+    admission_enabled,
+    dispatch_pipelines,
+    park_pipeline,
+    park_pipelines,
+)
 from anubis.k8s.pipeline.create import create_submission_pipeline
 from anubis.k8s.pipeline.reap import reap_pipeline_jobs
 from anubis.k8s.pvc.reap import reap_user_pvc
 from anubis.k8s.theia.reap import reap_stale_theia_sessions
 from anubis.k8s.theia.reap import reap_theia_session_by_id
 from anubis.lms.assignments import make_shared_assignment
-from anubis.lms.autograde import bulk_autograde
+from anubis.lms.autograde import bulk_autograde, recalculate_best_submissions
 from anubis.lms.questions import assign_missing_questions
 from anubis.lms.regrade import bulk_regrade_assignment
 from anubis.lms.submissions import bulk_regrade_submissions
-from anubis.utils.data import with_context
+from anubis.lms.webhook import WEBHOOK_DRAIN_SCHEDULED_KEY, process_webhook_deliveries
+from anubis.rpc.metrics import record_enqueue_latency
+from anubis.utils.data import split_chunks, with_context
+from anubis.utils.redis import redis
 from anubis.utils.testing.seed import seed
 
+# rq queues by name. These all share the connection
+# pool of the module level redis client.
+_queues: dict[str, Queue] = {}
+_connection: Redis | None = None
+
 
 @with_context
 def _run_rpc_function(func, *args):
@@ -55,17 +72,94 @@ def rpc_enqueue(func, queue=None, args=None):
             print(traceback.format_exc())
             return
 
-    with Redis(host=env.CACHE_REDIS_HOST, password=env.CACHE_REDIS_PASSWORD) as conn:
-        q = Queue(name=queue, connection=conn)
-        q.enqueue(_run_rpc_function, func, *args)
-        conn.close()
+    start = time.time()
+    _get_queue(queue).enqueue(_run_rpc_function, func, *args)
+    record_enqueue_latency(queue, 1, time.time() - start)
+
+
+def rpc_enqueue_many(func, args_list: list[tuple], queue=None, chunk_size: int = 500):
+    """
+    Enqueues a job for each set of arguments on the redis cache. The
+    jobs are sent in pipelined batches, instead of a round trip each.
+
+    :func callable: any callable object
+    :args_list list: ordered arguments for each job
+    """
+
+    # set defaults
+    if queue is None:
+        queue = "default"
+    if len(args_list) == 0:
+        return
+
+    # If we are running in mindebug, there is
+    # no rq cluster to send things off to.
+    if env.MINDEBUG:
+        for args in args_list:
+            rpc_enqueue(func, queue=queue, args=args)
+        return
+
+    q = _get_queue(queue)
+    start = time.time()
+    for chunk in split_chunks(list(args_list), chunk_size):
+        q.enqueue_many([Queue.prepare_data(_run_rpc_function, args=(func, *args)) for args in chunk])
+    record_enqueue_latency(queue, len(args_list), time.time() - start)
+
+
+def _get_queue(name: str) -> Queue:
+    global _connection
+
+    if name not in _queues:
+        # Fall back to a dedicated client when redis is not the flask cache
+        if _connection is None:
+            _connection = redis or Redis(host=env.CACHE_REDIS_HOST, password=env.CACHE_REDIS_PASSWORD)
+        _queues[name] = Queue(name=name, connection=_connection)
+    return _queues[name]
 
 
-def enqueue_autograde_pipeline(*args, queue: str = "regrade"):
+def enqueue_autograde_pipeline(submission_id: str, queue: str = "regrade", priority: int = PIPELINE_PRIORITY_STUDENT):
+    """
+    Park a submission to wait for a pipeline slot, then admit as many
+    parked submissions as there are free slots. Student pushes should
+    use the student priority so they are admitted ahead of regrades.
+    """
+
+    # Without redis (mindebug) there is nothing to schedule against
+    if env.MINDEBUG or not admission_enabled():
+        return enqueue_create_submission_pipeline(submission_id, queue=queue)
+
+    park_pipeline(submission_id, priority=priority)
+    dispatch_pipelines(queue=queue)
+
+
+def enqueue_autograde_pipelines(
+    submission_ids: list[str],
+    queue: str = "regrade",
+    priority: int = PIPELINE_PRIORITY_REGRADE,
+):
+    """
+    Park many submissions to wait for pipeline slots in one
+    round trip to redis, then admit as many as there are free slots.
+    """
+
+    # Without redis (mindebug) there is nothing to schedule against
+    if env.MINDEBUG or not admission_enabled():
+        return enqueue_create_submission_pipelines(submission_ids, queue=queue)
+
+    park_pipelines(submission_ids, priority=priority)
+    dispatch_pipelines(queue=queue)
+
+
+def enqueue_create_submission_pipeline(*args, queue: str = "regrade"):
     """Enqueues a test job"""
     rpc_enqueue(create_submission_pipeline, queue=queue, args=args)
 
 
+def enqueue_create_submission_pipelines(submission_ids: list[str], queue: str = "regrade"):
+    """Enqueues test jobs for many submissions at once"""
+    rpc_enqueue_many(create_submission_pipeline, [(submission_id,) for submission_id in submission_ids], queue=queue)
+
+
 def enqueue_ide_initialize(*args):
     """Enqueue an ide initialization job"""
     rpc_enqueue(initialize_theia_session, queue="theia", args=args)
@@ -116,6 +210,11 @@ def enqueue_bulk_autograde(*args):
     rpc_enqueue(bulk_autograde, queue="regrade", args=args)
 
 
+def enqueue_recalculate_best_submissions(*args):
+    """Enqueue rebuild of best submission records for an assignment"""
+    rpc_enqueue(recalculate_best_submissions, queue="regrade", args=args)
+
+
 def enqueue_bulk_regrade_assignment(*args):
     """Enqueue bulk autograde of assignment"""
     rpc_enqueue(bulk_regrade_assignment, queue="regrade", args=args)
@@ -124,3 +223,13 @@ def enqueue_bulk_regrade_assignment(*args):
 def enqueue_bulk_regrade_submissions(*args):
     """Enqueue bulk autograde of assignment"""
     rpc_enqueue(bulk_regrade_submissions, queue="regrade", args=args)
+
+
+def enqueue_webhook_deliveries():
+    """Enqueue a drain of the pending webhook deliveries, unless one is already waiting"""
+    if not env.MINDEBUG and redis is not None:
+        # The drain clears the key when it starts, so a delivery recorded
+        # after that enqueues the next drain. The expiry covers lost jobs.
+        if not redis.set(WEBHOOK_DRAIN_SCHEDULED_KEY, 1, nx=True, ex=60):
+            return
+    rpc_enqueue(process_webhook_deliveries, queue="default")
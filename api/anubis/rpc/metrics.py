@@ -0,0 +1,122 @@
+"""
+Per queue enqueue latency metrics for the rpc queues. Each process keeps
+running totals in memory, and adds them into a shared redis hash at most
+once every METRICS_FLUSH_SECONDS so that recording a metric does not cost
+an extra round trip on every enqueue. Whatever is left is flushed when
+the process exits (and at the end of each rq job, as work horses exit
+without running atexit handlers).
+"""
+
+import atexit
+import threading
+import time
+import traceback
+
+from anubis.utils.redis import redis
+
+RPC_ENQUEUE_METRICS_KEY = "rpc-enqueue-metrics"
+METRICS_FLUSH_SECONDS = 1.0
+
+_lock = threading.Lock()
+_last_flush: float = 0.0
+
+# queue name -> [enqueue calls, jobs enqueued, seconds spent enqueueing]
+_pending: dict[str, list] = {}
+
+
+def record_enqueue_latency(queue: str, jobs: int, seconds: float):
+    """
+    Record a single enqueue call for a queue.
+
+    :param queue: name of the queue
+    :param jobs: number of jobs enqueued in the call
+    :param seconds: time the call took
+    :return:
+    """
+    global _last_flush
+
+    with _lock:
+        totals = _pending.setdefault(queue, [0, 0, 0.0])
+        totals[0] += 1
+        totals[1] += jobs
+        totals[2] += seconds
+
+        now = time.time()
+        if now - _last_flush < METRICS_FLUSH_SECONDS:
+            return
+        _last_flush = now
+
+        pending = dict(_pending)
+        _pending.clear()
+
+    flush_enqueue_metrics(pending)
+
+
+def flush_pending_enqueue_metrics():
+    """
+    Flush all the totals this process has not flushed yet.
+
+    :return:
+    """
+    with _lock:
+        pending = dict(_pending)
+        _pending.clear()
+
+    flush_enqueue_metrics(pending)
+
+
+def flush_enqueue_metrics(pending: dict[str, list]):
+    """
+    Add the pending totals into the shared redis hash. If redis can not
+    be reached, the totals are kept to go out with the next flush.
+
+    :param pending:
+    :return:
+    """
+    if redis is None or len(pending) == 0:
+        return
+
+    try:
+        pipe = redis.pipeline(transaction=False)
+        for queue, (calls, jobs, seconds) in pending.items():
+            pipe.hincrby(RPC_ENQUEUE_METRICS_KEY, f"{queue}:calls", calls)
+            pipe.hincrby(RPC_ENQUEUE_METRICS_KEY, f"{queue}:jobs", jobs)
+            pipe.hincrbyfloat(RPC_ENQUEUE_METRICS_KEY, f"{queue}:seconds", seconds)
+        pipe.execute()
+    except Exception:
+        # Metrics should never break an enqueue
+        print(traceback.format_exc())
+
+        # Merge the totals back in
+        with _lock:
+            for queue, (calls, jobs, seconds) in pending.items():
+                totals = _pending.setdefault(queue, [0, 0, 0.0])
+                totals[0] += calls
+                totals[1] += jobs
+                totals[2] += seconds
+
+
+atexit.register(flush_pending_enqueue_metrics)
+
+
+def get_rpc_enqueue_metrics() -> dict[str, dict]:
+    """
+    Get the enqueue totals and average latency for each queue.
+
+    :return:
+    """
+    if redis is None:
+        return {}
+
+    metrics: dict[str, dict] = {}
+    for field, value in redis.hgetall(RPC_ENQUEUE_METRICS_KEY).items():
+        queue, name = field.decode().rsplit(":", 1)
+        metrics.setdefault(queue, {"calls": 0, "jobs": 0, "seconds": 0.0})
+        metrics[queue][name] = float(value) if name == "seconds" else int(value)
+
+    for queue_metrics in metrics.values():
+        calls, jobs = queue_metrics["calls"], queue_metrics["jobs"]
+        queue_metrics["avg_call_ms"] = queue_metrics["seconds"] * 1000 / calls if calls else 0.0
+        queue_metrics["avg_job_ms"] = queue_metrics["seconds"] * 1000 / jobs if jobs else 0.0
+
+    return metrics
@@ -0,0 +1,44 @@
+"""
+Custom rq worker classes for the anubis rpc workers. These are
+selected with the --worker-class option in rq-worker.sh.
+"""
+
+from rq import Worker
+
+from anubis.rpc.metrics import flush_pending_enqueue_metrics
+from anubis.utils.data import get_job_app
+
+
+class AnubisWorker(Worker):
+    """
+    rq forks a fresh work horse process for each job. Building the job
+    app in the parent before the work loop starts means every work horse
+    inherits an already constructed app, instead of each job building
+    its own through with_context.
+    """
+
+    def work(self, *args, **kwargs):
+        get_job_app()
+
+        # The cluster state informers are not started here. Work horses
+        # would only get a copy of them that nothing keeps current, so
+        # jobs list from the kube api instead.
+
+        return super().work(*args, **kwargs)
+
+    def main_work_horse(self, *args, **kwargs):
+        from anubis.models import db
+
+        # Never share pooled database connections across the fork
+        with get_job_app().app_context():
+            db.engine.dispose(close=False)
+
+        return super().main_work_horse(*args, **kwargs)
+
+    def perform_job(self, *args, **kwargs):
+        try:
+            return super().perform_job(*args, **kwargs)
+        finally:
+            # Work horses exit with os._exit, which skips atexit, so
+            # flush the metrics recorded by the job here.
+            flush_pending_enqueue_metrics()
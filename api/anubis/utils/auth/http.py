@@ -1,6 +1,6 @@
 from functools import wraps
 
-from anubis.models import ProfessorForCourse, TAForCourse
+from anubis.utils.auth.permissions import get_course_permissions
 from anubis.utils.auth.user import get_current_user
 from anubis.utils.data import is_debug
 from anubis.utils.exceptions import AssertError, AuthenticationError
@@ -71,13 +71,8 @@ def require_admin(unless_debug=False):
             if user is None:
                 raise AuthenticationError("Request is anonymous")
 
-            if user.is_superuser:
-                return func(*args, **kwargs)
-
-            ta = TAForCourse.query.filter(TAForCourse.owner_id == user.id).first()
-            prof = ProfessorForCourse.query.filter(ProfessorForCourse.owner_id == user.id).first()
-
-            if ta is None and prof is None:
+            # Check the (request cached) permissions of the user
+            if not get_course_permissions(user).is_admin:
                 raise AuthenticationError("User is not ta or professor")
 
             # Pass the parameters to the
@@ -0,0 +1,187 @@
+"""
+Course permissions for a user, resolved once per request. Every TA,
+professor and superuser check (is_course_admin, require_admin,
+get_user_permissions, ...) consults the same CoursePermissions object
+instead of querying the TAForCourse and ProfessorForCourse tables again.
+
+The memberships themselves are loaded in a single query, and kept in the
+shared cache for a short time under the user version namespace. Adding or
+removing a TA, professor or superuser bumps that namespace.
+"""
+
+import copy
+from typing import Any
+
+from flask import g, has_app_context
+from sqlalchemy import literal, true
+
+from anubis.models import Course, ProfessorForCourse, TAForCourse, User, db
+from anubis.utils.auth.user import current_user
+from anubis.utils.cache import versioned_memoize
+from anubis.utils.data import is_debug
+
+
+# Role in the membership query -> CoursePermissions field
+_ROLE_FIELDS = {
+    "ta":        "ta_for",
+    "professor": "professor_for",
+    "superuser": "super_for",
+}
+
+
+class CoursePermissions(object):
+    """
+    TA, professor and superuser memberships for a single user.
+    """
+
+    def __init__(
+        self,
+        user_id: str,
+        is_superuser: bool = False,
+        professor_for: list[dict[str, str]] = None,
+        ta_for: list[dict[str, str]] = None,
+        super_for: list[dict[str, str]] = None,
+    ):
+        self.user_id = user_id
+        self.is_superuser = is_superuser
+        self.professor_for = professor_for or []
+        self.ta_for = ta_for or []
+        self.super_for = super_for or []
+
+        self.professor_course_ids: set[str] = {course["id"] for course in self.professor_for}
+        self.admin_course_ids: set[str] = self.professor_course_ids | {course["id"] for course in self.ta_for}
+
+    @property
+    def is_admin(self) -> bool:
+        """
+        If the user is an admin (ta, professor or superuser) for any course
+
+        :return:
+        """
+        return self.is_superuser or len(self.admin_course_ids) > 0
+
+    def is_course_admin(self, course_id: str) -> bool:
+        """
+        If the user is a ta, professor or superuser for the course
+
+        :param course_id:
+        :return:
+        """
+        return self.is_superuser or course_id in self.admin_course_ids
+
+    def is_course_superuser(self, course_id: str) -> bool:
+        """
+        If the user is a professor or superuser for the course
+
+        :param course_id:
+        :return:
+        """
+        return self.is_superuser or course_id in self.professor_course_ids
+
+    @property
+    def data(self) -> dict[str, Any]:
+        # If the user is superuser, they get all the permissions for every course
+        if self.is_superuser:
+            return {
+                "is_superuser":  True,
+                "is_admin":      True,
+                "professor_for": copy.deepcopy(self.super_for),
+                "ta_for":        copy.deepcopy(self.super_for),
+                "admin_for":     copy.deepcopy(self.super_for),
+            }
+
+        # A professor has the same permissions as a ta do
+        ta_for = copy.deepcopy(self.ta_for + self.professor_for)
+        return {
+            "is_superuser":  False,
+            "is_admin":      len(ta_for) > 0,
+            "professor_for": copy.deepcopy(self.professor_for),
+            "ta_for":        ta_for,
+            "admin_for":     copy.deepcopy(ta_for),
+        }
+
+
+@versioned_memoize({"user": "user_id", "courses": None}, timeout=60, unless=is_debug)
+def load_user_course_permissions(user_id: str) -> dict[str, Any]:
+    """
+    Load all the ta, professor and superuser memberships for a user
+    in one query. Superusers get a row for every course.
+
+    * Cached until the user or courses change *
+
+    :param user_id:
+    :return:
+    """
+    ta_query = (
+        db.session.query(literal("ta").label("role"), Course.id, Course.name)
+        .join(TAForCourse, TAForCourse.course_id == Course.id)
+        .filter(TAForCourse.owner_id == user_id)
+    )
+    professor_query = (
+        db.session.query(literal("professor").label("role"), Course.id, Course.name)
+        .join(ProfessorForCourse, ProfessorForCourse.course_id == Course.id)
+        .filter(ProfessorForCourse.owner_id == user_id)
+    )
+
+    # Outer joined so that a superuser still gets a
+    # row when there are no courses.
+    superuser_query = (
+        db.session.query(literal("superuser").label("role"), Course.id, Course.name)
+        .select_from(User)
+        .outerjoin(Course, true())
+        .filter(User.id == user_id, User.is_superuser == True)
+    )
+
+    permissions = {"is_superuser": False, "professor_for": [], "ta_for": [], "super_for": []}
+    for role, course_id, course_name in ta_query.union_all(professor_query, superuser_query).all():
+        if role == "superuser":
+            permissions["is_superuser"] = True
+            if course_id is None:
+                continue
+        permissions[_ROLE_FIELDS[role]].append({"id": course_id, "name": course_name})
+
+    return permissions
+
+
+def get_course_permissions(user: User | None = None, user_id: str = None) -> CoursePermissions:
+    """
+    Get the course permissions for a user (the current user by default).
+    They are only resolved once per request.
+
+    :param user:
+    :param user_id:
+    :return:
+    """
+    if user_id is None:
+        user_id = (user if user is not None else current_user).id
+
+    # Check for permissions already resolved in this request
+    resolved: dict[str, CoursePermissions] | None = None
+    if has_app_context():
+        resolved = g.setdefault("course_permissions", {})
+        if user_id in resolved:
+            return resolved[user_id]
+
+    permissions = CoursePermissions(user_id, **load_user_course_permissions(user_id))
+
+    if resolved is not None:
+        resolved[user_id] = permissions
+
+    return permissions
+
+
+def clear_course_permissions(user_id: str = None):
+    """
+    Forget the permissions resolved in this request, after
+    they were changed.
+
+    :param user_id: only forget this user
+    :return:
+    """
+    if not has_app_context() or "course_permissions" not in g:
+        return
+
+    if user_id is None:
+        g.course_permissions.clear()
+    else:
+        g.course_permissions.pop(user_id, None)
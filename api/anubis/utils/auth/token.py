@@ -1,3 +1,4 @@
+import time
 from datetime import datetime, timedelta
 from typing import Union
 
@@ -8,6 +9,11 @@ from anubis.env import env
 from anubis.models import User
 from anubis.utils.config import get_config_int
 
+TOKEN_EXP_CONFIG_SECONDS = 60
+
+# (cached until timestamp, AUTH_TOKEN_EXP_HOURS)
+_token_exp_hours: tuple[float, int] = (0.0, 6)
+
 
 def get_token() -> Union[str, None]:
     """
@@ -38,24 +44,56 @@ def create_token(netid: str, exp_kwargs=None, **extras) -> Union[str, None]:
     :return: token string or None (if user not found)
     """
 
-    # Get user
-    user: User = User.query.filter_by(netid=netid).first()
+    from anubis.utils.auth.user import get_user_by_netid
 
-    # Get setting for number of hours that tokens should last.
-    token_exp_hours = get_config_int("AUTH_TOKEN_EXP_HOURS", default=6)
-
-    # set the expire kwargs
-    if exp_kwargs is None:
-        exp_kwargs = {"hours": token_exp_hours}
+    # Get user (recently loaded users are cached)
+    user: User = get_user_by_netid(netid)
 
     # Verify user exists
     if user is None:
         return None
 
     # Create new token
+    return encode_token(user.netid, exp_kwargs, **extras)
+
+
+def get_token_exp_kwargs() -> dict:
+    """
+    Get the default expire kwargs for new tokens.
+
+    :return:
+    """
+
+    global _token_exp_hours
+
+    # Get setting for number of hours that tokens should last. This
+    # is read for every token, so it is kept in process for a bit.
+    cached_until, token_exp_hours = _token_exp_hours
+    if cached_until < time.time():
+        token_exp_hours = get_config_int("AUTH_TOKEN_EXP_HOURS", default=6)
+        _token_exp_hours = (time.time() + TOKEN_EXP_CONFIG_SECONDS, token_exp_hours)
+
+    return {"hours": token_exp_hours}
+
+
+def encode_token(netid: str, exp_kwargs=None, **extras) -> str:
+    """
+    Encode a token for a netid without looking up the user. Only
+    use this when the user is already known to exist (ex: when
+    serializing rows that reference the user).
+
+    :param netid:
+    :param exp_kwargs:
+    :return: token string
+    """
+
+    # set the expire kwargs
+    if exp_kwargs is None:
+        exp_kwargs = get_token_exp_kwargs()
+
     return jwt.encode(
         {
-            "netid": user.netid,
+            "netid": netid,
             "exp": datetime.utcnow() + timedelta(**exp_kwargs),
             **extras,
         },
@@ -1,31 +1,55 @@
+import time
 import traceback
 from datetime import datetime
 from typing import Any, Callable
 
 import jwt
 from flask import g
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
 from werkzeug.local import LocalProxy
 
 from anubis.env import env
-from anubis.models import User, Course
+from anubis.models import User, Course, db
 from anubis.utils.auth.token import get_token
 from anubis.utils.data import req_assert, human_readable_timedelta
 from anubis.utils.logging import logger
+from anubis.utils.lru import LRUCache
 
+# Verified tokens and user rows are kept in process for a short time, so
+# that authenticating a request does not need to decode the jwt and query
+# the user every time. User writes that go through bump_user_cache_versions
+# forget the users here. Other api processes pick up a change within
+# USER_CACHE_SECONDS.
+TOKEN_CACHE_SIZE = 4096
+USER_CACHE_SIZE = 4096
+USER_CACHE_SECONDS = 30
 
-def get_current_user() -> User | None:
+
+# token -> (netid, exp timestamp)
+_token_cache = LRUCache(TOKEN_CACHE_SIZE)
+
+# netid -> (cached until timestamp, user column values)
+_user_cache = LRUCache(USER_CACHE_SIZE)
+
+_user_columns: list[str] = [column.key for column in inspect(User).column_attrs]
+
+
+def verify_token(token: str) -> str | None:
     """
-    Load current user based on the token
+    Verify a jwt, and get the netid from it. Verified tokens
+    are remembered until they expire.
 
-    :return: User or None
+    :param token:
+    :return: netid or None
     """
-    if g.get("user", default=None) is not None:
-        return g.user
 
-    # Attempt to get the token from the request
-    token = get_token()
-    if token is None:
-        return None
+    # Check for the token being verified already
+    cached = _token_cache.get(token)
+    if cached is not None:
+        netid, exp = cached
+        if exp is None or exp > time.time():
+            return netid
 
     # Try to decode the jwt
     try:
@@ -38,9 +62,73 @@ def get_current_user() -> User | None:
     if "netid" not in decoded:
         return None
 
+    _token_cache.set(token, (decoded["netid"], decoded.get("exp", None)))
+    return decoded["netid"]
+
+
+def get_user_by_netid(netid: str) -> User | None:
+    """
+    Get a user by netid. A recently loaded user is rebuilt from its
+    cached column values and attached to the session without a query,
+    so it can be used (and modified) like any other loaded user.
+
+    :param netid:
+    :return:
+    """
+
+    # Check for a recent copy of the user
+    cached = _user_cache.get(netid)
+    if cached is not None:
+        cached_until, values = cached
+        if cached_until > time.time():
+            user = User(**values)
+            make_transient_to_detached(user)
+            return db.session.merge(user, load=False)
+
+    # Load the user from the database
+    user: User | None = User.query.filter_by(netid=netid).first()
+
+    # Remember the user. Unknown netids are not remembered
+    # so that new users show up right away.
+    if user is not None:
+        values = {column: getattr(user, column) for column in _user_columns}
+        _user_cache.set(netid, (time.time() + USER_CACHE_SECONDS, values))
+
+    return user
+
+
+def forget_cached_users(*users: User):
+    """
+    Drop users from the in process user cache after they change.
+
+    :param users:
+    :return:
+    """
+    user_ids = {user.id for user in users}
+    _user_cache.pop_where(lambda cached: cached[1]["id"] in user_ids)
+
+
+def get_current_user() -> User | None:
+    """
+    Load current user based on the token
+
+    :return: User or None
+    """
+    if g.get("user", default=None) is not None:
+        return g.user
+
+    # Attempt to get the token from the request
+    token = get_token()
+    if token is None:
+        return None
+
+    # Verify the jwt, and get the netid from it
+    netid = verify_token(token)
+    if netid is None:
+        return None
+
     # Get the user from the decoded jwt
-    netid = decoded["netid"]
-    user = User.query.filter_by(netid=netid).first()
+    user = get_user_by_netid(netid)
 
     if user is not None:
         # Check if the user is disabled
@@ -55,6 +143,21 @@ def get_current_user() -> User | None:
     return user
 
 
+def get_current_user_for_update() -> User | None:
+    """
+    Get the current user with its values reloaded from the database. The
+    current user may have been rebuilt from the in process cache, so
+    anything that changes the user should start from this rather than a
+    possibly stale copy.
+
+    :return: User or None
+    """
+    user = get_current_user()
+    if user is not None:
+        db.session.refresh(user)
+    return user
+
+
 def verify_users(netids: list[str]) -> tuple[list[User], set[str]]:
     """
     Takes a list of netids, and returns a list of the users that
@@ -1,7 +1,31 @@
+import hashlib
+import inspect
+import threading
+import time
+import traceback
+from functools import wraps
+from typing import Any, Callable
+
 from flask_caching import Cache
 
+from anubis.utils.redis import redis
+
 cache = Cache()
 
+CACHE_VERSION_PREFIX = "cache-version"
+CACHE_STATS_KEY = "cache-stats"
+CACHE_STATS_FLUSH_SECONDS = 1.0
+
+# namespace -> names of the versioned functions that depend on it
+_namespace_functions: dict[str, list[str]] = {}
+
+# function name -> [hits, misses, invalidations] not yet flushed to redis
+_stats_lock = threading.Lock()
+_stats_last_flush: float = 0.0
+_pending_stats: dict[str, list[int]] = {}
+
+_STAT_NAMES = ("hits", "misses", "invalidations")
+
 
 @cache.memoize(timeout=1)
 def cache_health():
@@ -13,3 +37,220 @@ def cache_health():
     :return:
     """
     return None
+
+
+def _cache_version_key(namespace: str, value: Any = None) -> str:
+    if value is None:
+        return f"{CACHE_VERSION_PREFIX}:{namespace}"
+    return f"{CACHE_VERSION_PREFIX}:{namespace}:{value}"
+
+
+def _record_cache_stat(function_name: str, index: int, count: int = 1):
+    global _stats_last_flush
+
+    with _stats_lock:
+        _pending_stats.setdefault(function_name, [0, 0, 0])[index] += count
+
+        # Without redis the counts just stay in this process
+        now = time.time()
+        if redis is None or now - _stats_last_flush < CACHE_STATS_FLUSH_SECONDS:
+            return
+        _stats_last_flush = now
+
+        pending = dict(_pending_stats)
+        _pending_stats.clear()
+
+    flush_cache_stats(pending)
+
+
+def flush_cache_stats(pending: dict[str, list[int]]):
+    """
+    Add pending hit, miss and invalidation counts into the
+    shared redis hash.
+
+    :param pending:
+    :return:
+    """
+    if redis is None or len(pending) == 0:
+        return
+
+    try:
+        pipe = redis.pipeline(transaction=False)
+        for function_name, counts in pending.items():
+            for stat, count in zip(_STAT_NAMES, counts):
+                if count:
+                    pipe.hincrby(CACHE_STATS_KEY, f"{function_name}:{stat}", count)
+        pipe.execute()
+    except Exception:
+        # Stats should never break a request
+        print(traceback.format_exc())
+
+
+def get_cache_stats() -> dict[str, dict[str, int]]:
+    """
+    Get the hit, miss and invalidation counts for each versioned function,
+    along with its hit ratio. Without redis, only the counts from this
+    process are available.
+
+    :return:
+    """
+    stats: dict[str, dict[str, Any]] = {}
+
+    if redis is not None:
+        for field, value in redis.hgetall(CACHE_STATS_KEY).items():
+            function_name, stat = field.decode().rsplit(":", 1)
+            stats.setdefault(function_name, dict.fromkeys(_STAT_NAMES, 0))[stat] = int(value)
+    else:
+        with _stats_lock:
+            for function_name, counts in _pending_stats.items():
+                stats[function_name] = dict(zip(_STAT_NAMES, counts))
+
+    for function_stats in stats.values():
+        lookups = function_stats["hits"] + function_stats["misses"]
+        function_stats["hit_ratio"] = function_stats["hits"] / lookups if lookups else 0.0
+
+    return stats
+
+
+def get_cache_versions(keys: list[str]) -> list[Any]:
+    """
+    Read the current generation of each version key. Keys that do not
+    exist yet (or were evicted) are started at the current time in
+    nanoseconds so that they never repeat an earlier generation.
+
+    :param keys:
+    :return:
+    """
+    versions = list(cache.get_many(*keys))
+    for index, (key, version) in enumerate(zip(keys, versions)):
+        if version is None:
+            version = time.time_ns()
+            cache.add(key, version, timeout=0)
+            versions[index] = version
+    return versions
+
+
+def bump_cache_version(namespace: str, *values: Any):
+    """
+    Move the generation of a namespace forward, invalidating everything
+    memoized by versioned_memoize under it. Specify values to only bump
+    those entries of the namespace (ex: bump_cache_version("user", user.id)).
+    With no values the namespace wide version is bumped.
+
+    :param namespace: version namespace (user, course, assignment, ...)
+    :param values: ids within the namespace to bump
+    :return:
+    """
+    if len(values) == 0:
+        keys = [_cache_version_key(namespace)]
+    else:
+        keys = [_cache_version_key(namespace, value) for value in values if value is not None]
+    if len(keys) == 0:
+        return
+
+    # Generations are timestamps instead of counters so that an evicted
+    # version key can not come back as a generation that was already used.
+    version = time.time_ns()
+    cache.set_many({key: version for key in keys}, timeout=0)
+
+    for function_name in _namespace_functions.get(namespace, []):
+        _record_cache_stat(function_name, 2, len(keys))
+
+
+def bump_user_cache_versions(*users):
+    """
+    Invalidate everything memoized for some users. The user namespace
+    is keyed by both user id and netid, as readers take either one.
+
+    :param users: User objects
+    :return:
+    """
+    from anubis.utils.auth.user import forget_cached_users
+
+    if len(users) == 0:
+        return
+    bump_cache_version("user", *[value for user in users for value in (user.id, user.netid)])
+
+    # Drop the users from the in process auth cache
+    forget_cached_users(*users)
+
+
+def versioned_memoize(
+    scopes: dict[str, str | None],
+    timeout: int = 600,
+    unless: Callable[[], bool] = None,
+    forced_update: Callable[[], bool] = None,
+):
+    """
+    Memoize a function under one or more version namespaces. The cache key
+    includes the current generation of each namespace, so bumping any of
+    them with bump_cache_version makes the old entries unreachable. This
+    lets results be cached for a long time, and still be correct right
+    after a write.
+
+    scopes maps each namespace to the name of the argument that holds its
+    id. A namespace mapped to None is namespace wide.
+
+        @versioned_memoize({"user": "user_id", "assignments": None})
+        def get_things(user_id, ...):
+
+    Hits, misses and invalidations are counted for each function.
+
+    :param scopes: namespace -> argument name (or None)
+    :param timeout: seconds to keep results
+    :param unless: skip the cache entirely if this gives back True
+    :param forced_update: skip reading the cache if this gives back True
+    :return:
+    """
+
+    def decorator(func):
+        function_name = f"{func.__module__}.{func.__qualname__}"
+        signature = inspect.signature(func)
+
+        for namespace in scopes:
+            _namespace_functions.setdefault(namespace, []).append(function_name)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if unless is not None and unless():
+                return func(*args, **kwargs)
+
+            try:
+                # Normalize the arguments so f(x) and f(x=x) share a key
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                arguments = bound.arguments
+
+                # Get the current generation of every namespace this depends on
+                versions = get_cache_versions([
+                    _cache_version_key(namespace, arguments[argument] if argument is not None else None)
+                    for namespace, argument in scopes.items()
+                ])
+
+                argument_hash = hashlib.md5(repr(list(arguments.items())).encode()).hexdigest()
+                key = f"{function_name}:{':'.join(map(str, versions))}:{argument_hash}"
+
+                # Results are stored wrapped so that None can be cached
+                if forced_update is None or not forced_update():
+                    found = cache.get(key)
+                    if found is not None:
+                        _record_cache_stat(function_name, 0)
+                        return found[0]
+            except Exception:
+                # If the cache is down, just call the function
+                print(traceback.format_exc())
+                return func(*args, **kwargs)
+
+            _record_cache_stat(function_name, 1)
+            result = func(*args, **kwargs)
+
+            try:
+                cache.set(key, (result,), timeout=timeout)
+            except Exception:
+                print(traceback.format_exc())
+
+            return result
+
+        return wrapper
+
+    return decorator
@@ -1,17 +1,22 @@
 import functools
+import threading
 from datetime import datetime, timedelta
 from hashlib import sha512
 from json import dumps
 from os import environ, urandom
 import urllib.parse
 
-from flask import Response, has_app_context, has_request_context
+from flask import Flask, Response, has_app_context, has_request_context
 
 from anubis.env import env
 from anubis.utils.exceptions import AssertError
 
 MYSQL_TEXT_MAX_LENGTH = 2 ** 16 - 1
 
+# Process level job app used by with_context
+_job_app: Flask | None = None
+_job_app_lock = threading.Lock()
+
 
 def is_debug() -> bool:
     """
@@ -281,28 +286,49 @@ def row2dict(row) -> dict:
     return raw
 
 
+def get_job_app() -> Flask:
+    """
+    Get the job app for this process. The app is only created the first
+    time this is called. Every call after that will get the same app back,
+    along with its database connection pool and cache client.
+
+    :return: Flask app
+    """
+    global _job_app
+
+    # Do the import here to avoid circular
+    # import issues.
+    from anubis.app import create_job_app
+
+    if _job_app is None:
+        with _job_app_lock:
+            if _job_app is None:
+                _job_app = create_job_app()
+
+    return _job_app
+
+
 def with_context(function):
     """
     This decorator is meant to save time and repetitive initialization
     when using flask-sqlalchemy outside of an app_context.
 
+    The app is only built once per process (see get_job_app). Each call
+    gets its own app and request context pushed on top of it.
+
     :param function:
     :return:
     """
 
     @functools.wraps(function)
     def wrapper(*args, **kwargs):
-        # Do the import here to avoid circular
-        # import issues.
-        from anubis.app import create_app
-
         # Only create an app context if
         # there is not already one
         if has_app_context() and has_request_context():
             return function(*args, **kwargs)
 
-        # Create a fresh app
-        app = create_app()
+        # Get the (possibly cached) job app
+        app = get_job_app()
 
         # Push an app context
         with app.app_context():
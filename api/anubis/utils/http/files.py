@@ -1,9 +1,11 @@
-from flask import Response, make_response
+from flask import Response, make_response, request
 
 from anubis.lms.courses import course_context
 from anubis.models import StaticFile, db
 from anubis.utils.data import rand, req_assert
 from anubis.utils.http import get_request_file_stream
+from anubis.utils.visuals.artifacts import Artifact, get_published_artifact, publish_artifact
+from anubis.utils.visuals.static import VISUAL_MAX_AGE, get_visual_blob, get_visual_variant
 
 
 def get_mime_type(blob: bytes) -> str:
@@ -102,3 +104,59 @@ def make_png_response(blob: bytes) -> Response:
 
     # Pass back the image response
     return response
+
+
+def make_visual_response(artifact: Artifact) -> Response:
+    """
+    Serve a published visual. The format (png or webp) and a smaller
+    width can be picked with the format and width query args. Responses
+    carry an ETag (the content hash) and Last-Modified, so browsers
+    revalidating an image they already have get a 304 without the
+    image being loaded at all.
+
+    :param artifact:
+    :return:
+    """
+
+    # Get the manifest of the published visual
+    manifest = get_published_artifact(artifact)
+    req_assert(manifest is not None, message="Visual is not available", status_code=404)
+
+    # Pick the requested variant
+    variant = get_visual_variant(
+        request.args.get("format", default="png"),
+        request.args.get("width", default=None, type=int),
+    )
+    req_assert(variant in manifest["variants"], message="Visual format or width is not available")
+    etag = manifest["variants"][variant]["etag"]
+    content_type = manifest["variants"][variant]["content_type"]
+
+    # If the client already has this exact visual, then
+    # there is no need to load it at all.
+    not_modified = (
+        request.if_none_match.contains(etag)
+        if request.if_none_match
+        else request.if_modified_since is not None and manifest["last_modified"] <= request.if_modified_since
+    )
+    if not_modified:
+        response = make_response("", 304)
+    else:
+        # Load the blob. If it fell out of the cache, publish it again.
+        try:
+            blob = get_visual_blob(etag)
+        except LookupError:
+            manifest = publish_artifact(artifact)
+            req_assert(manifest is not None, message="Visual is not available", status_code=404)
+            etag = manifest["variants"][variant]["etag"]
+            blob = get_visual_blob(etag)
+
+        response = make_response(blob)
+        response.headers["Content-Type"] = content_type
+
+    # Validators and caching headers
+    response.set_etag(etag)
+    response.last_modified = manifest["last_modified"]
+    response.cache_control.public = True
+    response.cache_control.max_age = VISUAL_MAX_AGE
+
+    return response
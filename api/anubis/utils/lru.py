@@ -0,0 +1,37 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable
+
+
+class LRUCache(object):
+    """
+    Small thread safe least recently used cache
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._data: OrderedDict[str, Any] = OrderedDict()
+
+    def get(self, key: str) -> Any | None:
+        with self._lock:
+            value = self._data.get(key, None)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def pop_where(self, predicate: Callable[[Any], bool]):
+        with self._lock:
+            for key in [key for key, value in self._data.items() if predicate(value)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
@@ -3,6 +3,7 @@ from functools import wraps
 from flask import request
 
 from anubis.models import Submission
+from anubis.utils.cache import bump_user_cache_versions
 from anubis.utils.http import error_response
 from anubis.utils.logging import logger
 
@@ -83,6 +84,13 @@ def check_submission_token(func):
 
         # Call the view function, and pass the
         # submission sqlalchemy object.
-        return func(submission)
+        response = func(submission)
+
+        # Every report changes the submission, so invalidate
+        # the cached submissions of the owner.
+        if submission.owner is not None:
+            bump_user_cache_versions(submission.owner)
+
+        return response
 
     return wrapper
@@ -20,3 +20,37 @@ def create_redis_lock(key: str, auto_release_time: float = 3.0) -> Redlock:
         auto_release_time=auto_release_time,
     )
     return lock
+
+
+def claim_redis_partition(name: str, partitions: int, owner: str, lease_seconds: int = 10) -> int | None:
+    """
+    Claim one of a fixed number of partitions of some shared work, so that
+    replicas each take a slice of it rather than contending over every
+    item. Call this on every pass: the partition already held by owner
+    has its lease renewed, otherwise a free (or expired) partition is
+    claimed. None is given back if every partition is held by someone else.
+
+    Without redis there is nothing to coordinate with, so the
+    caller should treat the work as a single partition.
+
+    :param name:
+    :param partitions:
+    :param owner: unique id of the claiming process
+    :param lease_seconds: how long a partition stays claimed without renewal
+    :return: partition index
+    """
+    keys = [f"{name}-partition-{partition}" for partition in range(partitions)]
+
+    # Renew the partition we already hold
+    holders = redis.mget(keys)
+    for partition, holder in enumerate(holders):
+        if holder is not None and holder.decode() == owner:
+            redis.expire(keys[partition], lease_seconds)
+            return partition
+
+    # Claim a free partition
+    for partition, holder in enumerate(holders):
+        if holder is None and redis.set(keys[partition], owner, nx=True, ex=lease_seconds):
+            return partition
+
+    return None
@@ -0,0 +1,56 @@
+import time
+
+from sqlalchemy import text
+
+from anubis.app import create_app
+from anubis.models import db
+from anubis.utils.data import with_context
+
+
+def job():
+    """
+    Stand in for an rpc job or poller tick. Makes a single
+    round trip to the database.
+    """
+    db.session.execute(text("select 1"))
+
+
+def legacy_with_context(function):
+    """
+    The original with_context. A fresh app (with all the views
+    and services) is built for every call.
+    """
+
+    def wrapper(*args, **kwargs):
+        app = create_app()
+        with app.app_context():
+            with app.test_request_context():
+                return function(*args, **kwargs)
+
+    return wrapper
+
+
+def time_calls(name: str, func, n: int) -> float:
+    start = time.time()
+    for _ in range(n):
+        func()
+    end = time.time()
+
+    average = (end - start) / n
+    print("{} :: {} calls in {:.2f}s :: {:.2f}ms per call".format(name, n, end - start, average * 1000))
+    return average
+
+
+def main():
+    n = 100
+
+    print(f"Running a database round trip job {n} times outside of an app context")
+    before_average = time_calls("before", legacy_with_context(job), n)
+    after_average = time_calls("after", with_context(job), n)
+
+    print("Per job overhead saved :: {:.2f}ms".format((before_average - after_average) * 1000))
+    print("Speedup :: {:.1f}x".format(before_average / after_average))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,8 @@
 import time
 
-from anubis.lms.autograde import bulk_autograde
-from anubis.models import db
+from anubis.lms.autograde import autograde_submission_result_wrapper, bulk_autograde
+from anubis.lms.students import get_students_in_class
+from anubis.models import Assignment, Submission, TheiaImage, db
 from anubis.utils.data import with_context
 from anubis.utils.testing.db import clear_database
 from anubis.utils.testing.seed import create_assignment, create_course, create_students, init_submissions
@@ -10,6 +11,15 @@ from anubis.utils.testing.seed import create_assignment, create_course, create_s
 def do_seed() -> str:
     clear_database()
 
+    xv6_image = TheiaImage(
+        image="registry.digitalocean.com/anubis/theia-cpp",
+        title="C/C++ IDE",
+        description="C/C++ IDE",
+        icon="devicon-cplusplus-plain",
+        public=True,
+    )
+    db.session.add(xv6_image)
+
     # OS test course
     intro_to_os_students = create_students(100)
     intro_to_os_course = create_course(
@@ -24,6 +34,7 @@ def do_seed() -> str:
     os_assignment0, _, os_submissions0, _ = create_assignment(
         intro_to_os_course,
         intro_to_os_students,
+        xv6_image,
         i=0,
         github_repo_required=True,
         submission_count=50,
@@ -35,28 +46,92 @@ def do_seed() -> str:
     return os_assignment0.id
 
 
-@with_context
-def main():
-    print("Seeding submission data")
-    seed_start = time.time()
-    assignment_id = do_seed()
-    seed_end = time.time()
-    print("Seed done in {}s".format(seed_end - seed_start))
+def legacy_autograde(student_id, assignment_id, max_correct: int):
+    """
+    The original per student autograde calculation. Every accepted
+    submission (and all its test results) is loaded through the ORM,
+    and passed tests are counted in python.
+    """
+    best = None
+    best_count = -1
+    for submission in (
+        Submission.query.filter(
+            Submission.assignment_id == assignment_id,
+            Submission.owner_id == student_id,
+            Submission.accepted == True,
+        )
+        .order_by(Submission.created.desc())
+        .all()
+    ):
+        correct_count = sum(map(lambda result: 1 if result.passed else 0, submission.test_results))
+        if correct_count >= best_count:
+            best_count = correct_count
+            best = submission
+        if best_count == max_correct:
+            break
+    return best.id if best is not None else None
 
-    n = 10
+
+def legacy_bulk_autograde(assignment_id, limit=100):
+    """
+    The original bulk autograde. Runs the autograde calculation
+    then the result wrapper once per student.
+    """
+    assignment = Assignment.query.filter_by(id=assignment_id).first()
+    max_correct = len(assignment.tests)
+    bests = []
+    for student in get_students_in_class(assignment.course_id, offset=0, limit=limit):
+        submission_id = legacy_autograde(student["id"], assignment.id, max_correct)
+        bests.append(
+            autograde_submission_result_wrapper(
+                assignment,
+                student["id"],
+                student["netid"],
+                student["name"],
+                submission_id,
+            )
+        )
+    return bests
+
+
+def time_passes(name: str, func, n: int) -> float:
     timings = []
-    print(f"Running bulk autograde on assignment {n} times [ 5K submissions, across 50 students ]")
     for i in range(n):
-        print(f"autograde pass {i + 1}/{n} ", end="", flush=True)
+        print(f"{name} pass {i + 1}/{n} ", end="", flush=True)
         db.session.expunge_all()
         start = time.time()
-        bulk_autograde(assignment_id, limit=100)
+        func()
         end = time.time()
         timings.append(end - start)
 
         print("{:.2f}s".format(end - start))
 
-    print("Average time :: {:.2f}s".format(sum(timings) / len(timings)))
+    average = sum(timings) / len(timings)
+    print("{} average time :: {:.2f}s".format(name, average))
+    return average
+
+
+@with_context
+def main():
+    print("Seeding submission data")
+    seed_start = time.time()
+    assignment_id = do_seed()
+    seed_end = time.time()
+    print("Seed done in {}s".format(seed_end - seed_start))
+
+    # Make sure both implementations pick the same best submissions
+    before = legacy_bulk_autograde(assignment_id, limit=100)
+    after = bulk_autograde(assignment_id, offset=0, limit=100)
+    before_ids = {r["netid"]: r["submission"]["id"] if r["submission"] else None for r in before}
+    after_ids = {r["netid"]: r["submission"]["id"] if r["submission"] else None for r in after}
+    assert before_ids == after_ids, "bulk autograde results do not match legacy autograde results"
+
+    n = 10
+    print(f"Running bulk autograde on assignment {n} times [ 5K submissions, across 100 students ]")
+    before_average = time_passes("before", lambda: legacy_bulk_autograde(assignment_id, limit=100), n)
+    after_average = time_passes("after", lambda: bulk_autograde(assignment_id, offset=0, limit=100), n)
+
+    print("Speedup :: {:.1f}x".format(before_average / after_average))
 
 
 if __name__ == "__main__":
@@ -1,3 +1,4 @@
+from anubis.lms.webhook_routes import forget_repo_routes, forget_user_routes
 from anubis.models import (
     AssignedQuestionResponse,
     AssignedStudentQuestion,
@@ -5,6 +6,7 @@ from anubis.models import (
     AssignmentQuestion,
     AssignmentRepo,
     AssignmentTest,
+    BestSubmission,
     ReservedIDETime,
     Course,
     InCourse,
@@ -19,19 +21,34 @@ from anubis.models import (
     TheiaSession,
     TheiaImage,
     TheiaImageTag,
+    UsageActiveDay,
+    UsageSubmissionHour,
+    UsageTheiaHour,
     User,
+    WebhookDelivery,
     db,
 )
+from anubis.utils.cache import bump_cache_version
 
 
 def clear_database():
+    # Bulk deletes skip the cache invalidation, so remember what
+    # webhook routes are cached for the rows about to go away
+    repo_urls = [repo_url for repo_url, in db.session.query(AssignmentRepo.repo_url).all()]
+    netids = [netid for netid, in db.session.query(User.netid).all()]
+
     # Yeet
+    WebhookDelivery.query.delete()
     ReservedIDETime.query.delete()
+    UsageSubmissionHour.query.delete()
+    UsageTheiaHour.query.delete()
+    UsageActiveDay.query.delete()
     LateException.query.delete()
     TheiaSession.query.delete()
     AssignedQuestionResponse.query.delete()
     AssignedStudentQuestion.query.delete()
     AssignmentQuestion.query.delete()
+    BestSubmission.query.delete()
     SubmissionTestResult.query.delete()
     SubmissionBuild.query.delete()
     Submission.query.delete()
@@ -48,3 +65,9 @@ def clear_database():
     TheiaImage.query.delete()
     User.query.delete()
     db.session.commit()
+
+    # Drop the routes so pushes are not sent to deleted repos and users
+    forget_repo_routes(*repo_urls)
+    forget_user_routes(*netids)
+    bump_cache_version("assignments")
+    bump_cache_version("courses")
@@ -0,0 +1,214 @@
+import hashlib
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from flask import Flask, Response, request
+from werkzeug.test import EnvironBuilder, run_wsgi_app
+
+
+class _KeepAliveRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serves the fake github app over HTTP/1.1 with keep-alive (the werkzeug
+    dev server closes every connection), so that connection reuse by
+    clients shows up in the connection count.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # Headers and body are written separately, so do not
+        # let nagle hold the body back on kept alive connections.
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, *args, **kwargs):
+        pass
+
+    def _handle(self):
+        # Build a wsgi environ for the request, and run the app on it
+        length = int(self.headers.get("Content-Length", 0))
+        environ = EnvironBuilder(
+            method=self.command,
+            path=self.path,
+            headers=list(self.headers.items()),
+            data=self.rfile.read(length) if length > 0 else None,
+        ).get_environ()
+        environ["REMOTE_PORT"] = self.client_address[1]
+        app_iter, status, headers = run_wsgi_app(self.server.app, environ, buffered=True)
+        data = b"".join(app_iter)
+
+        # Write back the response
+        self.send_response(int(status.split()[0]))
+        for key, value in headers:
+            if key.lower() != "content-length":
+                self.send_header(key, value)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_PUT = do_POST = do_DELETE = _handle
+
+
+class FakeGithub:
+    """
+    Local stand in for the parts of the github api that anubis uses (repos,
+    collaborators, teams and graphql), served over http on a background
+    thread. Like the real api it gives back ETags and answers matching
+    If-None-Match requests with a 304, and it keeps a rate limit budget
+    (reported in the X-RateLimit-* headers, 403 once it is used up) that
+    304s do not count against.
+
+    Each request can be slowed down by latency seconds, to stand in for
+    the round trip to github.
+    """
+
+    def __init__(self, latency: float = 0.0, rate_limit: int = 5000, rate_limit_window: float = 3600.0):
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.rate_limit_window = rate_limit_window
+        self.rate_limit_remaining = rate_limit
+        self.rate_limit_reset = time.time() + rate_limit_window
+
+        # "org/repo" -> collaborator github usernames
+        self.repos: dict[str, set[str]] = {}
+
+        # "org/team" -> member github usernames
+        self.teams: dict[str, set[str]] = {}
+
+        # Counters for how much was asked of the api
+        self.requests: int = 0
+        self.not_modified: int = 0
+        self.rate_limited: int = 0
+        self.connections: set[int] = set()
+
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+        self.url = None
+
+        self.app = self._create_app()
+
+    def set_rate_limit(self, remaining: int, reset_in: float):
+        with self._lock:
+            self.rate_limit_remaining = remaining
+            self.rate_limit_reset = time.time() + reset_in
+
+    def _create_app(self) -> Flask:
+        app = Flask("fake-github")
+
+        @app.before_request
+        def _before():
+            if self.latency > 0:
+                time.sleep(self.latency)
+            with self._lock:
+                self.requests += 1
+                self.connections.add(request.environ.get("REMOTE_PORT"))
+
+                # Reset the rate limit window once it has passed
+                if time.time() >= self.rate_limit_reset:
+                    self.rate_limit_remaining = self.rate_limit
+                    self.rate_limit_reset = time.time() + self.rate_limit_window
+
+                limited = self.rate_limit_remaining <= 0
+                if limited:
+                    self.rate_limited += 1
+
+            if limited:
+                return self._respond({"message": "API rate limit exceeded"}, 403, counted=False)
+
+        @app.get("/repos/<org>/<repo>")
+        def _repo(org: str, repo: str):
+            if f"{org}/{repo}" not in self.repos:
+                return self._respond({"message": "Not Found"}, 404)
+            return self._respond({"name": repo, "full_name": f"{org}/{repo}", "default_branch": "main"})
+
+        @app.delete("/repos/<org>/<repo>")
+        def _repo_delete(org: str, repo: str):
+            self.repos.pop(f"{org}/{repo}", None)
+            return self._respond(None, 204)
+
+        @app.get("/repos/<org>/<repo>/collaborators")
+        def _collaborators(org: str, repo: str):
+            if f"{org}/{repo}" not in self.repos:
+                return self._respond({"message": "Not Found"}, 404)
+            return self._respond([{"login": login} for login in sorted(self.repos[f"{org}/{repo}"])])
+
+        @app.put("/repos/<org>/<repo>/collaborators/<username>")
+        def _collaborator_add(org: str, repo: str, username: str):
+            if f"{org}/{repo}" not in self.repos:
+                return self._respond({"message": "Not Found"}, 404)
+            with self._lock:
+                self.repos[f"{org}/{repo}"] = self.repos[f"{org}/{repo}"] | {username}
+            return self._respond({"invitee": {"login": username}}, 201)
+
+        @app.get("/orgs/<org>/teams/<team>/members")
+        def _team_members(org: str, team: str):
+            return self._respond([{"login": login} for login in sorted(self.teams.get(f"{org}/{team}", set()))])
+
+        @app.put("/orgs/<org>/teams/<team>/memberships/<username>")
+        def _team_member_add(org: str, team: str, username: str):
+            with self._lock:
+                self.teams[f"{org}/{team}"] = self.teams.get(f"{org}/{team}", set()) | {username}
+            return self._respond({"state": "active", "role": "member"})
+
+        @app.delete("/orgs/<org>/teams/<team>/memberships/<username>")
+        def _team_member_remove(org: str, team: str, username: str):
+            with self._lock:
+                self.teams[f"{org}/{team}"] = self.teams.get(f"{org}/{team}", set()) - {username}
+            return self._respond(None, 204)
+
+        @app.put("/orgs/<org>/teams/<team>/repos/<repo_org>/<repo>")
+        def _team_repo_add(org: str, team: str, repo_org: str, repo: str):
+            return self._respond(None, 204)
+
+        @app.post("/graphql")
+        def _graphql():
+            return self._respond({"data": {"viewer": {"login": "anubis"}}}, resource="graphql")
+
+        return app
+
+    def _respond(self, body, status: int = 200, counted: bool = True, resource: str = "core") -> Response:
+        data = b"" if body is None else json.dumps(body).encode()
+        etag = '"' + hashlib.sha1(data).hexdigest() + '"'
+
+        # Unchanged resources do not count against the rate limit
+        not_modified = status == 200 and request.method == "GET" and request.headers.get("If-None-Match") == etag
+        with self._lock:
+            if not_modified:
+                self.not_modified += 1
+            elif counted:
+                self.rate_limit_remaining -= 1
+            headers = {
+                "X-RateLimit-Limit":     str(self.rate_limit),
+                "X-RateLimit-Remaining": str(max(self.rate_limit_remaining, 0)),
+                "X-RateLimit-Reset":     str(int(self.rate_limit_reset) + 1),
+                "X-RateLimit-Resource":  resource,
+            }
+
+        if not_modified:
+            return Response(status=304, headers={"ETag": etag, **headers})
+        if status == 204:
+            return Response(status=204, headers=headers)
+        return Response(data, status=status, headers={"ETag": etag, **headers}, content_type="application/json")
+
+    def start(self) -> str:
+        """
+        Start serving on a free local port.
+
+        :return: base url of the fake api
+        """
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _KeepAliveRequestHandler)
+        self._server.daemon_threads = True
+        self._server.app = self.app
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-github", daemon=True)
+        self._thread.start()
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+        return self.url
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server = None
@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta
+from typing import Iterator
+
+from kubernetes import client
+
+
+class FakePipelineJobSource:
+    """
+    In memory stand in for the kube api list and watch endpoints, filled
+    with pipeline jobs. Every change bumps a resourceVersion and is recorded as
+    a watch event, so watchers can be driven without a cluster.
+
+    Events older than the compacted resourceVersion are dropped, and
+    watching from before that point raises a 410 like the real api.
+    """
+
+    def __init__(self):
+        self.resource_version: int = 0
+        self.compacted_version: int = 0
+        self.jobs: dict[str, client.V1Job] = {}
+        self.events: list[tuple[int, str, client.V1Job]] = []
+
+        # Counters for how much was asked of the api
+        self.list_calls: int = 0
+        self.watch_calls: int = 0
+        self.objects_sent: int = 0
+
+    def _record(self, event_type: str, job: client.V1Job):
+        self.resource_version += 1
+        job.metadata.resource_version = str(self.resource_version)
+        self.events.append((self.resource_version, event_type, job))
+
+    def create_job(self, name: str, submission_id: str, created: datetime = None) -> client.V1Job:
+        job = client.V1Job(
+            metadata=client.V1ObjectMeta(
+                name=name,
+                namespace="anubis",
+                labels={
+                    "app.kubernetes.io/name": "submission-pipeline",
+                    "role":                   "submission-pipeline-worker",
+                    "submission-id":          submission_id,
+                },
+                creation_timestamp=created or datetime.utcnow(),
+            ),
+            status=client.V1JobStatus(active=1),
+        )
+        self.jobs[name] = job
+        self._record("ADDED", job)
+        return job
+
+    def finish_job(self, name: str):
+        old = self.jobs[name]
+        job = client.V1Job(
+            metadata=client.V1ObjectMeta(
+                name=old.metadata.name,
+                namespace=old.metadata.namespace,
+                labels=old.metadata.labels,
+                creation_timestamp=old.metadata.creation_timestamp,
+            ),
+            status=client.V1JobStatus(succeeded=1),
+        )
+        self.jobs[name] = job
+        self._record("MODIFIED", job)
+
+    def age_job(self, name: str, minutes: int):
+        self.jobs[name].metadata.creation_timestamp -= timedelta(minutes=minutes)
+
+    def delete_job(self, name: str):
+        job = self.jobs.pop(name, None)
+        if job is not None:
+            self._record("DELETED", job)
+
+    def compact(self):
+        """
+        Drop all recorded events, expiring any resourceVersion
+        a watcher may currently hold.
+        """
+        self.resource_version += 1
+        self.compacted_version = self.resource_version
+        self.events = []
+
+    def list_objects(self) -> tuple[list[client.V1Job], str]:
+        self.list_calls += 1
+        self.objects_sent += len(self.jobs)
+        return list(self.jobs.values()), str(self.resource_version)
+
+    def stream_objects(self, resource_version: str, timeout_seconds: int) -> Iterator[dict]:
+        self.watch_calls += 1
+        if int(resource_version) < self.compacted_version:
+            raise client.exceptions.ApiException(status=410, reason="Expired: too old resource version")
+
+        for version, event_type, job in list(self.events):
+            if version <= int(resource_version):
+                continue
+            self.objects_sent += 1
+            yield {"type": event_type, "object": job, "raw_object": job.to_dict()}
@@ -0,0 +1,103 @@
+import logging
+import os
+import time
+
+import requests
+
+from anubis.github.api import GithubRateLimiter, github_client, github_map
+from anubis.github.repos import verify_collaborators_github_repo
+from anubis.utils.logging import logger
+from anubis.utils.testing.fake_github import FakeGithub
+
+REPO_COUNT = 200
+GITHUB_LATENCY = 0.02
+
+
+def legacy_verify_collaborators(base_url: str, repo_url: str, github_username: str):
+    """
+    The original collaborator check. Every call is a fresh requests.get/put
+    with no connection reuse, no conditional request, and no timeout.
+    """
+    headers = {"Accept": "application/vnd.github.v3+json", "Authorization": "token fake"}
+    _, _, _, org, repo = repo_url.split("/")
+    collaborators = [
+        collaborator.get("login", None)
+        for collaborator in requests.get(f"{base_url}/repos/{org}/{repo}/collaborators", headers=headers).json()
+    ]
+    if github_username not in collaborators:
+        requests.put(
+            f"{base_url}/repos/{org}/{repo}/collaborators/{github_username}",
+            headers=headers,
+            json={"permission": "push"},
+        )
+
+
+def create_fake_github(**kwargs) -> tuple[FakeGithub, list[tuple[str, str]]]:
+    fake = FakeGithub(**kwargs)
+    fake.start()
+
+    # Half of the repos are missing their collaborator
+    repos = []
+    for n in range(REPO_COUNT):
+        fake.repos[f"os3224/hw1-{n}"] = {f"student{n}"} if n % 2 == 0 else set()
+        repos.append((f"https://github.com/os3224/hw1-{n}", f"student{n}"))
+
+    # Point the shared client at the fake
+    github_client.base_url = fake.url
+    github_client.etag_cache.clear()
+    github_client.rate_limiter = GithubRateLimiter()
+
+    return fake, repos
+
+
+def report(name: str, fake: FakeGithub, start: float):
+    print(
+        "{:<28} {:6.2f}s requests {:4d} (304s {:4d}, rate limited {:3d}) connections {:4d} budget left {}".format(
+            name,
+            time.time() - start,
+            fake.requests,
+            fake.not_modified,
+            fake.rate_limited,
+            len(fake.connections),
+            fake.rate_limit_remaining,
+        )
+    )
+
+
+def main():
+    os.environ.setdefault("GITHUB_TOKEN", "fake")
+    logger.setLevel(logging.WARNING)
+
+    print(f"verify collaborators on {REPO_COUNT} repos ({GITHUB_LATENCY * 1000:.0f}ms github latency)")
+
+    # Serial, one connection per request
+    fake, repos = create_fake_github(latency=GITHUB_LATENCY)
+    start = time.time()
+    for repo_url, github_username in repos:
+        legacy_verify_collaborators(fake.url, repo_url, github_username)
+    report("legacy serial", fake, start)
+    fake.stop()
+
+    # Pooled and concurrent
+    fake, repos = create_fake_github(latency=GITHUB_LATENCY)
+    start = time.time()
+    github_map(lambda repo: verify_collaborators_github_repo(*repo), repos)
+    report("pooled concurrent", fake, start)
+    assert all(f"student{n}" in fake.repos[f"os3224/hw1-{n}"] for n in range(REPO_COUNT))
+
+    # Run it again. Nothing changed, so the lists come back as 304s.
+    fake.requests = fake.not_modified = 0
+    start = time.time()
+    github_map(lambda repo: verify_collaborators_github_repo(*repo), repos)
+    report("pooled concurrent (again)", fake, start)
+    fake.stop()
+
+    # Start with barely any rate limit budget left. The client should
+    # pace itself into the next window rather than getting 403s.
+    fake, repos = create_fake_github(latency=GITHUB_LATENCY, rate_limit=REPO_COUNT * 2, rate_limit_window=5)
+    fake.set_rate_limit(remaining=github_client.rate_limiter.reserve + 20, reset_in=3)
+    start = time.time()
+    github_map(lambda repo: verify_collaborators_github_repo(*repo), repos)
+    report("pooled concurrent (paced)", fake, start)
+    assert all(f"student{n}" in fake.repos[f"os3224/hw1-{n}"] for n in range(REPO_COUNT))
+    fake.stop()
@@ -0,0 +1,157 @@
+import heapq
+import random
+from collections import deque
+
+from anubis.k8s.pipeline.admission import (
+    PIPELINE_PENDING_KEY,
+    PIPELINE_PRIORITY_REGRADE,
+    PIPELINE_PRIORITY_STUDENT,
+    PIPELINE_SLOTS_KEY,
+    admit_pipelines,
+    park_pipeline,
+    release_pipeline_slot,
+)
+from anubis.utils.config import get_config_int
+from anubis.utils.data import with_context
+from anubis.utils.redis import redis
+
+# Simulated seconds per step
+STEP = 0.01
+
+# Simulated rq workers on the regrade queue, and how long each
+# spends listing pipeline jobs to count them before deciding.
+RQ_WORKERS = 4
+LIST_JOBS_SECONDS = 0.05
+
+
+def make_burst(regrades: int, students: int) -> list[tuple[float, str, int]]:
+    """
+    A bulk regrade of an assignment is started, then students keep
+    pushing while the regrade is running.
+    """
+    arrivals = [(0.0, f"regrade-{i}", PIPELINE_PRIORITY_REGRADE) for i in range(regrades)]
+    arrivals += [(5.0 + i, f"student-{i}", PIPELINE_PRIORITY_STUDENT) for i in range(students)]
+    return sorted(arrivals)
+
+
+def pipeline_duration(rand: random.Random) -> float:
+    return rand.uniform(2.0, 6.0)
+
+
+def report(name: str, arrived: dict[str, float], started: dict[str, float], end: float, extra: str = ""):
+    def percentile(values: list[float], p: float) -> float:
+        values = sorted(values)
+        return values[min(len(values) - 1, int(len(values) * p))]
+
+    student = [started[s] - arrived[s] for s in started if s.startswith("student")]
+    regrade = [started[s] - arrived[s] for s in started if s.startswith("regrade")]
+
+    print(
+        "{} :: {} pipelines in {:.1f}s :: {:.2f} pipelines/s :: "
+        "student wait p50 {:.1f}s p95 {:.1f}s :: regrade wait p50 {:.1f}s{}".format(
+            name,
+            len(started),
+            end,
+            len(started) / end,
+            percentile(student, 0.5),
+            percentile(student, 0.95),
+            percentile(regrade, 0.5),
+            extra,
+        )
+    )
+    return percentile(student, 0.95)
+
+
+def simulate_legacy(arrivals: list[tuple[float, str, int]], max_jobs: int, seed: int = 0) -> float:
+    """
+    The original create_submission_pipeline. Every submission goes to the
+    back of the rq queue. Workers pop a submission, list all the pipeline
+    jobs, then either create the job or re-enqueue and exit.
+    """
+    rand = random.Random(seed)
+    arrived = {submission_id: t for t, submission_id, _ in arrivals}
+    pending = deque(arrivals)
+    queue = deque()
+    running = []
+    started = {}
+    workers_free_at = [0.0] * RQ_WORKERS
+    list_calls = 0
+
+    now = 0.0
+    while len(started) < len(arrivals):
+        while pending and pending[0][0] <= now:
+            queue.append(pending.popleft()[1])
+        while running and running[0] <= now:
+            heapq.heappop(running)
+
+        for w in range(RQ_WORKERS):
+            if workers_free_at[w] > now or not queue:
+                continue
+            submission_id = queue.popleft()
+            list_calls += 1
+            workers_free_at[w] = now + LIST_JOBS_SECONDS
+            if len(running) >= max_jobs:
+                queue.append(submission_id)
+                continue
+            started[submission_id] = now
+            heapq.heappush(running, now + pipeline_duration(rand))
+
+        now += STEP
+
+    return report("before", arrived, started, now, f" :: job list calls {list_calls}")
+
+
+def simulate_admission(arrivals: list[tuple[float, str, int]], seed: int = 0) -> float:
+    """
+    The redis admission scheduler. Submissions are parked, and admitted
+    when a pipeline slot is released.
+    """
+    rand = random.Random(seed)
+    arrived = {submission_id: t for t, submission_id, _ in arrivals}
+    pending = deque(arrivals)
+    running = []
+    started = {}
+
+    # Simulated time starts at an arbitrary epoch so slot leases never expire
+    epoch = 1_000_000.0
+
+    redis.delete(PIPELINE_SLOTS_KEY, PIPELINE_PENDING_KEY)
+
+    now = 0.0
+    while len(started) < len(arrivals):
+        changed = False
+        while pending and pending[0][0] <= now:
+            t, submission_id, priority = pending.popleft()
+            park_pipeline(submission_id, priority=priority, now=epoch + t)
+            changed = True
+        while running and running[0][0] <= now:
+            _, submission_id = heapq.heappop(running)
+            release_pipeline_slot(submission_id)
+            changed = True
+
+        if changed:
+            for submission_id in admit_pipelines(now=epoch + now):
+                started[submission_id] = now
+                heapq.heappush(running, (now + pipeline_duration(rand), submission_id))
+
+        now += STEP
+
+    redis.delete(PIPELINE_SLOTS_KEY, PIPELINE_PENDING_KEY)
+
+    return report("after", arrived, started, now)
+
+
+@with_context
+def main():
+    max_jobs = get_config_int("PIPELINE_MAX_JOBS", default=10)
+    arrivals = make_burst(regrades=300, students=30)
+
+    print(f"Simulating a 300 submission bulk regrade with 30 student pushes [ {max_jobs} pipeline slots ]")
+    before = simulate_legacy(arrivals, max_jobs)
+    after = simulate_admission(arrivals)
+
+    print("Student p95 wait reduced :: {:.1f}x".format(before / max(after, STEP)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import time
+
+from kubernetes import client
+
+from anubis.k8s.pipeline.reap import is_pipeline_job_done
+from anubis.k8s.pipeline.watch import PipelineJobWatcher
+from anubis.utils.testing.fake_k8s import FakePipelineJobSource
+
+TIMEOUT_MINUTES = 5
+
+
+def make_source(n: int) -> FakePipelineJobSource:
+    source = FakePipelineJobSource()
+    for i in range(n):
+        source.create_job(f"submission-pipeline-student{i}-{i}", f"submission-{i}")
+    return source
+
+
+def make_reap(source: FakePipelineJobSource, reaped: dict[str, int], inspections: list[int], tick: list[int]):
+    """
+    Stand in for reap_pipeline_job_if_done. Records when each job was
+    reaped, and deletes it from the fake api like the real reap would.
+    """
+
+    def reap(job: client.V1Job, timeout_minutes: int) -> bool:
+        inspections[0] += 1
+        if not is_pipeline_job_done(job, timeout_minutes):
+            return False
+        reaped.setdefault(job.metadata.name, tick[0])
+        source.delete_job(job.metadata.name)
+        return True
+
+    return reap
+
+
+def simulate(name: str, n: int, ticks: int, finish_tick: int, step):
+    """
+    Run a burst of n pipeline jobs that all finish on the same tick
+    (each tick standing in for one second of the poller loop).
+    """
+    source = make_source(n)
+    reaped, inspections, tick = {}, [0], [0]
+    reap = make_reap(source, reaped, inspections, tick)
+    step = step(source, reap)
+
+    start = time.time()
+    for tick[0] in range(ticks):
+        if tick[0] == finish_tick:
+            for job_name in list(source.jobs.keys()):
+                source.finish_job(job_name)
+
+        # Expire the watch resourceVersion halfway through the quiet period
+        if tick[0] == finish_tick // 2:
+            source.compact()
+
+        step()
+    end = time.time()
+
+    assert len(reaped) == n, f"{name} only reaped {len(reaped)}/{n} jobs"
+    reaction = max(reaped.values()) - finish_tick
+    print(
+        "{} :: list calls {} :: watch calls {} :: job objects from api {} :: "
+        "reap inspections {} :: reaction {} ticks :: {:.2f}s".format(
+            name,
+            source.list_calls,
+            source.watch_calls,
+            source.objects_sent,
+            inspections[0],
+            reaction,
+            end - start,
+        )
+    )
+    return source.objects_sent
+
+
+def poll_step(source: FakePipelineJobSource, reap):
+    """
+    The original poller. Every tick lists every job, and
+    inspects each of them.
+    """
+
+    def step():
+        jobs, _ = source.list_objects()
+        for job in jobs:
+            reap(job, TIMEOUT_MINUTES)
+
+    return step
+
+
+def watch_step(source: FakePipelineJobSource, reap):
+    watcher = PipelineJobWatcher(source=source, reap=reap, dispatch=lambda: None, timeout_minutes=TIMEOUT_MINUTES)
+    return watcher.watch_once
+
+
+def main():
+    n = 500
+    ticks = 60
+    finish_tick = 30
+
+    print(f"Simulating {n} pipeline jobs finishing at once over {ticks} poller ticks")
+    before = simulate("before", n, ticks, finish_tick, poll_step)
+    after = simulate("after", n, ticks, finish_tick, watch_step)
+
+    print("Job objects read from api reduced :: {:.1f}x".format(before / after))
+
+
+if __name__ == "__main__":
+    main()
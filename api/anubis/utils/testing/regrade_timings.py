@@ -0,0 +1,99 @@
+import time
+from datetime import datetime
+
+from anubis.lms.submissions import bulk_reset_submissions, init_submission
+from anubis.models import Submission, SubmissionBuild, SubmissionTestResult, db
+from anubis.utils.data import with_context
+from anubis.utils.testing.autograde_timings import do_seed
+
+
+def legacy_regrade(submission_ids: list[str]):
+    """
+    The original per submission regrade (without the enqueue). Each
+    submission is loaded, then reset with init_submission, which
+    deletes, inserts and commits twice.
+    """
+    for submission_id in submission_ids:
+        submission = Submission.query.filter(Submission.id == submission_id).first()
+        if not submission.processed:
+            continue
+
+        submission.processed = False
+        submission.state = "regrading"
+        submission.last_updated = datetime.now()
+        submission.pipeline_log = None
+
+        init_submission(submission, verbose=False)
+
+
+def mark_processed(assignment_id: str):
+    Submission.query.filter(Submission.assignment_id == assignment_id).update(
+        {Submission.processed: True},
+        synchronize_session=False,
+    )
+    db.session.commit()
+
+
+def get_reset_state(assignment_id: str) -> dict[str, tuple]:
+    test_counts = dict(
+        db.session.query(SubmissionTestResult.submission_id, db.func.count(SubmissionTestResult.assignment_test_id))
+        .join(Submission, Submission.id == SubmissionTestResult.submission_id)
+        .filter(Submission.assignment_id == assignment_id, SubmissionTestResult.passed == None)
+        .group_by(SubmissionTestResult.submission_id)
+        .all()
+    )
+    build_counts = dict(
+        db.session.query(SubmissionBuild.submission_id, db.func.count(SubmissionBuild.id))
+        .join(Submission, Submission.id == SubmissionBuild.submission_id)
+        .filter(Submission.assignment_id == assignment_id)
+        .group_by(SubmissionBuild.submission_id)
+        .all()
+    )
+    return {
+        submission_id: (processed, state, test_counts.get(submission_id, 0), build_counts.get(submission_id, 0))
+        for submission_id, processed, state in db.session.query(
+            Submission.id, Submission.processed, Submission.state
+        ).filter(Submission.assignment_id == assignment_id)
+    }
+
+
+def time_regrade(name: str, func, assignment_id: str, submission_ids: list[str]) -> float:
+    mark_processed(assignment_id)
+    db.session.expunge_all()
+
+    print(f"{name} ", end="", flush=True)
+    start = time.time()
+    func(submission_ids)
+    end = time.time()
+    print("{:.2f}s".format(end - start))
+
+    return end - start
+
+
+@with_context
+def main():
+    print("Seeding submission data")
+    seed_start = time.time()
+    assignment_id = do_seed()
+    seed_end = time.time()
+    print("Seed done in {}s".format(seed_end - seed_start))
+
+    submission_ids = [
+        submission_id
+        for submission_id, in db.session.query(Submission.id).filter(Submission.assignment_id == assignment_id)
+    ]
+
+    print(f"Resetting {len(submission_ids)} submissions for regrade")
+    before = time_regrade("before", legacy_regrade, assignment_id, submission_ids)
+    before_state = get_reset_state(assignment_id)
+    after = time_regrade("after", bulk_reset_submissions, assignment_id, submission_ids)
+    after_state = get_reset_state(assignment_id)
+
+    # Make sure both leave the submissions in the same state
+    assert before_state == after_state, "bulk reset does not match legacy regrade"
+
+    print("Speedup :: {:.1f}x".format(before / after))
+
+
+if __name__ == "__main__":
+    main()
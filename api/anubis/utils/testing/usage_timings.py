@@ -0,0 +1,141 @@
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from anubis.models import Assignment, Course, Submission, TheiaImage, TheiaSession, User, db
+from anubis.utils.data import rand, with_context
+from anubis.utils.testing.autograde_timings import do_seed
+from anubis.utils.usage.submissions import get_submissions
+from anubis.utils.usage.theia import get_theia_sessions
+
+
+def legacy_get_submissions(course_id: str) -> pd.DataFrame:
+    """
+    The original submission loader. Full submission objects are loaded,
+    then each timestamp is rounded one row at a time.
+    """
+    raw_submissions = (
+        Submission.query.join(Assignment)
+        .filter(
+            Assignment.hidden == False,
+            Assignment.course_id == course_id,
+        )
+        .all()
+    )
+    columns = ["id", "owner_id", "assignment_id", "processed", "created"]
+    submissions = pd.DataFrame(
+        data=[{column: getattr(x, column) for column in columns} for x in raw_submissions],
+        columns=columns,
+    )
+    submissions["created"] = submissions["created"].apply(lambda date: pd.to_datetime(date).round("H"))
+    return submissions
+
+
+def legacy_get_theia_sessions(course_id: str = None, start: datetime = None) -> pd.DataFrame:
+    """
+    The original theia session loader, with the row wise duration apply.
+    """
+    filters = []
+    if start is not None:
+        filters.append(TheiaSession.created >= start)
+    if course_id is not None:
+        raw_theia_sessions = TheiaSession.query.join(Assignment).filter(
+            Assignment.course_id == course_id,
+            *filters,
+        ).all()
+    else:
+        raw_theia_sessions = TheiaSession.query.filter(
+            TheiaSession.playground == True,
+            *filters,
+        ).all()
+    columns = ["id", "owner_id", "assignment_id", "image_id", "created", "ended"]
+    theia_sessions = pd.DataFrame(
+        data=[{column: getattr(x, column) for column in columns} for x in raw_theia_sessions],
+        columns=columns,
+    )
+    theia_sessions["created"] = theia_sessions["created"].apply(lambda date: pd.to_datetime(date).round("H"))
+    theia_sessions["ended"] = theia_sessions["ended"].apply(lambda date: pd.to_datetime(date).round("H"))
+    if len(theia_sessions) > 0:
+        theia_sessions["duration"] = theia_sessions[["ended", "created"]].apply(
+            lambda row: (row[0] - row[1]).seconds / 60, axis=1
+        )
+    else:
+        theia_sessions["duration"] = []
+    theia_sessions = theia_sessions[
+        np.abs(theia_sessions.duration - theia_sessions.duration.mean()) <= (3 * theia_sessions.duration.std())
+    ]
+    return theia_sessions
+
+
+def seed_playground_sessions(count: int):
+    """
+    Insert a year of ended playground sessions.
+
+    :param count:
+    :return:
+    """
+    user_ids = [user_id for user_id, in db.session.query(User.id).all()]
+    image_id = db.session.query(TheiaImage.id).scalar()
+    now = datetime.now()
+
+    rows = []
+    for _ in range(count):
+        created = now - timedelta(minutes=random.randint(0, 365 * 24 * 60))
+        rows.append({
+            "id":         rand(),
+            "owner_id":   random.choice(user_ids),
+            "image_id":   image_id,
+            "playground": True,
+            "active":     False,
+            "state":      "Ended",
+            "created":    created,
+            "ended":      created + timedelta(minutes=random.randint(5, 300)),
+        })
+    db.session.bulk_insert_mappings(TheiaSession, rows)
+    db.session.commit()
+
+
+def time_loader(name: str, func, *args) -> pd.DataFrame:
+    db.session.expunge_all()
+
+    print(f"{name} ", end="", flush=True)
+    tracemalloc.start()
+    start = time.time()
+    result = func(*args)
+    end = time.time()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("{:.2f}s peak {:.1f}MiB".format(end - start, peak / 2 ** 20))
+
+    return result
+
+
+def assert_same(legacy: pd.DataFrame, new: pd.DataFrame):
+    legacy = legacy.sort_values("id").reset_index(drop=True)
+    new = new.sort_values("id").reset_index(drop=True)
+    pd.testing.assert_frame_equal(legacy, new, check_dtype=False)
+
+
+@with_context
+def main():
+    print("Seeding usage data")
+    seed_start = time.time()
+    do_seed()
+    seed_playground_sessions(50000)
+    seed_end = time.time()
+    print("Seed done in {}s".format(seed_end - seed_start))
+
+    course_id = db.session.query(Course.id).scalar()
+    start = datetime.now() - timedelta(days=365)
+
+    legacy = time_loader("legacy submissions", legacy_get_submissions, course_id)
+    new = time_loader("column submissions", get_submissions, course_id)
+    assert_same(legacy, new)
+
+    legacy = time_loader("legacy playground sessions", legacy_get_theia_sessions, None, start)
+    new = time_loader("column playground sessions", get_theia_sessions, None, start)
+    assert_same(legacy, new)
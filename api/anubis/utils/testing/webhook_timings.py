@@ -0,0 +1,163 @@
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+from flask import current_app
+from sqlalchemy import event
+
+from anubis.lms.webhook import WEBHOOK_BATCH_SIZE, process_webhook_deliveries
+from anubis.models import Assignment, Course, InCourse, User, WebhookDelivery, db
+from anubis.utils.data import rand, with_context
+from anubis.utils.testing.autograde_timings import do_seed
+
+WEBHOOK_COUNT = 500
+
+WEBHOOK_HEADERS = {"Content-Type": "application/json", "X-GitHub-Event": "push"}
+
+
+def get_recorded_payloads(limit: int, fresh: bool = True) -> list[bytes]:
+    """
+    Get the raw bodies of the most recently recorded webhook deliveries.
+    With fresh, each push is given a new commit so that replaying it
+    creates a new submission rather than being ignored as a redelivery.
+
+    :param limit:
+    :param fresh:
+    :return:
+    """
+    payloads = [
+        delivery.payload
+        for delivery in WebhookDelivery.query.order_by(WebhookDelivery.created.desc()).limit(limit).all()
+    ]
+    if fresh:
+        payloads = [refresh_payload(payload) for payload in payloads]
+    return payloads
+
+
+def refresh_payload(payload: bytes) -> bytes:
+    webhook = json.loads(payload)
+    webhook["before"] = rand(40)
+    webhook["after"] = rand(40)
+    return json.dumps(webhook).encode()
+
+
+def generate_payloads(count: int) -> list[bytes]:
+    """
+    Make up pushes to the default branch of the repos of the
+    seeded students.
+
+    :param count:
+    :return:
+    """
+    course: Course = Course.query.filter(Course.name == "Intro to OS").first()
+    assignments: list[Assignment] = Assignment.query.filter(Assignment.course_id == course.id).all()
+    netids = [netid for netid, in db.session.query(User.netid).join(InCourse).filter(InCourse.course_id == course.id)]
+
+    payloads = []
+    for n in range(count):
+        assignment = assignments[n % len(assignments)]
+        netid = netids[n % len(netids)]
+        repo_name = f"{assignment.name.replace(' ', '-')}-{assignment.unique_code}-{netid}"
+        payloads.append(json.dumps({
+            "ref":        "refs/heads/main",
+            "repository": {
+                "url":            f"https://github.com/{course.github_org}/{repo_name}",
+                "name":           repo_name,
+                "default_branch": "main",
+            },
+            "pusher":     {"name": netid},
+            "after":      rand(40),
+            "before":     rand(40),
+        }).encode())
+    return payloads
+
+
+def replay_webhook_deliveries(payloads: list[bytes], url: str | None = None, workers: int = 8) -> list[float]:
+    """
+    Post webhook deliveries as github would. With a url, the deliveries
+    are sent to a running api with workers requests in flight, as a load
+    test. Otherwise they go through the test client of the current app.
+
+    :param payloads: raw webhook bodies
+    :param url: ex: http://localhost:5000/public/webhook/
+    :param workers:
+    :return: response time of each delivery
+    """
+
+    if url is None:
+        client = current_app.test_client()
+
+        def post(payload: bytes) -> float:
+            start = time.time()
+            r = client.post("/public/webhook/", data=payload, headers={**WEBHOOK_HEADERS, "X-GitHub-Delivery": str(uuid.uuid4())})
+            assert r.status_code == 200, r.data
+            return time.time() - start
+
+        return [post(payload) for payload in payloads]
+
+    session = requests.Session()
+
+    def post(payload: bytes) -> float:
+        start = time.time()
+        r = session.post(url, data=payload, headers={**WEBHOOK_HEADERS, "X-GitHub-Delivery": str(uuid.uuid4())})
+        r.raise_for_status()
+        return time.time() - start
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(post, payloads))
+
+
+def report_latencies(name: str, latencies: list[float]):
+    latencies = np.array(latencies) * 1000
+    print("{:<32} {:5d} deliveries p50 {:6.1f}ms p99 {:6.1f}ms".format(
+        name, len(latencies), np.percentile(latencies, 50), np.percentile(latencies, 99),
+    ))
+
+
+def time_drain(name: str, batch_size: int):
+    statements = []
+
+    def count(*args):
+        statements.append(1)
+
+    event.listen(db.engine, "before_cursor_execute", count)
+    start = time.time()
+    processed = process_webhook_deliveries(batch_size=batch_size)
+    end = time.time()
+    event.remove(db.engine, "before_cursor_execute", count)
+
+    print("{:<32} {:5d} deliveries {:6.2f}s ({:5.1f}ms each) {:6d} statements".format(
+        name, processed, end - start, (end - start) * 1000 / max(processed, 1), len(statements),
+    ))
+
+
+@with_context
+def main():
+    # Replay recorded deliveries against a running api
+    url = os.environ.get("WEBHOOK_REPLAY_URL", None)
+    if url is not None:
+        payloads = get_recorded_payloads(WEBHOOK_COUNT)
+        print(f"Replaying {len(payloads)} recorded deliveries to {url}")
+        report_latencies("replay", replay_webhook_deliveries(payloads, url))
+        return
+
+    print("Seeding webhook data")
+    do_seed()
+    payloads = generate_payloads(WEBHOOK_COUNT * 2)
+
+    # Receiving a push only records it
+    report_latencies("receive", replay_webhook_deliveries(payloads[:WEBHOOK_COUNT]))
+
+    # Redeliveries are ignored
+    report_latencies("receive (redelivered)", replay_webhook_deliveries(payloads[:WEBHOOK_COUNT // 5]))
+
+    # Processing the pushes one at a time is about what the
+    # webhook used to do before responding to each push.
+    time_drain("process one at a time", 1)
+
+    report_latencies("receive", replay_webhook_deliveries(payloads[WEBHOOK_COUNT:]))
+    time_drain(f"process in batches of {WEBHOOK_BATCH_SIZE}", WEBHOOK_BATCH_SIZE)
@@ -0,0 +1,35 @@
+from itertools import islice
+
+import pandas as pd
+from sqlalchemy.orm import Query
+
+# Number of rows to pull from the database at a time
+QUERY_CHUNK_SIZE = 10000
+
+
+def query_dataframe(query: Query, dtypes: dict[str, str], chunk_size: int = QUERY_CHUNK_SIZE) -> pd.DataFrame:
+    """
+    Stream the rows of a column query into a typed dataframe. The query
+    should select exactly the columns in dtypes (in the same order).
+    Rows are read chunk_size at a time, and each chunk is turned into
+    a dataframe right away, so only one chunk of row tuples is ever
+    held in memory.
+
+    :param query: column query (ex: db.session.query(Submission.id, ...))
+    :param dtypes: column name -> pandas dtype
+    :param chunk_size: number of rows to read at a time
+    :return:
+    """
+    columns = list(dtypes.keys())
+    rows = iter(query.yield_per(chunk_size))
+
+    # Build a typed dataframe for each chunk of rows
+    frames = []
+    while chunk := list(islice(rows, chunk_size)):
+        frames.append(pd.DataFrame.from_records(chunk, columns=columns).astype(dtypes))
+
+    # If there were no rows, give back an empty (but typed) dataframe
+    if len(frames) == 0:
+        return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in dtypes.items()})
+
+    return pd.concat(frames, ignore_index=True)
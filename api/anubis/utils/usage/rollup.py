@@ -0,0 +1,287 @@
+"""
+Hourly and daily usage rollups for the visuals. Rather than scanning every
+submission and theia session each time a plot is generated, the visuals
+job keeps these tables up to date incrementally:
+
+- usage_submission_hour: submissions per assignment per hour
+- usage_theia_hour: IDE starts per assignment / image per hour
+- usage_active_day: users active on each day (and how)
+
+Each update only recomputes the buckets from the last rollup onward
+(with a small overlap for rows that land late), so the plots become small
+range queries over the rollups no matter how much history there is.
+"""
+
+from datetime import datetime, timedelta
+
+import pandas as pd
+from sqlalchemy import func
+
+from anubis.models import (
+    Assignment,
+    Submission,
+    TheiaSession,
+    UsageActiveDay,
+    UsageSubmissionHour,
+    UsageTheiaHour,
+    db,
+)
+from anubis.utils.data import split_chunks
+from anubis.utils.logging import logger
+from anubis.utils.usage.dataframe import query_dataframe
+
+# How far before the last rollup bucket to recompute from
+HOUR_ROLLUP_OVERLAP = timedelta(hours=1)
+DAY_ROLLUP_OVERLAP = timedelta(days=1)
+
+# Number of rollup rows to insert at a time
+ROLLUP_INSERT_CHUNK_SIZE = 1000
+
+
+def _get_recompute_start(column, overlap: timedelta, freq: str) -> datetime | None:
+    """
+    Get where to start recomputing a rollup from. None
+    means there are no rollups yet, so start from the beginning.
+
+    Buckets in the future (from rows with future timestamps) should
+    not move the start past now, or newer rows would be skipped.
+
+    :param column: bucket column of the rollup table
+    :param overlap:
+    :param freq: bucket size (the start is floored to it)
+    :return:
+    """
+    last_bucket: datetime | None = db.session.query(func.max(column)).scalar()
+    if last_bucket is None:
+        return None
+    start = min(last_bucket, datetime.now()) - overlap
+    return pd.Timestamp(start).floor(freq).to_pydatetime()
+
+
+def _replace_rollups(Model, bucket_column, start: datetime | None, rows: list[dict]):
+    """
+    Swap out the rollup rows from start onward with freshly computed rows.
+
+    :param Model:
+    :param bucket_column:
+    :param start:
+    :param rows:
+    :return:
+    """
+
+    # Delete the buckets being recomputed
+    query = Model.query
+    if start is not None:
+        query = query.filter(bucket_column >= start)
+    query.delete(synchronize_session=False)
+
+    # Insert the recomputed buckets
+    for chunk in split_chunks(rows, ROLLUP_INSERT_CHUNK_SIZE):
+        db.session.bulk_insert_mappings(Model, chunk)
+
+    db.session.commit()
+
+
+def update_submission_hour_rollups() -> int:
+    """
+    Recompute the submissions per assignment per hour, from the last rollup onward.
+
+    :return: number of rollup rows written
+    """
+    start = _get_recompute_start(UsageSubmissionHour.hour, HOUR_ROLLUP_OVERLAP, "H")
+
+    # Load the submissions that could round into the recomputed hours
+    query = db.session.query(Submission.assignment_id, Submission.created)
+    if start is not None:
+        query = query.filter(Submission.created >= start - timedelta(minutes=30))
+    submissions = query_dataframe(query, {"assignment_id": "object", "created": "datetime64[ns]"})
+
+    # Count the submissions in each hour (rounded to the
+    # nearest hour, the same way the usage loaders do).
+    submissions["hour"] = submissions["created"].dt.round("H")
+    if start is not None:
+        submissions = submissions[submissions["hour"] >= start]
+    counts = submissions.groupby(["assignment_id", "hour"]).size().reset_index(name="count")
+
+    rows = [
+        {"assignment_id": assignment_id, "hour": hour.to_pydatetime(), "count": int(count)}
+        for assignment_id, hour, count in counts.itertuples(index=False)
+    ]
+    _replace_rollups(UsageSubmissionHour, UsageSubmissionHour.hour, start, rows)
+
+    return len(rows)
+
+
+def update_theia_hour_rollups() -> int:
+    """
+    Recompute the IDE starts per assignment / image per hour, from the last rollup onward.
+
+    :return: number of rollup rows written
+    """
+    start = _get_recompute_start(UsageTheiaHour.hour, HOUR_ROLLUP_OVERLAP, "H")
+
+    # Load the sessions that could round into the recomputed hours
+    query = db.session.query(
+        TheiaSession.assignment_id,
+        TheiaSession.image_id,
+        TheiaSession.playground,
+        TheiaSession.created,
+    )
+    if start is not None:
+        query = query.filter(TheiaSession.created >= start - timedelta(minutes=30))
+    theia_sessions = query_dataframe(
+        query,
+        {"assignment_id": "object", "image_id": "object", "playground": "object", "created": "datetime64[ns]"},
+    )
+
+    # Count the sessions started in each hour. Playground
+    # sessions have no assignment, so keep the null keys.
+    theia_sessions["hour"] = theia_sessions["created"].dt.round("H")
+    theia_sessions["playground"] = theia_sessions["playground"].fillna(False).astype(bool)
+    if start is not None:
+        theia_sessions = theia_sessions[theia_sessions["hour"] >= start]
+    counts = (
+        theia_sessions.groupby(["assignment_id", "image_id", "playground", "hour"], dropna=False)
+        .size()
+        .reset_index(name="count")
+    )
+
+    rows = [
+        {
+            "assignment_id": assignment_id if isinstance(assignment_id, str) else None,
+            "image_id":      image_id if isinstance(image_id, str) else None,
+            "playground":    bool(playground),
+            "hour":          hour.to_pydatetime(),
+            "count":         int(count),
+        }
+        for assignment_id, image_id, playground, hour, count in counts.itertuples(index=False)
+    ]
+    _replace_rollups(UsageTheiaHour, UsageTheiaHour.hour, start, rows)
+
+    return len(rows)
+
+
+def update_active_day_rollups() -> int:
+    """
+    Recompute the users active on each day, from the last rollup onward.
+
+    :return: number of rollup rows written
+    """
+    start = _get_recompute_start(UsageActiveDay.day, DAY_ROLLUP_OVERLAP, "D")
+
+    # Get the distinct users active each day with each kind of activity
+    active: dict[tuple[datetime, str], dict[str, bool]] = {}
+    for kind, Model in [("submission", Submission), ("theia", TheiaSession)]:
+        query = db.session.query(Model.owner_id, Model.created)
+        if start is not None:
+            query = query.filter(Model.created >= start)
+        activity = query_dataframe(query, {"owner_id": "object", "created": "datetime64[ns]"})
+
+        activity["day"] = activity["created"].dt.floor("D")
+        for owner_id, day in activity[["owner_id", "day"]].drop_duplicates().itertuples(index=False):
+            active.setdefault((day.to_pydatetime(), owner_id), {"submission": False, "theia": False})[kind] = True
+
+    rows = [
+        {"day": day, "owner_id": owner_id, **kinds}
+        for (day, owner_id), kinds in active.items()
+    ]
+    _replace_rollups(UsageActiveDay, UsageActiveDay.day, start, rows)
+
+    return len(rows)
+
+
+def update_usage_rollups():
+    """
+    Bring all the usage rollups up to date.
+
+    :return:
+    """
+    logger.info("Updating usage rollups")
+    submission_rows = update_submission_hour_rollups()
+    theia_rows = update_theia_hour_rollups()
+    active_rows = update_active_day_rollups()
+    logger.info(
+        "Usage rollups updated",
+        extra={
+            "submission_hour_rows": submission_rows,
+            "theia_hour_rows":      theia_rows,
+            "active_day_rows":      active_rows,
+        },
+    )
+
+
+def get_submission_hour_counts(course_id: str) -> pd.DataFrame:
+    """
+    Get the submissions per hour for each visible assignment in a course.
+
+    :param course_id:
+    :return: dataframe of assignment_id, created (hour), count
+    """
+    query = (
+        db.session.query(UsageSubmissionHour.assignment_id, UsageSubmissionHour.hour, UsageSubmissionHour.count)
+        .join(Assignment, Assignment.id == UsageSubmissionHour.assignment_id)
+        .filter(
+            Assignment.hidden == False,
+            Assignment.course_id == course_id,
+        )
+        .order_by(UsageSubmissionHour.hour)
+    )
+    return query_dataframe(query, {"assignment_id": "object", "created": "datetime64[ns]", "count": "int64"})
+
+
+def get_theia_hour_counts(course_id: str) -> pd.DataFrame:
+    """
+    Get the IDE starts per hour for each assignment in a course.
+
+    :param course_id:
+    :return: dataframe of assignment_id, created (hour), count
+    """
+    query = (
+        db.session.query(UsageTheiaHour.assignment_id, UsageTheiaHour.hour, func.sum(UsageTheiaHour.count))
+        .join(Assignment, Assignment.id == UsageTheiaHour.assignment_id)
+        .filter(Assignment.course_id == course_id)
+        .group_by(UsageTheiaHour.assignment_id, UsageTheiaHour.hour)
+        .order_by(UsageTheiaHour.hour)
+    )
+    return query_dataframe(query, {"assignment_id": "object", "created": "datetime64[ns]", "count": "int64"})
+
+
+def get_playground_hour_counts(start: datetime = None) -> pd.DataFrame:
+    """
+    Get the playground IDE starts per hour for each image.
+
+    :param start:
+    :return: dataframe of image_id, created (hour), count
+    """
+    query = (
+        db.session.query(UsageTheiaHour.image_id, UsageTheiaHour.hour, func.sum(UsageTheiaHour.count))
+        .filter(UsageTheiaHour.playground == True)
+        .group_by(UsageTheiaHour.image_id, UsageTheiaHour.hour)
+        .order_by(UsageTheiaHour.hour)
+    )
+    if start is not None:
+        query = query.filter(UsageTheiaHour.hour >= start)
+    return query_dataframe(query, {"image_id": "object", "created": "datetime64[ns]", "count": "int64"})
+
+
+def get_active_users(start: datetime, end: datetime) -> pd.DataFrame:
+    """
+    Get the users active on each day between start and end.
+
+    :param start:
+    :param end:
+    :return: dataframe of day, owner_id, submission, theia
+    """
+    query = db.session.query(
+        UsageActiveDay.day,
+        UsageActiveDay.owner_id,
+        UsageActiveDay.submission,
+        UsageActiveDay.theia,
+    ).filter(
+        UsageActiveDay.day >= start,
+        UsageActiveDay.day <= end,
+    )
+    return query_dataframe(
+        query,
+        {"day": "datetime64[ns]", "owner_id": "object", "submission": "bool", "theia": "bool"},
+    )
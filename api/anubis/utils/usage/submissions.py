@@ -2,8 +2,17 @@ from typing import Any
 
 import pandas as pd
 
-from anubis.models import Submission, Assignment
+from anubis.models import Submission, Assignment, db
 from anubis.utils.cache import cache
+from anubis.utils.usage.dataframe import query_dataframe
+
+SUBMISSION_DTYPES = {
+    "id":            "object",
+    "owner_id":      "object",
+    "assignment_id": "object",
+    "processed":     "object",
+    "created":       "datetime64[ns]",
+}
 
 
 def get_submissions(course_id: str) -> pd.DataFrame:
@@ -12,32 +21,28 @@ def get_submissions(course_id: str) -> pd.DataFrame:
 
     :return:
     """
-    # Get the submission sqlalchemy objects
-    raw_submissions = (
-        Submission.query.join(Assignment)
-            .filter(
+    # Query only the columns we want (not the full submission
+    # objects, with their builds and test results).
+    query = (
+        db.session.query(
+            Submission.id,
+            Submission.owner_id,
+            Submission.assignment_id,
+            Submission.processed,
+            Submission.created,
+        )
+        .join(Assignment, Assignment.id == Submission.assignment_id)
+        .filter(
             Assignment.hidden == False,
             Assignment.course_id == course_id,
         )
-            .all()
     )
 
-    # Specify which columns we want
-    columns = ["id", "owner_id", "assignment_id", "processed", "created"]
-
-    # Build a dataframe of from the columns we pull out of each submission object
-    submissions = pd.DataFrame(
-        data=list(
-            map(
-                lambda x: ({column: getattr(x, column) for column in columns}),
-                raw_submissions,
-            )
-        ),
-        columns=columns,
-    )
+    # Stream the columns into a dataframe
+    submissions = query_dataframe(query, SUBMISSION_DTYPES)
 
     # Round the submission timestamps to the nearest hour
-    submissions["created"] = submissions["created"].apply(lambda date: pd.to_datetime(date).round("H"))
+    submissions["created"] = submissions["created"].dt.round("H")
 
     return submissions
 
@@ -2,7 +2,17 @@ import numpy as np
 import pandas as pd
 from datetime import datetime
 
-from anubis.models import TheiaSession, Assignment
+from anubis.models import TheiaSession, Assignment, db
+from anubis.utils.usage.dataframe import query_dataframe
+
+THEIA_SESSION_DTYPES = {
+    "id":            "object",
+    "owner_id":      "object",
+    "assignment_id": "object",
+    "image_id":      "object",
+    "created":       "datetime64[ns]",
+    "ended":         "datetime64[ns]",
+}
 
 
 def get_theia_sessions(course_id: str = None, start: datetime = None) -> pd.DataFrame:
@@ -19,46 +29,35 @@ def get_theia_sessions(course_id: str = None, start: datetime = None) -> pd.Data
     if start is not None:
         filters.append(TheiaSession.created >= start)
 
-    # Get all the theia session sqlalchemy objects
+    # Query only the columns we want
+    query = db.session.query(
+        TheiaSession.id,
+        TheiaSession.owner_id,
+        TheiaSession.assignment_id,
+        TheiaSession.image_id,
+        TheiaSession.created,
+        TheiaSession.ended,
+    )
     if course_id is not None:
-        raw_theia_sessions = TheiaSession.query.join(Assignment).filter(
+        query = query.join(Assignment, Assignment.id == TheiaSession.assignment_id).filter(
             Assignment.course_id == course_id,
             *filters,
-        ).all()
+        )
     else:
-        raw_theia_sessions = TheiaSession.query.filter(
+        query = query.filter(
             TheiaSession.playground == True,
             *filters,
-        ).all()
+        )
 
-    # Specify which columns we want
-    columns = ["id", "owner_id", "assignment_id", "image_id", "created", "ended"]
-
-    # Build a dataframe of from the columns we pull out of each theia session object
-    theia_sessions = pd.DataFrame(
-        data=list(
-            map(
-                lambda x: ({column: getattr(x, column) for column in columns}),
-                raw_theia_sessions,
-            )
-        ),
-        columns=columns,
-    )
+    # Stream the columns into a dataframe
+    theia_sessions = query_dataframe(query, THEIA_SESSION_DTYPES)
 
     # Round the timestamps to the nearest hour
-    theia_sessions["created"] = theia_sessions["created"].apply(lambda date: pd.to_datetime(date).round("H"))
-    theia_sessions["ended"] = theia_sessions["ended"].apply(lambda date: pd.to_datetime(date).round("H"))
-
-    # Add a duration column
-    if len(theia_sessions) > 0:
-        # Get the duration from subtracting the end from the start time, and converting to minutes
-        theia_sessions["duration"] = theia_sessions[["ended", "created"]].apply(
-            lambda row: (row[0] - row[1]).seconds / 60, axis=1
-        )
+    theia_sessions["created"] = theia_sessions["created"].dt.round("H")
+    theia_sessions["ended"] = theia_sessions["ended"].dt.round("H")
 
-    # The apply breaks if there are no rows, so make it empty in that case
-    else:
-        theia_sessions["duration"] = []
+    # Get the duration from subtracting the end from the start time, and converting to minutes
+    theia_sessions["duration"] = (theia_sessions["ended"] - theia_sessions["created"]).dt.seconds / 60
 
     # Drop outliers based on duration
     theia_sessions = theia_sessions[
@@ -0,0 +1,285 @@
+"""
+Freshness tracking for the visuals job. Each rendered artifact (usage plots,
+sundials, ...) has a watermark: a small summary of the data it was rendered
+from (row counts, latest timestamps, the current day for plots that slide
+with time). The watermark is stored next to the cached artifact, and the
+job only re-renders an artifact when its watermark moved or its cached
+render is gone. The artifacts that do need rendering are spread across a
+process pool.
+"""
+
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Any, Callable
+
+from sqlalchemy import func
+
+from anubis.models import (
+    Assignment,
+    Submission,
+    TheiaImage,
+    UsageActiveDay,
+    UsageSubmissionHour,
+    UsageTheiaHour,
+    User,
+    db,
+)
+from anubis.utils.cache import cache
+from anubis.utils.config import get_config_int
+from anubis.utils.data import with_context
+from anubis.utils.logging import logger
+from anubis.utils.visuals.assignments import get_assignment_sundial
+from anubis.utils.visuals.static import get_visual_manifest, is_visual_published, publish_visual
+from anubis.utils.visuals.usage import get_usage_plot, get_usage_plot_active, get_usage_plot_playgrounds
+from anubis.utils.visuals.users import get_platform_users_plot
+
+VISUALS_WATERMARK_PREFIX = "visuals-watermark"
+
+# An artifact is identified by its kind and the arguments to its render function
+Artifact = tuple[str, tuple]
+
+
+def _rollup_watermark(Model, *filters, join=None) -> tuple:
+    query = db.session.query(func.sum(Model.count), func.max(Model.hour))
+    if join is not None:
+        query = query.join(*join)
+    return tuple(query.filter(*filters).one())
+
+
+def _usage_watermark(course_id: str) -> tuple:
+    # Submission and IDE rollups for the course, along with the
+    # assignments themselves (names, due dates, hidden).
+    return (
+        _rollup_watermark(
+            UsageSubmissionHour,
+            Assignment.course_id == course_id,
+            join=(Assignment, Assignment.id == UsageSubmissionHour.assignment_id),
+        ),
+        _rollup_watermark(
+            UsageTheiaHour,
+            Assignment.course_id == course_id,
+            join=(Assignment, Assignment.id == UsageTheiaHour.assignment_id),
+        ),
+        tuple(
+            tuple(row)
+            for row in db.session.query(
+                Assignment.id, Assignment.name, Assignment.hidden, Assignment.release_date, Assignment.due_date
+            )
+            .filter(Assignment.course_id == course_id)
+            .order_by(Assignment.id)
+        ),
+    )
+
+
+def _sundial_watermark(assignment_id: str) -> tuple:
+    # Submissions for the assignment (results land in last_updated)
+    return tuple(
+        db.session.query(func.count(Submission.id), func.max(Submission.last_updated))
+        .filter(Submission.assignment_id == assignment_id)
+        .one()
+    )
+
+
+def _playgrounds_watermark() -> tuple:
+    # Playground rollups, and which images are public
+    return (
+        _rollup_watermark(UsageTheiaHour, UsageTheiaHour.playground == True),
+        tuple(sorted(image_id for image_id, in db.session.query(TheiaImage.id).filter(TheiaImage.public == True))),
+    )
+
+
+def _active_watermark(days: int, step: int) -> tuple:
+    # The plot slides with the day, so the day is part of the watermark
+    return (
+        datetime.now().date(),
+        tuple(db.session.query(func.count(UsageActiveDay.id), func.max(UsageActiveDay.day)).one()),
+    )
+
+
+def _platform_users_watermark(days: int, step: int) -> tuple:
+    return (
+        datetime.now().date(),
+        db.session.query(func.count(User.id)).scalar(),
+    )
+
+
+# kind -> (render function, watermark function)
+ARTIFACT_KINDS: dict[str, tuple[Callable, Callable[..., tuple]]] = {
+    "usage":          (get_usage_plot, _usage_watermark),
+    "sundial":        (get_assignment_sundial, _sundial_watermark),
+    "playgrounds":    (get_usage_plot_playgrounds, _playgrounds_watermark),
+    "active":         (get_usage_plot_active, _active_watermark),
+    "platform_users": (get_platform_users_plot, _platform_users_watermark),
+}
+
+# Kinds that render to an image, and are published as static visuals
+PUBLISHED_KINDS = {"usage", "playgrounds", "active", "platform_users"}
+
+
+def get_artifact_name(artifact: Artifact) -> str:
+    kind, args = artifact
+    return ":".join([kind, *map(str, args)])
+
+
+def _watermark_key(artifact: Artifact) -> str:
+    return f"{VISUALS_WATERMARK_PREFIX}:{get_artifact_name(artifact)}"
+
+
+def get_artifact_watermark(artifact: Artifact) -> str:
+    """
+    Get the current watermark of the data an artifact is rendered from.
+
+    :param artifact:
+    :return:
+    """
+    kind, args = artifact
+    _, watermark_func = ARTIFACT_KINDS[kind]
+    return repr(watermark_func(*args))
+
+
+def is_artifact_fresh(artifact: Artifact, watermark: str) -> bool:
+    """
+    An artifact is fresh if it was last rendered at the same
+    watermark, and the render is still in the cache.
+
+    :param artifact:
+    :param watermark:
+    :return:
+    """
+    kind, args = artifact
+    render_func, _ = ARTIFACT_KINDS[kind]
+
+    if cache.get(_watermark_key(artifact)) != watermark:
+        return False
+
+    render_key = render_func.make_cache_key(render_func.uncached, *args)
+    if not cache.cache.has(render_key):
+        return False
+
+    # Images also need their published variants
+    if kind in PUBLISHED_KINDS:
+        return is_visual_published(get_artifact_name(artifact))
+
+    return True
+
+
+def publish_artifact(artifact: Artifact) -> dict[str, Any] | None:
+    """
+    Render an image artifact (through its cached render function),
+    and publish it as a static visual.
+
+    :param artifact:
+    :return: manifest of the published visual, or None if nothing was rendered
+    """
+    kind, args = artifact
+    render_func, _ = ARTIFACT_KINDS[kind]
+
+    png = render_func(*args)
+    if png is None:
+        return None
+
+    return publish_visual(get_artifact_name(artifact), png)
+
+
+def get_published_artifact(artifact: Artifact) -> dict[str, Any] | None:
+    """
+    Get the manifest of a published image artifact. If the visuals
+    job has not published it yet, then publish it now.
+
+    :param artifact:
+    :return:
+    """
+    manifest = get_visual_manifest(get_artifact_name(artifact))
+    if manifest is not None:
+        return manifest
+
+    return publish_artifact(artifact)
+
+
+@with_context
+def render_artifact(artifact: Artifact) -> float:
+    """
+    Render (and cache) a single artifact. This runs in the
+    visuals job process pool.
+
+    :param artifact:
+    :return: seconds the render took
+    """
+    kind, args = artifact
+    render_func, _ = ARTIFACT_KINDS[kind]
+
+    start = time.time()
+    if kind in PUBLISHED_KINDS:
+        publish_artifact(artifact)
+    else:
+        render_func(*args)
+    return time.time() - start
+
+
+def render_artifacts(artifacts: list[Artifact], workers: int = None) -> dict[str, Any]:
+    """
+    Render the artifacts whose data changed since they were last rendered.
+    Stale artifacts are rendered across a process pool.
+
+    :param artifacts:
+    :param workers: size of the process pool (VISUALS_JOB_WORKERS by default)
+    :return: stats on the run
+    """
+    job_start = time.time()
+
+    if workers is None:
+        workers = get_config_int("VISUALS_JOB_WORKERS", default=4)
+
+    # Find the artifacts that are out of date
+    stale: dict[Artifact, str] = {}
+    for artifact in artifacts:
+        watermark = get_artifact_watermark(artifact)
+        if is_artifact_fresh(artifact, watermark):
+            logger.info(f"Visual artifact is fresh :: {_watermark_key(artifact)}")
+            continue
+        stale[artifact] = watermark
+
+    # Render each stale artifact, then record the watermark it was rendered at
+    failed = 0
+
+    def _rendered(artifact: Artifact, seconds: float):
+        cache.set(_watermark_key(artifact), stale[artifact], timeout=0)
+        logger.info(
+            f"Rendered visual artifact :: {_watermark_key(artifact)}",
+            extra={"artifact": _watermark_key(artifact), "render_seconds": seconds},
+        )
+
+    if workers <= 1 or len(stale) <= 1:
+        for artifact in stale:
+            try:
+                _rendered(artifact, render_artifact(artifact))
+            except Exception as e:
+                failed += 1
+                logger.error(f"Failed to render visual artifact :: {_watermark_key(artifact)} :: {e}")
+    else:
+        # Spawned (not forked) workers, so they do not share
+        # the database connections of this process.
+        mp_context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(workers, len(stale)), mp_context=mp_context) as executor:
+            futures = {executor.submit(render_artifact, artifact): artifact for artifact in stale}
+            for future in as_completed(futures):
+                artifact = futures[future]
+                try:
+                    _rendered(artifact, future.result())
+                except Exception as e:
+                    failed += 1
+                    logger.error(f"Failed to render visual artifact :: {_watermark_key(artifact)} :: {e}")
+
+    stats = {
+        "artifacts":    len(artifacts),
+        "rendered":     len(stale) - failed,
+        "failed":       failed,
+        "skipped":      len(artifacts) - len(stale),
+        "workers":      workers,
+        "wall_seconds": time.time() - job_start,
+    }
+    logger.info("Visuals job done", extra=stats)
+
+    return stats
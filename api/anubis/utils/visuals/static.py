@@ -0,0 +1,171 @@
+"""
+Rendered visuals served as static, content addressed artifacts. When a
+plot is rendered, every variant of it (png, webp, and smaller widths) is
+stored once under the hash of its bytes, next to a small manifest that
+points at those hashes. Serving a visual only needs the manifest: the
+hash doubles as the ETag, so a browser that already has the image gets a
+304 without the image ever being pulled out of the cache. The image bytes
+themselves are kept in process by hash (they can never change), so
+repeated loads of the same image do not go back to redis either.
+"""
+
+import hashlib
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from io import BytesIO
+from typing import Any
+
+from anubis.utils.cache import cache
+from anubis.utils.logging import logger
+
+VISUAL_MANIFEST_PREFIX = "visual-manifest"
+VISUAL_BLOB_PREFIX = "visual-blob"
+
+# Blobs are refreshed each time the visual is published. A manifest
+# pointing at an expired blob is just re-rendered on the next request.
+VISUAL_BLOB_TIMEOUT = int(timedelta(days=7).total_seconds())
+
+# Formats and (smaller) widths each visual is published in
+VISUAL_FORMATS = {
+    "png":  "image/png",
+    "webp": "image/webp",
+}
+VISUAL_WIDTHS = (600,)
+
+# Number of image blobs to keep in process
+VISUAL_BLOB_MEMORY_SIZE = 64
+
+# How long browsers may use a visual before revalidating it
+VISUAL_MAX_AGE = 60
+
+
+def get_visual_variant(image_format: str = "png", width: int | None = None) -> str:
+    if width is None:
+        return image_format
+    return f"{image_format}@{width}"
+
+
+def _encode_variants(png: bytes) -> dict[str, bytes]:
+    """
+    Encode the png a visual was rendered as into each of the
+    published variants.
+
+    :param png:
+    :return: variant -> bytes
+    """
+    from PIL import Image
+
+    image = Image.open(BytesIO(png))
+    image.load()
+
+    # Full size and each of the smaller widths
+    sizes: list[tuple[int | None, Image.Image]] = [(None, image)]
+    for width in VISUAL_WIDTHS:
+        if width >= image.width:
+            continue
+        height = round(image.height * width / image.width)
+        sizes.append((width, image.resize((width, height), Image.LANCZOS)))
+
+    variants = {}
+    for width, sized in sizes:
+        # The full size png is stored as rendered
+        if width is None:
+            variants[get_visual_variant("png")] = png
+        else:
+            file_bytes = BytesIO()
+            sized.save(file_bytes, format="PNG", optimize=True)
+            variants[get_visual_variant("png", width)] = file_bytes.getvalue()
+
+        file_bytes = BytesIO()
+        sized.save(file_bytes, format="WEBP", quality=90, method=4)
+        variants[get_visual_variant("webp", width)] = file_bytes.getvalue()
+
+    return variants
+
+
+def _manifest_key(name: str) -> str:
+    return f"{VISUAL_MANIFEST_PREFIX}:{name}"
+
+
+def _blob_key(etag: str) -> str:
+    return f"{VISUAL_BLOB_PREFIX}:{etag}"
+
+
+def publish_visual(name: str, png: bytes) -> dict[str, Any]:
+    """
+    Store each variant of a rendered visual under the hash of its bytes,
+    and point the manifest for the visual at them. If the png did not
+    change from the last publish, Last-Modified is kept as is.
+
+    :param name:
+    :param png:
+    :return: manifest
+    """
+    previous = get_visual_manifest(name)
+
+    # Store each variant under its content hash
+    variants = {}
+    for variant, blob in _encode_variants(png).items():
+        etag = hashlib.sha256(blob).hexdigest()
+        cache.set(_blob_key(etag), blob, timeout=VISUAL_BLOB_TIMEOUT)
+        variants[variant] = {
+            "etag":         etag,
+            "content_type": VISUAL_FORMATS[variant.split("@")[0]],
+            "size":         len(blob),
+        }
+
+    # Keep the last modified time if nothing changed
+    last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+    if previous is not None and previous["variants"]["png"]["etag"] == variants["png"]["etag"]:
+        last_modified = previous["last_modified"]
+
+    manifest = {"last_modified": last_modified, "variants": variants}
+    cache.set(_manifest_key(name), manifest, timeout=0)
+
+    logger.info(
+        f"Published visual :: {name}",
+        extra={"visual": name, "sizes": {variant: data["size"] for variant, data in variants.items()}},
+    )
+
+    return manifest
+
+
+def get_visual_manifest(name: str) -> dict[str, Any] | None:
+    """
+    Get the manifest of a published visual.
+
+    :param name:
+    :return:
+    """
+    return cache.get(_manifest_key(name))
+
+
+def is_visual_published(name: str) -> bool:
+    """
+    Check that a visual has a manifest, and the
+    png it points at is still stored.
+
+    :param name:
+    :return:
+    """
+    manifest = get_visual_manifest(name)
+    if manifest is None:
+        return False
+    return cache.cache.has(_blob_key(manifest["variants"]["png"]["etag"]))
+
+
+@lru_cache(maxsize=VISUAL_BLOB_MEMORY_SIZE)
+def get_visual_blob(etag: str) -> bytes:
+    """
+    Get the bytes of a published visual variant. Blobs are content
+    addressed, so they are safe to keep in process indefinitely.
+
+    Misses raise (rather than return None) so they are not kept.
+
+    :param etag:
+    :return:
+    """
+    blob = cache.get(_blob_key(etag))
+    if blob is None:
+        raise LookupError(etag)
+    return blob
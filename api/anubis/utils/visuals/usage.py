@@ -4,9 +4,12 @@ from anubis.models import Assignment, Course, TheiaImage
 from anubis.utils.cache import cache
 from anubis.utils.data import is_debug, is_job
 from anubis.utils.logging import logger
-from anubis.utils.usage.submissions import get_submissions
-from anubis.utils.usage.theia import get_theia_sessions
-from anubis.utils.usage.users import get_active_submission_users, get_active_theia_users
+from anubis.utils.usage.rollup import (
+    get_active_users,
+    get_playground_hour_counts,
+    get_submission_hour_counts,
+    get_theia_hour_counts,
+)
 from anubis.utils.visuals.files import convert_fig_bytes
 from anubis.utils.visuals.watermark import add_watermark
 
@@ -28,20 +31,13 @@ def get_usage_plot(course_id: str) -> bytes | None:
         Assignment.release_date <= datetime.now(),
         Assignment.course_id == course_id,
     ).order_by(Assignment.release_date.desc()).all()
-    submissions = get_submissions(course_id)
-    theia_sessions = get_theia_sessions(course_id)
-
     fig, axs = plt.subplots(2, 1, figsize=(12, 10))
 
-    # submissions over hour line
-    ss = submissions.groupby(["assignment_id", "created"])["id"].count().reset_index().rename(
-        columns={"id": "count"}
-    ).groupby("assignment_id")
+    # submissions over hour line (from the hourly rollups)
+    ss = get_submission_hour_counts(course_id).groupby("assignment_id")
 
-    # ides over hour line
-    tt = theia_sessions.groupby(["assignment_id", "created"])["id"].count().reset_index().rename(
-        columns={"id": "count"}
-    ).groupby("assignment_id")
+    # ides over hour line (from the hourly rollups)
+    tt = get_theia_hour_counts(course_id).groupby("assignment_id")
 
     assignment_colors = {
         assignment.id: color
@@ -113,13 +109,8 @@ def get_usage_plot_playgrounds(start: datetime = None):
     # id so that they are always in the same order.
     images = TheiaImage.query.filter(TheiaImage.public == True).order_by(TheiaImage.id.desc()).all()
 
-    # Get all playground theia sessions after start datetime
-    theia_sessions = get_theia_sessions(None, start)
-
-    # Count number of playground IDEs per hour using some pandas df witchcraft
-    s = theia_sessions.groupby(["image_id", "created"])["id"].count().reset_index().rename(
-        columns={"id": "count"}
-    )
+    # Count number of playground IDEs per hour after start datetime (from the hourly rollups)
+    s = get_playground_hour_counts(start)
 
     # Value counts outside 4 std devs
     # should be brought down to 4 std devs
@@ -156,7 +147,7 @@ def get_usage_plot_playgrounds(start: datetime = None):
 def get_usage_plot_active(days: int = 14, step: int = 1):
     import matplotlib.pyplot as plt
 
-    now = datetime.now().replace(hour=0, second=0, microsecond=0)
+    now = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
     start_datetime = now - timedelta(days=days - 1)
 
     xx = []
@@ -164,11 +155,15 @@ def get_usage_plot_active(days: int = 14, step: int = 1):
     theia_y = []
     autograde_y = []
 
+    # Get the users active each day in the range (from the daily rollups)
+    active = get_active_users(start_datetime, now + timedelta(days=step))
+
     for n in range(0, days, step):
         start_day = start_datetime + timedelta(days=n)
         end_day = start_day + timedelta(days=step - 1)
-        submission_set = get_active_submission_users(start_day, end_day)
-        theia_set = get_active_theia_users(start_day, end_day)
+        bucket = active[(active["day"] >= start_day) & (active["day"] <= end_day)]
+        submission_set = set(bucket.loc[bucket["submission"], "owner_id"])
+        theia_set = set(bucket.loc[bucket["theia"], "owner_id"])
         xx.append(start_day)
         total_y.append(len(submission_set.union(theia_set)))
         autograde_y.append(len(submission_set))
@@ -7,7 +7,13 @@ from flask import Blueprint
 from sqlalchemy.exc import DataError, IntegrityError
 
 from anubis.github.repos import delete_assignment_repo
-from anubis.lms.assignments import assignment_sync, delete_assignment, delete_assignment_repos, get_assignment_tests
+from anubis.lms.assignments import (
+    assignment_sync,
+    bump_assignment_cache_versions,
+    delete_assignment,
+    delete_assignment_repos,
+    get_assignment_tests,
+)
 from anubis.lms.courses import assert_course_context, course_context, is_course_superuser
 from anubis.lms.questions import get_assigned_questions
 from anubis.lms.shell_autograde import (
@@ -372,6 +378,9 @@ def admin_assignments_add():
     db.session.add(new_assignment)
     db.session.commit()
 
+    # Invalidate cached assignment data
+    bump_assignment_cache_versions(new_assignment.id)
+
     return success_response(
         {
             "status":     "New assignment created.",
@@ -449,6 +458,9 @@ def admin_assignments_save(assignment: dict):
         # Tell frontend what error happened
         return error_response(str(e))
 
+    # Invalidate cached assignment data
+    bump_assignment_cache_versions(db_assignment.id)
+
     # Return status
     return success_response(
         {
@@ -1,7 +1,13 @@
 from flask import Blueprint, request
 from sqlalchemy.sql import or_
 
-from anubis.lms.autograde import autograde, autograde_submission_result_wrapper, bulk_autograde
+from anubis.lms.autograde import (
+    autograde,
+    autograde_submission_result_wrapper,
+    bulk_autograde,
+    get_best_submission_ids,
+    recalculate_best_submissions,
+)
 from anubis.lms.courses import assert_course_context
 from anubis.lms.questions import get_assigned_questions
 from anubis.models import Assignment, InCourse, Submission, User
@@ -15,7 +21,7 @@ from anubis.utils.visuals.assignments import (
     get_assignment_history,
     get_assignment_sundial,
 )
-from anubis.rpc.enqueue import enqueue_bulk_autograde
+from anubis.rpc.enqueue import enqueue_bulk_autograde, enqueue_recalculate_best_submissions
 
 autograde_ = Blueprint("admin-autograde", __name__, url_prefix="/admin/autograde")
 
@@ -40,7 +46,9 @@ def admin_autograde_cache_reset(assignment_id: str):
     # Verify that the current course context, and the assignment course match
     assert_course_context(assignment)
 
-    cache.delete_memoized(bulk_autograde)
+    # Rebuild the best submission records from the submission history
+    recalculate_best_submissions(assignment.id)
+
     cache.delete_memoized(autograde)
     cache.delete_memoized(get_assignment_history)
     cache.delete_memoized(get_admin_assignment_visual_data)
@@ -148,12 +156,17 @@ def admin_autograde_for_assignment_id_user_id(assignment_id, user_id):
     # Assert that the student does not exist
     req_assert(student is not None, message="student does not exist")
 
-    # If force load, then skip any caching
+    # If force load, then skip any caching. The best submission is
+    # calculated from the history here, and the stored record is
+    # rebuilt in the background.
     if force:
+        submission_id = get_best_submission_ids(assignment.id, [student.id]).get(student.id, None)
+        enqueue_recalculate_best_submissions(assignment.id, [student.id])
         cache.delete_memoized(autograde, student.id, assignment.id)
 
     # Calculate the best submission for this student and assignment
-    submission_id = autograde(student.id, assignment.id)
+    else:
+        submission_id = autograde(student.id, assignment.id)
 
     # Pass back the
     return success_response(
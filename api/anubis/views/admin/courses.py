@@ -1,10 +1,17 @@
 from flask import Blueprint
 from sqlalchemy.exc import DataError, IntegrityError
 
-from anubis.lms.courses import assert_course_superuser, course_context, valid_join_code
+from anubis.lms.courses import (
+    assert_course_superuser,
+    bump_course_cache_versions,
+    bump_course_membership_cache_versions,
+    course_context,
+    valid_join_code,
+)
 from anubis.models import Course, InCourse, ProfessorForCourse, TAForCourse, User, db
 from anubis.utils.auth.http import require_admin, require_superuser
 from anubis.utils.auth.user import current_user
+from anubis.utils.cache import bump_cache_version
 from anubis.utils.data import req_assert, row2dict
 from anubis.utils.http import error_response, success_response
 from anubis.utils.http.decorators import json_endpoint, json_response
@@ -66,6 +73,9 @@ def admin_courses_new():
     # Commit the new Course
     db.session.commit()
 
+    # Superusers see every course
+    bump_cache_version("courses")
+
     # Return the status
     return success_response(
         {
@@ -129,6 +139,10 @@ def admin_courses_save_id(course: dict):
         db.session.rollback()
         return error_response("Unable to save " + str(e))
 
+    # Invalidate cached course data
+    bump_cache_version("courses")
+    bump_course_cache_versions(db_course.id)
+
     # Return the status
     return success_response({"course": db_course.data, "status": "Changes saved."})
 
@@ -275,6 +289,9 @@ def admin_course_make_student_id(user_id: str):
     db.session.add(student)
     db.session.commit()
 
+    # Invalidate cached course data for the user
+    bump_course_membership_cache_versions(other, course_context.id)
+
     # Return the status
     return success_response({"status": "Student added to course"})
 
@@ -305,6 +322,9 @@ def admin_course_remove_student_id(user_id: str):
     # Commit the delete
     db.session.commit()
 
+    # Invalidate cached course data for the user
+    bump_course_membership_cache_versions(other, course_context.id)
+
     # Return the status
     return success_response(
         {
@@ -359,6 +379,9 @@ def admin_course_make_ta_id(user_id: str):
     db.session.add(ta)
     db.session.commit()
 
+    # Invalidate cached course data for the user
+    bump_course_membership_cache_versions(other, course_context.id)
+
     add_github_team_member(
         course_context.github_org,
         course_context.github_ta_team_slug,
@@ -402,6 +425,9 @@ def admin_course_remove_ta_id(user_id: str):
     # Commit the delete
     db.session.commit()
 
+    # Invalidate cached course data for the user
+    bump_course_membership_cache_versions(other, course_context.id)
+
     remote_github_team_member(
         course_context.github_org,
         course_context.github_ta_team_slug,
@@ -463,6 +489,9 @@ def admin_course_make_professor_id(user_id: str):
     db.session.add(prof)
     db.session.commit()
 
+    # Invalidate cached course data for the user
+    bump_course_membership_cache_versions(other, course_context.id)
+
     add_github_team_member(
         course_context.github_org,
         course_context.github_ta_team_slug,
@@ -499,6 +528,9 @@ def admin_course_remove_professor_id(user_id: str):
     # Commit the delete
     db.session.commit()
 
+    # Invalidate cached course data for the user
+    bump_course_membership_cache_versions(other, course_context.id)
+
     remote_github_team_member(
         course_context.github_org,
         course_context.github_ta_team_slug,
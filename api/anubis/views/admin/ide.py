@@ -8,6 +8,7 @@ from anubis.ide.initialize import initialize_ide
 from anubis.k8s.theia.reap import reap_theia_sessions_in_course
 from anubis.lms.courses import course_context
 from anubis.models import TheiaSession, TheiaImage, db
+from anubis.models.serialize import serialize_theia_sessions
 from anubis.rpc.enqueue import rpc_enqueue, enqueue_ide_stop
 from anubis.utils.auth.http import require_admin
 from anubis.utils.auth.user import current_user
@@ -188,7 +189,7 @@ def admin_ide_list():
     ).all()
 
     # Hand back response
-    return success_response({"sessions": [session.data for session in sessions]})
+    return success_response({"sessions": serialize_theia_sessions(sessions)})
 
 
 @ide.route("/stop/<string:id>")
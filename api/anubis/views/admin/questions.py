@@ -2,7 +2,7 @@ import io
 from datetime import datetime
 
 import sqlalchemy.exc
-from flask import Blueprint, send_file
+from flask import Blueprint, Response, send_file, stream_with_context
 
 from anubis.lms.courses import assert_course_context, assert_course_superuser
 from anubis.lms.questions import (
@@ -346,6 +346,7 @@ def private_questions_assign_unique_code(assignment_id: str):
 def admin_assignments_export(assignment_id: str):
     """
     Export question assignments to a (potentially) large zip archive.
+    The archive is streamed back a student at a time.
 
     :param assignment_id:
     :return:
@@ -363,15 +364,16 @@ def admin_assignments_export(assignment_id: str):
     # Get now datetime
     now = datetime.now().replace(microsecond=0)
 
-    # Generate an export of the assignment data
-    zip_blob = export_assignment_questions(assignment.id)
-
     # Get a filename from the assignment name and datetime
     assignment_name = clean_assignment_name(assignment)
     filename = f"anubis-question-assignments-{assignment_name}-{str(now)}.zip".replace(" ", "_").replace(":", "")
 
-    # Send the file back
-    return send_file(io.BytesIO(zip_blob), attachment_filename=filename, as_attachment=True)
+    # Stream the export of the assignment data back as it is generated
+    return Response(
+        stream_with_context(export_assignment_questions(assignment)),
+        mimetype="application/zip",
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
 
 
 @questions.get("/history/<string:assignment_id>/<string:user_id>")
@@ -3,7 +3,7 @@ import math
 from flask import Blueprint
 from sqlalchemy import or_
 
-from anubis.lms.autograde import autograde, bulk_autograde
+from anubis.lms.autograde import autograde
 from anubis.lms.courses import assert_course_context
 from anubis.lms.submissions import bulk_regrade_submissions
 from anubis.lms.submissions import init_submission
@@ -11,8 +11,8 @@ from anubis.models import Assignment, Submission, User
 from anubis.rpc.enqueue import enqueue_bulk_regrade_assignment
 from anubis.rpc.enqueue import rpc_enqueue, enqueue_autograde_pipeline
 from anubis.utils.auth.http import require_admin
-from anubis.utils.cache import cache
-from anubis.utils.data import req_assert, split_chunks
+from anubis.utils.cache import bump_cache_version, cache
+from anubis.utils.data import req_assert
 from anubis.utils.http import get_number_arg, success_response
 from anubis.utils.http.decorators import json_response, load_from_id
 
@@ -130,16 +130,12 @@ def private_regrade_student_assignment_netid(assignment_id: str, netid: str):
     # Get a count of submissions for the response
     submission_count = len(submissions)
 
-    # Split the submissions into bite sized chunks
+    # Enqueue all the submissions as a single bulk regrade job
     submission_ids = [s.id for s in submissions]
-    submission_chunks = split_chunks(submission_ids, 100)
-
-    # Enqueue each chunk as a job for the rpc workers
-    for chunk in submission_chunks:
-        rpc_enqueue(bulk_regrade_submissions, "regrade", args=[chunk])
+    rpc_enqueue(bulk_regrade_submissions, "regrade", args=[submission_ids])
 
     # Clear cache of autograde results
-    cache.delete_memoized(bulk_autograde, assignment.id)
+    bump_cache_version("assignment", assignment.id)
     cache.delete_memoized(autograde, student.id, assignment.id)
 
     return success_response(
@@ -157,18 +153,9 @@ def private_regrade_assignment(assignment_id):
     """
     This route is used to restart / re-enqueue jobs.
 
-    The work required for this is potentially very IO entinsive
-    on the database. We basically need to load the entire submission
-    history out of the database, reset each, then re-enqueue them
-    for processing. This makes resetting a single assignment actually
-    very time consuming. For this we need to be a bit smart about how to
-    handle this.
-
-    We will split all submissions for the given assignment into
-    chunks of 100. We can then push each of those chunks as a
-    bulk_regrade job to the rpc workers.
-
-    This solution isn't the fastest, but it gets the job done.
+    The regrade is handed off to an rpc worker. The worker resets all
+    the selected submissions with bulk statements in a single transaction,
+    then parks all their pipelines for admission in one round trip to redis.
 
     :param assignment_id: name of assignment to regrade
     :return:
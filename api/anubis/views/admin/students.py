@@ -1,7 +1,12 @@
 from flask import Blueprint
 
 from anubis.ide.get import get_recent_sessions
-from anubis.lms.courses import assert_course_context, assert_course_superuser, course_context
+from anubis.lms.courses import (
+    assert_course_context,
+    assert_course_superuser,
+    bump_user_profile_cache_versions,
+    course_context,
+)
 from anubis.lms.repos import get_repos
 from anubis.lms.students import get_students
 from anubis.models import Assignment, Course, InCourse, Submission, User, db
@@ -195,5 +200,8 @@ def admin_students_update_id(id: str, name: str = None, github_username: str = N
     db.session.add(student)
     db.session.commit()
 
+    # Invalidate cached rosters that show the student
+    bump_user_profile_cache_versions(student)
+
     # Pass back the status
     return success_response({"status": "saved"})
@@ -1,7 +1,7 @@
 from flask import Blueprint
 
 from anubis.lms.courses import assert_course_context
-from anubis.models import SubmissionTestResult, Submission, SubmissionBuild, TheiaSession, db
+from anubis.models import BestSubmission, SubmissionTestResult, Submission, SubmissionBuild, TheiaSession, db
 from anubis.utils.auth.http import require_admin
 from anubis.utils.data import req_assert
 from anubis.utils.http import success_response
@@ -39,7 +39,9 @@ def admin_submissions_delete_id(submission: Submission):
         # Unlink submission from theia session
         theia_session.submission_id = None
 
-    # Delete submission sub-table rows
+    # Delete submission sub-table rows. Removing the best submission record
+    # will have it recalculated the next time it is read.
+    BestSubmission.query.filter(BestSubmission.submission_id == submission.id).delete()
     SubmissionBuild.query.filter(SubmissionBuild.submission_id == submission.id).delete()
     SubmissionTestResult.query.filter(SubmissionTestResult.submission_id == submission.id).delete()
 
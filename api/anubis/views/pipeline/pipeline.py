@@ -1,15 +1,15 @@
 import json
 
 from flask import Blueprint, request
-from parse import parse
 
+from anubis.lms.autograde import update_best_submission
 from anubis.models import AssignmentTest, Submission, SubmissionTestResult, db
 from anubis.utils.data import MYSQL_TEXT_MAX_LENGTH
-from anubis.utils.http import success_response
+from anubis.utils.http import error_response, success_response
 from anubis.utils.http.decorators import json_endpoint, json_response
 from anubis.utils.logging import logger
 from anubis.utils.pipeline.decorators import check_submission_token
-from anubis.lms.submissions import init_submission
+from anubis.lms.submissions import init_submission, is_hidden_test_state
 
 pipeline = Blueprint("pipeline", __name__, url_prefix="/pipeline")
 
@@ -109,6 +109,10 @@ def pipeline_report_build(submission: Submission, stdout: str, passed: bool, **_
     db.session.add(submission.build)
     db.session.commit()
 
+    # A failed build finishes the submission
+    if submission.processed:
+        update_best_submission(submission)
+
     # Report success
     return success_response("Build successfully reported.")
 
@@ -184,6 +188,9 @@ def pipeline_report_test(submission: Submission, test_name: str, passed: bool, m
     db.session.add(submission_test_result)
     db.session.commit()
 
+    # Update the best submission for the student with the new result
+    update_best_submission(submission)
+
     return success_response("Test data successfully added.")
 
 
@@ -227,37 +234,8 @@ def pipeline_report_state(submission: Submission, state: str, **__):
     # set the processed field if it was specified
     submission.processed = processed != "0"
 
-    # Figure out if the test is hidden
-    # We do this by checking the state that was given,
-    # to read the name of the test. If the assignment
-    # test that was found is marked as hidden, then
-    # we should not update the state of the submission
-    # model.
-    #
-    # If we were to update the state of the submission
-    # when a hidden test is reported, then it would be
-    # visible to the students in the frontend.
-    hidden_test = False
-
-    # Do a basic match on the expected test
-    match = parse("Running test: {}", state)
-
-    # If we got a match
-    if match:
-        # Get the parsed assignment test name
-        test_name = match[0]
-
-        # Try to get the assignment test
-        assignment_test = AssignmentTest.query.filter(
-            AssignmentTest.assignment_id == submission.assignment_id,
-            AssignmentTest.name == test_name,
-        ).first()
-
-        # set hidden_test to True if the test exists, and if it is marked as hidden
-        hidden_test = assignment_test is not None and assignment_test.hidden
-
     # Update state field if the state report is not for a hidden test
-    if not hidden_test:
+    if not is_hidden_test_state(submission, state):
         submission.state = state
 
     # If processed was specified and is of type bool, then update that too
@@ -268,7 +246,150 @@ def pipeline_report_state(submission: Submission, state: str, **__):
     db.session.add(submission)
     db.session.commit()
 
+    # If the submission is finished, update the best submission for the student
+    if submission.processed:
+        update_best_submission(submission)
+
     return success_response("State successfully updated.")
+
+
+@pipeline.post("/report/batch/<string:submission_id>")
+@check_submission_token
+@json_endpoint([("tests", list)])
+def pipeline_report_batch(
+    submission: Submission,
+    tests: list[dict],
+    build: dict | None = None,
+    state: str | None = None,
+    processed: bool | None = None,
+    **_,
+):
+    """
+    Submission pipelines can buffer their results and report them all
+    at once with this endpoint instead of hitting the build, test and
+    state endpoints one at a time. Everything reported is applied in
+    a single transaction.
+
+    POSTed json should be of the shape:
+
+    {
+      "build": {                 # optional
+        "stdout": "build logs...",
+        "passed": True
+      },
+      "tests": [
+        {
+          "test_name": "name of the test",
+          "passed": True,
+          "message": "This test worked",
+          "output_type": "diff",
+          "output": "--- \n\n+++ \n\n@@ -1,3 +1,3 @@\n\n a\n-c\n+b\n d"
+        },
+        ...
+      ],
+      "state": "Tests completed",  # optional
+      "processed": True            # optional
+    }
+
+    :param submission:
+    :param tests:
+    :param build:
+    :param state:
+    :param processed:
+    :return:
+    """
+
+    # Verify the shape of everything before changing anything
+    test_shape = {"test_name": str, "passed": bool, "message": str, "output_type": str, "output": str}
+    for test in tests:
+        if not isinstance(test, dict) or not all(
+            isinstance(test.get(field, None), field_type) for field, field_type in test_shape.items()
+        ):
+            return error_response("Malformed requests. Invalid test result."), 406
+    build_shape = {"stdout": str, "passed": bool}
+    if build is not None and not (
+        isinstance(build, dict)
+        and all(isinstance(build.get(field, None), field_type) for field, field_type in build_shape.items())
+    ):
+        return error_response("Malformed requests. Invalid build result."), 406
+    if state is not None and not isinstance(state, str):
+        return error_response("Malformed requests. Invalid state."), 406
+
+    # Log the batch
+    logger.info(
+        "submission batch reported",
+        extra={
+            "type": "batch_report",
+            "submission_id": submission.id,
+            "assignment_id": submission.assignment_id,
+            "owner_id": submission.owner_id,
+            "build_passed": build["passed"] if build is not None else None,
+            "tests_passed": {test["test_name"]: test["passed"] for test in tests},
+            "state": state,
+        },
+    )
+
+    # Update submission build
+    if build is not None:
+        submission.build.stdout = build["stdout"][:MYSQL_TEXT_MAX_LENGTH]
+        submission.build.passed = build["passed"]
+
+        # If the build did not passed, then the
+        # submission pipeline is done
+        if build["passed"] is False:
+            submission.processed = True
+            submission.state = "Build did not succeed"
+
+        db.session.add(submission.build)
+
+    # Get all the test results for the submission by name in one query
+    submission_test_results: dict[str, SubmissionTestResult] = {
+        test_name: submission_test_result
+        for submission_test_result, test_name in db.session.query(SubmissionTestResult, AssignmentTest.name)
+        .join(AssignmentTest, AssignmentTest.id == SubmissionTestResult.assignment_test_id)
+        .filter(SubmissionTestResult.submission_id == submission.id)
+        .all()
+    }
+
+    # Update the test results
+    invalid_test_names = []
+    for test in tests:
+        submission_test_result = submission_test_results.get(test["test_name"], None)
+
+        # Verify we got a match
+        if submission_test_result is None:
+            invalid_test_names.append(test["test_name"])
+            continue
+
+        # Update the fields
+        submission_test_result.passed = test["passed"]
+        submission_test_result.message = test["message"]
+        submission_test_result.output_type = test["output_type"]
+        submission_test_result.output = test["output"][:MYSQL_TEXT_MAX_LENGTH]
+        db.session.add(submission_test_result)
+
+    if len(invalid_test_names) > 0:
+        logger.error("Invalid submission test results reported", extra={"test_names": invalid_test_names})
+
+    # Update the state if it is not for a hidden test
+    if state is not None and not is_hidden_test_state(submission, state):
+        submission.state = state
+    if isinstance(processed, bool):
+        submission.processed = processed
+
+    # Add and commit everything at once
+    db.session.add(submission)
+    db.session.commit()
+
+    # Update the best submission for the student with the new results
+    update_best_submission(submission)
+
+    return success_response({
+        "status": "Batch successfully reported.",
+        "invalid_test_names": invalid_test_names,
+    })
+
+
 from anubis.constants import SHELL_AUTOGRADE_SUBMISSION_STATE_MESSAGE
 
 
@@ -6,13 +6,13 @@ from flask import Blueprint, make_response, redirect, request
 
 from anubis.constants import NYU_DOMAIN
 from anubis.env import env
-from anubis.lms.courses import get_course_context
+from anubis.lms.courses import bump_user_profile_cache_versions, get_course_context
 from anubis.models import User, db
 from anubis.utils.auth.http import require_user
 from anubis.utils.auth.oauth import OAUTH_REMOTE_APP_GITHUB as github_provider
 from anubis.utils.auth.oauth import OAUTH_REMOTE_APP_NYU as nyu_provider
 from anubis.utils.auth.token import create_token
-from anubis.utils.auth.user import current_user, get_current_user
+from anubis.utils.auth.user import current_user, get_current_user, get_current_user_for_update
 from anubis.utils.data import is_debug
 from anubis.utils.http import success_response
 
@@ -146,9 +146,11 @@ def public_github_oauth():
         ).json()
 
         # set github username and commit
-        current_user.github_username = github_user_info["login"].strip()
-        db.session.add(current_user)
+        user: User = get_current_user_for_update()
+        user.github_username = github_user_info["login"].strip()
+        db.session.add(user)
         db.session.commit()
+        bump_user_profile_cache_versions(user)
 
         # Notify them with status
         return redirect(next_url)
@@ -2,8 +2,13 @@ from typing import Any
 
 from flask import Blueprint
 
-from anubis.lms.assignments import get_assignments
-from anubis.lms.courses import get_courses, get_courses_with_visuals, valid_join_code, get_course_data
+from anubis.lms.courses import (
+    bump_course_membership_cache_versions,
+    get_courses,
+    get_courses_with_visuals,
+    valid_join_code,
+    get_course_data,
+)
 from anubis.lms.students import get_students
 from anubis.models import Course, InCourse, db
 from anubis.rpc.enqueue import enqueue_assign_missing_questions
@@ -103,9 +108,7 @@ def public_courses_join(join_code):
     db.session.commit()
 
     # Clear the cached entries for getting course data
-    cache.delete_memoized(get_courses, current_user.netid)
-    cache.delete_memoized(get_assignments, current_user.netid)
-    cache.delete_memoized(get_assignments, current_user.netid, course.id)
+    bump_course_membership_cache_versions(current_user, course.id)
     cache.delete_memoized(get_students, course.id)
 
     # Enqueue fixing missing questions job
@@ -2,9 +2,11 @@ import string
 
 from flask import Blueprint, request
 
+from anubis.lms.courses import bump_user_profile_cache_versions
 from anubis.models import User, db
 from anubis.utils.auth.http import require_user
-from anubis.utils.auth.user import current_user
+from anubis.utils.auth.user import current_user, get_current_user_for_update
+from anubis.utils.cache import bump_user_cache_versions
 from anubis.utils.data import req_assert
 from anubis.utils.http import success_response
 from anubis.utils.http.decorators import json_response
@@ -19,19 +21,25 @@ profile = Blueprint("public-profile", __name__, url_prefix="/public/profile")
 def public_profile_toggle_email_notifications(key: str):
     status: str | None = None
 
+    # Toggle from the current values, not the cached copy of the user
+    user: User = get_current_user_for_update()
+
     match key:
         case "deadline_email_enabled":
-            current_user.deadline_email_enabled = not current_user.deadline_email_enabled
-            status = "Deadline Notification " + ("Enabled" if current_user.deadline_email_enabled else "Disabled")
+            user.deadline_email_enabled = not user.deadline_email_enabled
+            status = "Deadline Notification " + ("Enabled" if user.deadline_email_enabled else "Disabled")
         case "release_email_enabled":
-            current_user.release_email_enabled = not current_user.release_email_enabled
-            status = "Release Notification " + ("Enabled" if current_user.release_email_enabled else "Disabled")
+            user.release_email_enabled = not user.release_email_enabled
+            status = "Release Notification " + ("Enabled" if user.release_email_enabled else "Disabled")
 
-    db.session.add(current_user)
+    db.session.add(user)
     db.session.commit()
 
+    # Invalidate the cached copies of the user
+    bump_user_cache_versions(user)
+
     return success_response({
-        "user": current_user.data,
+        "user": user.data,
         "status": status,
         "variant": "success",
     })
@@ -96,12 +104,16 @@ def public_set_github_username():
     req_assert(other is None, message="That github username is already taken!")
 
     # If all the tests and checks pass, then we can update their github username
-    current_user.github_username = github_username
+    user: User = get_current_user_for_update()
+    user.github_username = github_username
 
     # Then commit the change
-    db.session.add(current_user)
+    db.session.add(user)
     db.session.commit()
 
+    # Invalidate cached rosters that show the username
+    bump_user_profile_cache_versions(user)
+
     # And give back the new github username as the response
     return success_response(github_username)
 
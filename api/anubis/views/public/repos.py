@@ -9,7 +9,7 @@ from anubis.lms.repos import get_repos
 from anubis.models import db, Assignment, AssignmentRepo
 from anubis.utils.auth.http import require_user
 from anubis.utils.auth.user import current_user
-from anubis.utils.cache import cache
+from anubis.utils.cache import bump_user_cache_versions, cache
 from anubis.utils.http import error_response, req_assert, success_response
 from anubis.utils.http.decorators import json_response
 
@@ -109,6 +109,7 @@ def public_repos_create(assignment_id: str):
 
     # Clear cache entry
     cache.delete_memoized(get_assignment_data, current_user.id, assignment_id)
+    bump_user_cache_versions(current_user)
 
     if len(errors) > 0:
         return success_response({
@@ -168,6 +169,7 @@ def public_repos_delete(assignment_id: str):
 
     # Clear cache entry
     cache.delete_memoized(get_assignment_data, current_user.id, assignment_id)
+    bump_user_cache_versions(current_user)
 
     # Pass them back
     return success_response({"status": "Github Repo & Submissions deleted"})
@@ -2,27 +2,23 @@ from flask import Blueprint
 
 from anubis.models import Course
 from anubis.utils.http import req_assert
-from anubis.utils.http.files import make_png_response
-from anubis.utils.visuals.usage import get_usage_plot, get_usage_plot_playgrounds, get_usage_plot_active
-from anubis.utils.visuals.users import get_platform_users_plot
+from anubis.utils.http.files import make_visual_response
 
 visuals_ = Blueprint("public-visuals", __name__, url_prefix="/public/visuals")
 
 
 @visuals_.route("/playgrounds")
 def public_visuals_usage_playgrounds():
-    # Get the png blob of the usage graph.
-    # The get_usage_plot is itself a cached function.
-    blob = get_usage_plot_playgrounds()
-
-    return make_png_response(blob)
+    # Serve the published usage graph. The visuals job
+    # keeps it up to date, so this is only a cache lookup.
+    return make_visual_response(("playgrounds", ()))
 
 
 @visuals_.route("/course/<string:course_id>")
 def public_visuals_usage(course_id: str):
     """
-    Get the usage png graph. This endpoint is heavily
-    cached.
+    Get the usage graph. This endpoint is heavily
+    cached, and supports conditional requests.
 
     :param course_id:
     :return:
@@ -37,62 +33,48 @@ def public_visuals_usage(course_id: str):
     # Confirm that the course has visuals enabled
     req_assert(course.display_visuals, message="Course does not support usage visuals")
 
-    # Get the png blob of the usage graph.
-    # The get_usage_plot is itself a cached function.
-    blob = get_usage_plot(course.id)
-
-    return make_png_response(blob)
+    # Serve the published usage graph. The visuals job
+    # keeps it up to date, so this is only a cache lookup.
+    return make_visual_response(("usage", (course.id,)))
 
 
 @visuals_.route("/active/14/1")
 def public_visuals_usage_active_14_1():
-    # Get the png blob of the usage graph.
-    # The get_usage_plot is itself a cached function.
-    blob = get_usage_plot_active(days=14, step=1)
-
-    return make_png_response(blob)
+    # Serve the published usage graph. The visuals job
+    # keeps it up to date, so this is only a cache lookup.
+    return make_visual_response(("active", (14, 1)))
 
 
 @visuals_.route("/active/180/1")
 def public_visuals_usage_active_180_1():
-    # Get the png blob of the usage graph.
-    # The get_usage_plot is itself a cached function.
-    blob = get_usage_plot_active(days=180, step=1)
-
-    return make_png_response(blob)
+    # Serve the published usage graph. The visuals job
+    # keeps it up to date, so this is only a cache lookup.
+    return make_visual_response(("active", (180, 1)))
 
 
 @visuals_.route("/active/90/7")
 def public_visuals_usage_active_90_7():
-    # Get the png blob of the usage graph.
-    # The get_usage_plot is itself a cached function.
-    blob = get_usage_plot_active(days=90, step=7)
-
-    return make_png_response(blob)
+    # Serve the published usage graph. The visuals job
+    # keeps it up to date, so this is only a cache lookup.
+    return make_visual_response(("active", (90, 7)))
 
 
 @visuals_.route("/active/365/30")
 def public_visuals_usage_active_365_30():
-    # Get the png blob of the usage graph.
-    # The get_usage_plot is itself a cached function.
-    blob = get_usage_plot_active(days=365, step=30)
-
-    return make_png_response(blob)
+    # Serve the published usage graph. The visuals job
+    # keeps it up to date, so this is only a cache lookup.
+    return make_visual_response(("active", (365, 30)))
 
 
 @visuals_.route("/users/365/1")
 def public_visuals_users_365_1():
-    # Get the png blob of the usage graph.
-    # The get_usage_plot is itself a cached function.
-    blob = get_platform_users_plot(days=365, step=1)
-
-    return make_png_response(blob)
+    # Serve the published usage graph. The visuals job
+    # keeps it up to date, so this is only a cache lookup.
+    return make_visual_response(("platform_users", (365, 1)))
 
 
 @visuals_.route("/users/365/30")
 def public_visuals_users_365_30():
-    # Get the png blob of the usage graph.
-    # The get_usage_plot is itself a cached function.
-    blob = get_platform_users_plot(days=365, step=30)
-
-    return make_png_response(blob)
+    # Serve the published usage graph. The visuals job
+    # keeps it up to date, so this is only a cache lookup.
+    return make_visual_response(("platform_users", (365, 30)))
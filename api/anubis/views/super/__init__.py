@@ -4,6 +4,8 @@ def register_super_views(app):
     from anubis.views.super.playgrounds import playgrounds_
     from anubis.views.super.students import students_
     from anubis.views.super.email import email_
+    from anubis.views.super.rpc import rpc_
+    from anubis.views.super.cache import cache_
 
     views = [
         ide_,
@@ -11,6 +13,8 @@ def register_super_views(app):
         playgrounds_,
         students_,
         email_,
+        rpc_,
+        cache_,
     ]
 
     for view in views:
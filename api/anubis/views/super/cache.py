@@ -0,0 +1,22 @@
+from flask import Blueprint
+
+from anubis.utils.auth.http import require_superuser
+from anubis.utils.cache import get_cache_stats
+from anubis.utils.http import success_response
+from anubis.utils.http.decorators import json_response
+
+cache_ = Blueprint("super-cache", __name__, url_prefix="/super/cache")
+
+
+@cache_.route("/stats")
+@require_superuser()
+@json_response
+def cache_stats():
+    """
+    Get the hit, miss and invalidation counts for each
+    versioned cache function.
+
+    :return:
+    """
+
+    return success_response({"stats": get_cache_stats()})
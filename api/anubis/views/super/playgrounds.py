@@ -4,6 +4,7 @@ from flask import Blueprint
 
 from anubis.k8s.theia.reap import reap_theia_playgrounds_all
 from anubis.models import db, TheiaSession
+from anubis.models.serialize import serialize_theia_sessions
 from anubis.rpc.enqueue import rpc_enqueue, enqueue_ide_stop
 from anubis.utils.auth.http import require_superuser
 from anubis.utils.data import req_assert
@@ -30,7 +31,7 @@ def super_playgrounds_list():
     ).all()
 
     # Hand back response
-    return success_response({"sessions": [session.data for session in sessions]})
+    return success_response({"sessions": serialize_theia_sessions(sessions)})
 
 
 @playgrounds_.route("/stop/<string:id>")
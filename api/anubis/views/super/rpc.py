@@ -0,0 +1,21 @@
+from flask import Blueprint
+
+from anubis.rpc.metrics import get_rpc_enqueue_metrics
+from anubis.utils.auth.http import require_superuser
+from anubis.utils.http import success_response
+from anubis.utils.http.decorators import json_response
+
+rpc_ = Blueprint("super-rpc", __name__, url_prefix="/super/rpc")
+
+
+@rpc_.route("/metrics")
+@require_superuser()
+@json_response
+def rpc_metrics():
+    """
+    Get the enqueue counts and latencies for each rpc queue.
+
+    :return:
+    """
+
+    return success_response({"metrics": get_rpc_enqueue_metrics()})
@@ -3,6 +3,8 @@ from flask import Blueprint
 from anubis.lms.students import get_students
 from anubis.models import User, db
 from anubis.utils.auth.http import require_superuser
+from anubis.utils.auth.permissions import clear_course_permissions
+from anubis.utils.cache import bump_user_cache_versions
 from anubis.utils.data import req_assert
 from anubis.utils.http import success_response
 from anubis.utils.http.decorators import json_response
@@ -52,6 +54,10 @@ def super_students_toggle_superuser(id: str):
     # Commit the change
     db.session.commit()
 
+    # Invalidate the cached permissions for the user
+    bump_user_cache_versions(other)
+    clear_course_permissions(other.id)
+
     # Pass back the status based on if the other is now a superuser
     if other.is_superuser:
         return success_response({"status": f"{other.name} is now a superuser", "variant": "warning"})
@@ -85,6 +91,9 @@ def super_students_toggle_anubis_developer(id: str):
     # Commit the change
     db.session.commit()
 
+    # Invalidate the cached user
+    bump_user_cache_versions(other)
+
     # Pass back the status based on if the other is now a superuser
     if other.is_anubis_developer:
         return success_response({"status": f"{other.name} is now an anubis developer", "variant": "warning"})
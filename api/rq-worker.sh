@@ -1,4 +1,4 @@
 #!/bin/sh
 
 echo "starting rq worker"
-exec rq worker -u redis://:${REDIS_PASS}@redis-master --results-ttl 5 $@
+exec rq worker -u redis://:${REDIS_PASS}@redis-master --results-ttl 5 --worker-class anubis.rpc.worker.AnubisWorker $@
@@ -0,0 +1,81 @@
+import os
+
+import pytest
+
+from anubis.github.api import GithubClient, GithubRateLimiter, github_client, github_map, github_rest
+from anubis.github.repos import list_collaborators, verify_collaborators_github_repo
+from anubis.utils.testing.fake_github import FakeGithub
+
+
+@pytest.fixture
+def fake_github():
+    os.environ.setdefault("GITHUB_TOKEN", "fake")
+
+    fake = FakeGithub()
+    fake.start()
+
+    # Point the shared client at the fake
+    base_url = github_client.base_url
+    github_client.base_url = fake.url
+    github_client.etag_cache.clear()
+    github_client.rate_limiter = GithubRateLimiter()
+
+    yield fake
+
+    fake.stop()
+    github_client.base_url = base_url
+
+
+def test_github_conditional_requests(fake_github):
+    fake_github.repos["os3224/hw1-abc"] = {"student"}
+
+    # The second list is a 304, but gives back the same data
+    assert list_collaborators("os3224", "hw1-abc") == ["student"]
+    assert list_collaborators("os3224", "hw1-abc") == ["student"]
+    assert fake_github.not_modified == 1
+
+    # Changes on github still come through
+    fake_github.repos["os3224/hw1-abc"] = {"student", "ta"}
+    assert list_collaborators("os3224", "hw1-abc") == ["student", "ta"]
+
+
+def test_github_map_pooled(fake_github):
+    for n in range(50):
+        fake_github.repos[f"os3224/hw1-{n}"] = set()
+
+    # Add all the missing collaborators, a few at a time
+    github_map(
+        lambda n: verify_collaborators_github_repo(f"https://github.com/os3224/hw1-{n}", f"student{n}"),
+        range(50),
+        workers=4,
+    )
+
+    assert all(fake_github.repos[f"os3224/hw1-{n}"] == {f"student{n}"} for n in range(50))
+
+    # Connections should have been reused
+    assert len(fake_github.connections) <= 4
+
+
+def test_github_rate_limit_paced(fake_github):
+    fake_github.repos["os3224/hw1-abc"] = {"student"}
+
+    # Leave only a few requests in the window. The client should wait
+    # for the window to reset rather than getting rate limited.
+    fake_github.rate_limit_window = 2
+    fake_github.set_rate_limit(remaining=github_client.rate_limiter.reserve + 3, reset_in=1)
+    for _ in range(10):
+        assert github_rest("/repos/os3224/hw1-abc")["default_branch"] == "main"
+
+    assert fake_github.rate_limited == 0
+
+
+def test_github_rate_limit_retry(fake_github):
+    fake_github.repos["os3224/hw1-abc"] = {"student"}
+
+    # Already out of budget. The 403 should be retried after the reset.
+    fake_github.set_rate_limit(remaining=0, reset_in=1)
+    client = GithubClient(base_url=fake_github.url)
+    r = client.request("get", "/repos/os3224/hw1-abc")
+
+    assert r.status_code == 200
+    assert fake_github.rate_limited == 1
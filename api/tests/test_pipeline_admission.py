@@ -0,0 +1,83 @@
+import pytest
+from redis.exceptions import ConnectionError
+
+from anubis.k8s.pipeline import admission
+from anubis.k8s.pipeline.admission import (
+    PIPELINE_PENDING_KEY,
+    PIPELINE_PRIORITY_REGRADE,
+    PIPELINE_PRIORITY_STUDENT,
+    PIPELINE_SLOTS_KEY,
+    admit_pipelines,
+    park_pipeline,
+    park_pipelines,
+    release_pipeline_slot,
+)
+from anubis.utils.redis import redis
+
+PIPELINE_MAX_JOBS = 2
+
+
+@pytest.fixture
+def admission_redis(monkeypatch):
+    # These run against the redis the api is configured with
+    if redis is None:
+        pytest.skip("redis is not configured")
+    try:
+        redis.ping()
+    except ConnectionError:
+        pytest.skip("redis is not reachable")
+
+    # Keep the slot cap small and out of the config table
+    monkeypatch.setattr(
+        admission,
+        "get_config_int",
+        lambda key, default=None: PIPELINE_MAX_JOBS if key == "PIPELINE_MAX_JOBS" else default,
+    )
+
+    redis.delete(PIPELINE_SLOTS_KEY, PIPELINE_PENDING_KEY)
+    yield redis
+    redis.delete(PIPELINE_SLOTS_KEY, PIPELINE_PENDING_KEY)
+
+
+def test_park_keeps_earliest(admission_redis):
+    park_pipeline("a", priority=PIPELINE_PRIORITY_STUDENT, now=100)
+
+    # Parking again later does not lose the place in line
+    park_pipeline("a", priority=PIPELINE_PRIORITY_STUDENT, now=200)
+    assert admission_redis.zscore(PIPELINE_PENDING_KEY, "a") == 100
+
+    # Parking again earlier moves it up
+    park_pipeline("a", priority=PIPELINE_PRIORITY_STUDENT, now=50)
+    assert admission_redis.zscore(PIPELINE_PENDING_KEY, "a") == 50
+
+    # A regrade parked again by a student push moves up to student priority
+    park_pipelines(["b", "c"], priority=PIPELINE_PRIORITY_REGRADE, now=100)
+    park_pipeline("b", priority=PIPELINE_PRIORITY_STUDENT, now=300)
+    assert admission_redis.zscore(PIPELINE_PENDING_KEY, "b") == 300
+    assert admission_redis.zscore(PIPELINE_PENDING_KEY, "c") > admission_redis.zscore(PIPELINE_PENDING_KEY, "b")
+
+
+def test_admit_by_priority(admission_redis):
+    park_pipelines(["regrade1", "regrade2"], priority=PIPELINE_PRIORITY_REGRADE, now=100)
+    park_pipeline("student1", priority=PIPELINE_PRIORITY_STUDENT, now=200)
+
+    # Students go first, then regrades in the order they were parked
+    assert admit_pipelines(now=1000) == ["student1", "regrade1"]
+
+    # All the slots are taken
+    assert admit_pipelines(now=1000) == []
+
+    # Releasing a slot lets the next one in
+    release_pipeline_slot("student1")
+    assert admit_pipelines(now=1000) == ["regrade2"]
+    assert admission_redis.zcard(PIPELINE_PENDING_KEY) == 0
+
+
+def test_admit_expired_slots(admission_redis):
+    park_pipelines(["a", "b", "c"], priority=PIPELINE_PRIORITY_STUDENT, now=100)
+    assert admit_pipelines(now=1000) == ["a", "b"]
+
+    # Slots that were never released expire after the lease
+    later = 1000 + admission._get_slot_lease_seconds() + 1
+    assert admit_pipelines(now=later) == ["c"]
+    assert admission_redis.zcard(PIPELINE_SLOTS_KEY) == 1
@@ -0,0 +1,159 @@
+from contextlib import contextmanager
+
+import pytest
+
+from anubis.k8s.pipeline import reap
+from anubis.k8s.pipeline.watch import PipelineJobWatcher
+from anubis.utils.data import with_context
+from anubis.utils.testing.fake_k8s import FakePipelineJobSource
+
+TIMEOUT_MINUTES = 5
+
+
+class FakeLock:
+    def acquire(self, blocking=True):
+        return True
+
+    def release(self):
+        pass
+
+
+@pytest.fixture
+def fake_pipelines(monkeypatch):
+    """
+    Drive the real reap path against a fake job source. Reading the pod
+    log and deleting the job go to the fake api instead of the cluster.
+    """
+    source = FakePipelineJobSource()
+    released = []
+
+    monkeypatch.setattr(reap, "create_redis_lock", lambda key: FakeLock())
+    monkeypatch.setattr(reap, "_read_pipeline_job_log", lambda job: f"log {job.metadata.name}")
+    monkeypatch.setattr(reap, "delete_pipeline_job", lambda job: source.delete_job(job.metadata.name))
+    monkeypatch.setattr(reap, "release_pipeline_slot", lambda submission_id: released.append(submission_id))
+    monkeypatch.setattr(reap, "dispatch_pipelines", lambda: None)
+
+    watcher = PipelineJobWatcher(
+        source=source,
+        reap=reap.reap_pipeline_job_if_done,
+        dispatch=lambda: None,
+        watch_timeout_seconds=1,
+        timeout_minutes=TIMEOUT_MINUTES,
+    )
+
+    yield source, watcher, released
+
+
+@contextmanager
+def pipeline_submissions(n: int):
+    """
+    Borrow some seeded submissions with their pipeline log cleared,
+    and put the logs back after.
+    """
+    from anubis.models import Submission, db
+
+    submissions = Submission.query.limit(n).all()
+    assert len(submissions) == n, "the test data is not seeded"
+    logs = {submission.id: submission.pipeline_log for submission in submissions}
+    for submission in submissions:
+        submission.pipeline_log = None
+    db.session.commit()
+
+    try:
+        yield submissions
+    finally:
+        db.session.rollback()
+        for submission in submissions:
+            submission.pipeline_log = logs[submission.id]
+        db.session.commit()
+
+
+def pipeline_logs(submissions) -> list:
+    from anubis.models import db
+
+    for submission in submissions:
+        db.session.refresh(submission)
+    return [submission.pipeline_log for submission in submissions]
+
+
+@with_context
+def test_pipeline_watch_reaps_finished(fake_pipelines):
+    source, watcher, released = fake_pipelines
+
+    with pipeline_submissions(2) as (first, second):
+        source.create_job("submission-pipeline-first", first.id)
+        source.create_job("submission-pipeline-second", second.id)
+
+        # Running jobs are tracked, but left alone
+        watcher.watch_once()
+        assert set(watcher.jobs) == {"submission-pipeline-first", "submission-pipeline-second"}
+        assert pipeline_logs([first, second]) == [None, None]
+        assert released == []
+
+        # Finishing a job reaps it from the watch stream without a relist
+        source.finish_job("submission-pipeline-first")
+        watcher.watch_once()
+        assert pipeline_logs([first, second]) == ["log submission-pipeline-first", None]
+        assert released == [first.id]
+        assert set(watcher.jobs) == {"submission-pipeline-second"}
+        assert "submission-pipeline-first" not in source.jobs
+        assert source.list_calls == 1
+
+        # Seeing the job again does not reap it twice
+        watcher.watch_once()
+        assert released == [first.id]
+
+
+@with_context
+def test_pipeline_watch_reaps_timed_out(fake_pipelines):
+    source, watcher, released = fake_pipelines
+
+    with pipeline_submissions(1) as (submission,):
+        source.create_job("submission-pipeline-stuck", submission.id)
+        watcher.watch_once()
+        assert pipeline_logs([submission]) == [None]
+
+        # A job that never changes status is reaped once it times out
+        source.age_job("submission-pipeline-stuck", TIMEOUT_MINUTES + 1)
+        watcher.watch_once()
+        assert pipeline_logs([submission]) == ["log submission-pipeline-stuck"]
+        assert released == [submission.id]
+        assert watcher.jobs == {}
+
+
+@with_context
+def test_pipeline_watch_resyncs_expired(fake_pipelines):
+    source, watcher, released = fake_pipelines
+
+    with pipeline_submissions(1) as (submission,):
+        source.create_job("submission-pipeline-missed", submission.id)
+        watcher.watch_once()
+
+        # The job finishes while the watch resourceVersion expires, so
+        # its event is never seen. The watcher relists and reaps it.
+        source.finish_job("submission-pipeline-missed")
+        source.compact()
+        watcher.watch_once()
+        assert watcher.resource_version is None
+        assert pipeline_logs([submission]) == [None]
+
+        watcher.watch_once()
+        assert source.list_calls == 2
+        assert pipeline_logs([submission]) == ["log submission-pipeline-missed"]
+        assert released == [submission.id]
+
+
+@with_context
+def test_pipeline_watch_forgets_deleted(fake_pipelines):
+    source, watcher, released = fake_pipelines
+
+    with pipeline_submissions(1) as (submission,):
+        source.create_job("submission-pipeline-deleted", submission.id)
+        watcher.watch_once()
+
+        # Jobs deleted out from under the watcher are dropped untouched
+        source.delete_job("submission-pipeline-deleted")
+        watcher.watch_once()
+        assert watcher.jobs == {}
+        assert pipeline_logs([submission]) == [None]
+        assert released == []
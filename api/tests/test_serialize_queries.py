@@ -0,0 +1,103 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event, func
+
+from utils import with_context
+
+
+@contextmanager
+def count_queries():
+    from anubis.models import db
+
+    counter = {"queries": 0}
+
+    def before_cursor_execute(*_, **__):
+        counter["queries"] += 1
+
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
+
+def assert_constant_queries(func, small, large, slack: int = 2):
+    """
+    Serializing more rows should not cost more queries. A few queries
+    only run when some row needs them (ex: if there is a superuser).
+    """
+    with count_queries() as small_count:
+        func(small)
+    with count_queries() as large_count:
+        func(large)
+
+    assert large_count["queries"] <= small_count["queries"] + slack, (small_count, large_count)
+
+
+def strip_timing(data: list[dict]) -> list[dict]:
+    # Tokens and time deltas are different on each call
+    timing_keys = {"redirect_url", "created_delta", "last_proxy_delta"}
+    return [{key: value for key, value in item.items() if key not in timing_keys} for item in data]
+
+
+@with_context
+def test_serialize_users_queries():
+    from anubis.lms.students import get_students, get_students_in_class
+    from anubis.models import Course, User
+    from anubis.models.serialize import serialize_users
+
+    course = Course.query.filter(Course.name == "Intro to OS").first()
+    users = User.query.limit(50).all()
+
+    assert serialize_users(users) == [user.data for user in users]
+    assert_constant_queries(serialize_users, users[:1], users)
+
+    # get_students_in_class
+    assert_constant_queries(lambda limit: get_students_in_class(course.id, offset=0, limit=limit), 1, 50)
+
+    # /admin/students/list
+    with count_queries() as counter:
+        get_students(course.id)
+    assert counter["queries"] <= 10, counter
+
+
+@with_context
+def test_serialize_assignments_queries():
+    from anubis.lms.assignments import get_all_assignments
+    from anubis.models import Assignment, Course
+    from anubis.models.serialize import serialize_assignments
+
+    assignments = Assignment.query.all()
+    assert serialize_assignments(assignments) == [assignment.data for assignment in assignments]
+    assert serialize_assignments(assignments, full=True) == [assignment.full_data for assignment in assignments]
+    assert_constant_queries(serialize_assignments, assignments[:1], assignments)
+
+    # The assignment part of /public/assignments/list
+    course_ids = {course.id for course in Course.query.all()}
+    assert_constant_queries(
+        lambda ids: serialize_assignments(get_all_assignments(ids, set())),
+        set(list(course_ids)[:1]),
+        course_ids,
+    )
+
+
+@with_context
+def test_serialize_theia_sessions_queries():
+    from anubis.ide.poll import theia_list_all
+    from anubis.models import TheiaSession, db
+    from anubis.models.serialize import serialize_theia_sessions
+
+    sessions = TheiaSession.query.limit(50).all()
+    assert strip_timing(serialize_theia_sessions(sessions)) == strip_timing([s.data for s in sessions])
+
+    # /admin/ide/list and /super/playgrounds/list
+    assert_constant_queries(serialize_theia_sessions, sessions[:1], sessions)
+
+    # theia_list_all for the user with the most sessions
+    owner_id, _ = (
+        db.session.query(TheiaSession.owner_id, func.count(TheiaSession.id))
+        .group_by(TheiaSession.owner_id)
+        .order_by(func.count(TheiaSession.id).desc())
+        .first()
+    )
+    assert_constant_queries(lambda limit: theia_list_all(owner_id, limit=limit), 1, 10)
@@ -71,3 +71,37 @@ def test_visuals_public_users():
         print('aaa', r.content)
         assert r.headers['Content-Type'] == 'image/png'
         assert r.status_code == 200
+
+
+def test_visuals_public_conditional():
+    student = Session("student")
+
+    # Get the visual once
+    r = student.get(
+        f"/public/visuals/active/14/1",
+        return_request=True,
+        skip_verify=True,
+    )
+    assert r.status_code == 200
+    assert r.headers['ETag'] is not None
+    assert r.headers['Last-Modified'] is not None
+
+    # Revalidating with the etag should not send the image again
+    r = student.get(
+        f"/public/visuals/active/14/1",
+        return_request=True,
+        skip_verify=True,
+        headers={'If-None-Match': r.headers['ETag']},
+    )
+    assert r.status_code == 304
+    assert len(r.content) == 0
+
+    # Smaller and webp variants
+    for query, content_type in [('?format=webp', 'image/webp'), ('?width=600', 'image/png')]:
+        r = student.get(
+            f"/public/visuals/active/14/1{query}",
+            return_request=True,
+            skip_verify=True,
+        )
+        assert r.headers['Content-Type'] == content_type
+        assert r.status_code == 200
@@ -4,7 +4,8 @@ import os
 
 import requests
 
-from anubis.models import Assignment, Course, InCourse, User, db
+from anubis.lms.webhook import get_webhook_delivery_id, process_webhook_deliveries
+from anubis.models import Assignment, Course, InCourse, User, WebhookDelivery, db
 from anubis.utils.data import with_context
 
 
@@ -42,6 +43,23 @@ def post_webhook(webhook):
     )
 
 
+def post_webhook_status(webhook) -> str:
+    """
+    Post a webhook, then process it and give back how it was processed.
+    """
+    r = post_webhook(webhook)
+    if r.headers['Content-Type'] != 'application/json':
+        print(r.text)
+        assert False
+    assert r.json()["data"]["status"] == "received"
+
+    process_webhook_deliveries()
+    db.session.expire_all()
+    delivery = WebhookDelivery.query.filter(WebhookDelivery.id == get_webhook_delivery_id(webhook)).first()
+    assert delivery.processed
+    return delivery.status
+
+
 def gen_rand(n: int = 40):
     return hashlib.sha256(os.urandom(12)).hexdigest()[:n]
 
@@ -71,7 +89,7 @@ def do_webhook_tests_user(netid):
     print(assignment_name, assignment_unique_code)
 
     db.session.expire_all()
-    r = post_webhook(
+    status = post_webhook_status(
         gen_webhook(
             assignment_name,
             assignment_unique_code,
@@ -80,11 +98,7 @@ def do_webhook_tests_user(netid):
             "0" * 40,
         )
     )
-    if r.headers['Content-Type'] != 'application/json':
-        print(r.text)
-        assert False
-    r = r.json()
-    assert r["data"] == "initial commit"
+    assert status == "initial commit"
     db.session.expire_all()
     response = db.engine.execute(
         "select count(id) from assignment_repo where assignment_id = '{}' and owner_id = '{}';".format(
@@ -93,9 +107,9 @@ def do_webhook_tests_user(netid):
     )
     assert response.fetchone()[0] == 1
 
-    r = post_webhook(gen_webhook(assignment_name, assignment_unique_code, user_netid)).json()
+    status = post_webhook_status(gen_webhook(assignment_name, assignment_unique_code, user_netid))
     db.session.expire_all()
-    assert r["data"] != "initial commit"
+    assert status != "initial commit"
     response = db.engine.execute(
         "select count(id) from assignment_repo where assignment_id = '{}' and owner_id = '{}';".format(
             assignment_id, user_id
@@ -103,18 +117,22 @@ def do_webhook_tests_user(netid):
     )
     assert response.fetchone()[0] == 1
 
-    r = post_webhook(gen_webhook(assignment_name, assignment_unique_code + "abc", user_netid)).json()
-    assert r["data"] is None
-    assert r["error"] == "assignment not found"
+    status = post_webhook_status(gen_webhook(assignment_name, assignment_unique_code + "abc", user_netid))
+    assert status == "assignment not found"
+
+    status = post_webhook_status(gen_webhook(assignment_name, assignment_unique_code, user_netid, ref="refs/heads/abc123"))
+    assert status == "not a push to default branch"
 
-    r = post_webhook(gen_webhook(assignment_name, assignment_unique_code, user_netid, ref="refs/heads/abc123")).json()
-    assert r["error"] == "not a push to default branch"
+    status = post_webhook_status(gen_webhook(assignment_name, assignment_unique_code, gen_rand(6)))
+    assert status == "dangling submission"
 
-    r = post_webhook(gen_webhook(assignment_name, assignment_unique_code, gen_rand(6))).json()
-    assert r["error"] == "dangling submission"
+    webhook = gen_webhook(assignment_name, assignment_unique_code, user_netid)
+    status = post_webhook_status(webhook)
+    assert status == "submission accepted"
 
-    r = post_webhook(gen_webhook(assignment_name, assignment_unique_code, user_netid)).json()
-    assert r["data"] == "submission accepted"
+    # Redeliveries of the same push are only recorded once
+    r = post_webhook(webhook).json()
+    assert r["data"]["status"] == "already received"
 
 
 def test_webhooks():
@@ -1,4 +1,5 @@
 import json
+import typing
 from dataclasses import asdict
 
 import requests
@@ -11,6 +12,10 @@ from anubis_autograde.utils import colorize_render, skip_if_not_prod
 
 pipeline_url: str = 'http://anubis-pipeline-api:5000'
 
+# Test results waiting to be sent to the pipeline api, keyed by test name
+# so that only the latest result for each exercise is reported.
+_report_buffer: typing.Dict[str, dict] = dict()
+
 
 @retry(tries=3)
 def _pipeline_api_request(endpoint: str, body: dict = None, query: dict = None, method: str = 'post'):
@@ -49,11 +54,7 @@ def pipeline_initialize_submission_status():
 
 @skip_if_not_prod
 def pipeline_finalize_submission_status():
-    _pipeline_api_request(
-        'pipeline/report/state',
-        {'state': 'Submitted!'},
-        {'processed': '1'}
-    )
+    pipeline_flush_reports(state='Submitted!', processed=True)
 
 
 @skip_if_not_prod
@@ -69,19 +70,49 @@ def pipeline_forward_exercise_status(
     exercise: Exercise,
     user_state: UserState,
 ):
-    _pipeline_api_request(
-        'pipeline/report/test',
-        {
-            'test_name':   exercise.name,
-            'passed':      exercise.complete,
-            'message':     colorize_render(
-                exercise.win_message,
-                user_state=user_state,
-            ),
-            'output_type': 'shell_exercise',
-            'output':      json.dumps({
-                'exercise':   repr(exercise),
-                'user_state': asdict(user_state),
-            }),
-        }
-    )
+    _report_buffer[exercise.name] = {
+        'test_name':   exercise.name,
+        'passed':      exercise.complete,
+        'message':     colorize_render(
+            exercise.win_message,
+            user_state=user_state,
+        ),
+        'output_type': 'shell_exercise',
+        'output':      json.dumps({
+            'exercise':   repr(exercise),
+            'user_state': asdict(user_state),
+        }),
+    }
+
+    # When buffering, results are held until the next flush
+    if current_app.config.get('BUFFER_REPORTS', False):
+        return
+
+    pipeline_flush_reports()
+
+
+@skip_if_not_prod
+def pipeline_flush_reports(state: typing.Optional[str] = None, processed: typing.Optional[bool] = None):
+    """
+    Send all buffered test results (and optionally the submission
+    state) to the pipeline api in a single batch request.
+
+    :param state:
+    :param processed:
+    :return:
+    """
+
+    body = {'tests': list(_report_buffer.values())}
+    if state is not None:
+        body['state'] = state
+    if processed is not None:
+        body['processed'] = processed
+
+    # Nothing to report
+    if len(body) == 1 and len(body['tests']) == 0:
+        return
+
+    _pipeline_api_request('pipeline/report/batch', body)
+
+    # Only clear the buffer once the results were accepted
+    _report_buffer.clear()
@@ -32,6 +32,7 @@ def make_parser() -> argparse.ArgumentParser:
     parser_server.add_argument('--netid', default=None, help='Netid of student used in production')
     parser_server.add_argument('--resume', default=None, help='Exercise to resume to')
     parser_server.add_argument('--prod', action='store_true', help='Enables production mode. This will overwrite the ')
+    parser_server.add_argument('--buffer_reports', action='store_true', help='Buffer exercise results until the submission is finalized')
     parser_server.add_argument('--spot_check', action='store_true', help='Spot check exercise.py. (Exit after initialization)')
     parser_server.add_argument('exercise_module')
     parser_server.set_defaults(func=run_server)
@@ -41,12 +41,14 @@ def create_app(args: argparse.Namespace, skip_exercises: bool = False) -> Flask:
     app.config['DEBUG'] = args.debug
     app.config['PROD'] = args.prod
     app.config['RESUME'] = args.resume
+    app.config['BUFFER_REPORTS'] = args.buffer_reports
 
     log.info(f'submission_id = {args.submission_id}')
     log.info(f'token = {args.token}')
     log.info(f'debug = {args.debug}')
     log.info(f'prod = {args.prod}')
     log.info(f'resume = {args.resume}')
+    log.info(f'buffer_reports = {args.buffer_reports}')
 
     if args.prod:
         with app.app_context():